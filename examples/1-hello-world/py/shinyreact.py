@@ -1,10 +1,42 @@
 from __future__ import annotations
 
-from shiny import ui, Session
+import asyncio
+import collections.abc
+import dataclasses
+import functools
+import inspect
+import sys
+import time
+import types
+import warnings
+
+from shiny import reactive, ui, Session
 from shiny.html_dependencies import shiny_deps
-from shiny.types import Jsonifiable
+from shiny.types import (
+    Jsonifiable,
+    SilentException,
+    SilentOperationInProgressException,
+)
 from shiny.render.renderer import Renderer, ValueFn
-from typing import Any, Mapping, Optional, Sequence, Union
+from shiny.session import require_active_session
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+    get_args,
+    get_origin,
+    get_type_hints,
+)
 
 
 def page_bare(*args: ui.TagChild, title: str | None = None, lang: str = "en") -> ui.Tag:
@@ -47,6 +79,33 @@ class render_json(Renderer[Jsonifiable]):
     It sends the data to the client-side and let the client-side code handle the
     rendering.
 
+    With `cancel_superseded=True`, slow work can be done in the background and
+    abandoned when the inputs change again. The function reads its inputs, and
+    returns an awaitable (for example, a coroutine from calling an async
+    function without awaiting it, or `asyncio.to_thread(...)`) that computes the
+    value. While the awaitable runs, the output shows as recalculating and the
+    app stays responsive. If any input the function read changes first, the
+    awaitable is cancelled, and its result is dropped rather than sent:
+
+        @render_json(cancel_superseded=True)
+        def summary():
+            n = input.n()
+            return asyncio.to_thread(summarize, data, n)
+
+    Work that's already running in a thread or process can't be interrupted, but
+    its result is still dropped. An exception from the function or the
+    awaitable is shown as the output's error, and `req()` leaves the output
+    empty, as in other outputs. Like the computation of other outputs, new work
+    isn't started while the output is hidden (for example, scrolled off-screen
+    in a React component that reports its visibility); it starts when the output
+    is shown again.
+
+    Parameters
+    ----------
+    cancel_superseded
+        Whether to run returned awaitables in the background, cancelling them
+        when the function is invalidated.
+
     Returns
     -------
     :
@@ -57,12 +116,184 @@ class render_json(Renderer[Jsonifiable]):
     def __init__(
         self,
         _fn: Optional[ValueFn[Any]] = None,
+        *,
+        cancel_superseded: bool = False,
     ) -> None:
+        self.cancel_superseded = cancel_superseded
+        self._task: Optional[asyncio.Task[None]] = None
+        # Work that's waiting for the output to be shown
+        self._pending: Any = None
+        # Functions from render hooks, to call when the latest work finishes
+        self._finished: List[Callable[[float, str, Any], None]] = []
+        # ("running", None), ("done", value), ("silent", None), or
+        # ("error", exception)
+        self._state: Optional[reactive.Value[Tuple[str, Any]]] = None
         super().__init__(_fn)
 
     async def transform(self, value: Jsonifiable) -> Jsonifiable:
         return value
 
+    async def render(self) -> Jsonifiable:
+        if not self.cancel_superseded:
+            if not _render_hooks:
+                return await super().render()
+            value = await self._hooked("value", self.fn)
+            if value is None:
+                return None
+            return await self._hooked("transform", lambda: self.transform(value))
+
+        if self._state is None:
+            # The function is run by an effect, so that this output depends
+            # only on the result. The effect starts the work, and is rerun
+            # (cancelling the work) when the function's inputs change.
+            self._state = reactive.value(("running", None))
+            reactive.effect(self._start)
+            reactive.effect(self._start_when_shown)
+            require_active_session(None).on_ended(self._cancel)
+
+        status, value = self._state()
+        if status == "running":
+            # Keep the output in the recalculating state, without a value
+            raise SilentOperationInProgressException()
+        if status == "silent":
+            # Like req() in a normal output: show nothing
+            raise SilentException()
+        if status == "error":
+            # Reported to the client as the output's error
+            raise value
+        if value is None:
+            return None
+        return await self._hooked("transform", lambda: self.transform(value))
+
+    async def _hooked(self, step: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        # Each hook wraps the ones added before it
+        for hook in _render_hooks:
+            fn = functools.partial(getattr(hook, step), self, fn)
+        return await fn()
+
+    async def _start(self) -> None:
+        assert self._state is not None
+        try:
+            value = await self._hooked("value", self.fn)
+        except SilentException:
+            # Includes SilentOperationInProgressException
+            self._cancel()
+            self._state.set(("silent", None))
+            return
+        except Exception as e:
+            # An exception escaping an effect would end the session, so it's
+            # raised by render() instead, like an error in a normal output
+            self._cancel()
+            self._state.set(("error", e))
+            return
+        self._cancel()
+        if not inspect.isawaitable(value):
+            self._state.set(("done", value))
+            return
+
+        self._state.set(("running", None))
+        self._pending = value
+        finished = (hook.background(self) for hook in _render_hooks)
+        self._finished = [fn for fn in finished if fn is not None]
+        with reactive.isolate():
+            hidden = self._hidden()
+        if not hidden:
+            self._start_pending()
+
+    def _start_when_shown(self) -> None:
+        if not self._hidden():
+            self._start_pending()
+
+    def _start_pending(self) -> None:
+        if self._pending is not None:
+            self._task = asyncio.ensure_future(self._run(self._pending))
+            self._pending = None
+
+    def _hidden(self) -> bool:
+        session = require_active_session(None)
+        try:
+            return bool(session.input[f".clientdata_output_{self.output_id}_hidden"]())
+        except SilentException:
+            return False
+
+    async def _run(self, awaitable: Any) -> None:
+        assert self._state is not None
+        finished = self._finished
+        start = time.time()
+        try:
+            state = ("done", await awaitable)
+        except asyncio.CancelledError:
+            raise
+        except SilentException:
+            state = ("silent", None)
+        except Exception as e:
+            state = ("error", e)
+        for fn in finished:
+            fn(start, *state)
+
+        async with reactive.lock():
+            # Cancelled while waiting for the lock
+            if self._task is not asyncio.current_task():
+                return
+            self._task = None
+            self._state.set(state)
+            await reactive.flush()
+
+    def _cancel(self) -> None:
+        if inspect.iscoroutine(self._pending):
+            # Never started, so close it to avoid a "never awaited" warning
+            self._pending.close()
+        self._pending = None
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class RenderHook:
+    """
+    Instrumentation of `render_json` outputs, such as tracing or profiling.
+
+    Subclasses override the methods they need, and are added to every output
+    with `add_render_hook()`. The methods are called with the output's session
+    active, and each hook wraps the ones added before it.
+    """
+
+    async def value(
+        self, renderer: render_json, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Compute the output's value by calling `fn`. For an output with
+        `cancel_superseded=True`, the value may be the awaitable that computes
+        it in the background.
+        """
+        return await fn()
+
+    async def transform(
+        self, renderer: render_json, fn: Callable[[], Awaitable[Jsonifiable]]
+    ) -> Jsonifiable:
+        """Transform the output's value by calling `fn`."""
+        return await fn()
+
+    def background(
+        self, renderer: render_json
+    ) -> Optional[Callable[[float, str, Any], None]]:
+        """
+        Called when an output with `cancel_superseded=True` starts work in the
+        background. The function it returns, if any, is called when the work
+        finishes, with its start time (a Unix time), and `"done"` and the value,
+        `"silent"` and None, or `"error"` and the exception.
+        """
+        return None
+
+
+_render_hooks: List[RenderHook] = []
+
+
+def add_render_hook(hook: RenderHook) -> None:
+    """Add instrumentation to every `render_json` output (see `RenderHook`)."""
+    if hook not in _render_hooks:
+        _render_hooks.append(hook)
+
 
 # This is like Jsonifiable, but where Jsonifiable uses Dict, List, and Tuple,
 # this replaces those with Mapping and Sequence. Because Dict and List are
@@ -100,3 +331,252 @@ async def post_message(session: Session, type: str, data: JsonifiableIn):
         The data to send to the client
     """
     await session.send_custom_message("shinyReactMessage", {"type": type, "data": data})
+
+
+class InputDecodeError(ValueError):
+    """An input value that doesn't match the type it was declared with."""
+
+    def __init__(self, message: str, path: Tuple[Union[str, int], ...] = ()) -> None:
+        self.message = message
+        self.path = path
+        location = "".join(
+            f"[{p}]" if isinstance(p, int) else f".{p}" for p in path
+        ).lstrip(".")
+        super().__init__(f"{location}: {message}" if location else message)
+
+
+T = TypeVar("T")
+
+# Decoders are built once per type, so decoding a value doesn't inspect types
+_input_decoders: Dict[Any, Callable[[Any], Any]] = {}
+
+
+def input_decoder(type_: Any) -> Callable[[Any], Any]:
+    """
+    Get a function that checks an input value (decoded from JSON) against a type,
+    and converts it to that type.
+
+    Supported types are `str`, `int`, `float` (which also accepts integers),
+    `bool`, `None`, `Any`, `Optional`/`Union`, `Literal`, `list`/`Sequence`,
+    `tuple[T, ...]`, `dict[str, T]`/`Mapping[str, T]`, and dataclasses, which
+    are decoded from JSON objects. Dataclass fields with defaults may be
+    missing, and keys that aren't fields are ignored.
+
+    The decoder is built from the type annotations once, and cached. It raises
+    `InputDecodeError` for values that don't match.
+    """
+    decoder = _input_decoders.get(type_)
+    if decoder is None:
+        decoder = _build_input_decoder(type_)
+        _input_decoders[type_] = decoder
+    return decoder
+
+
+def typed_input(value: Callable[[], Any], type_: Type[T]) -> Callable[[], Optional[T]]:
+    """
+    Read an input as a typed value.
+
+    Returns a reactive calc that decodes the input's value with
+    `input_decoder(type_)`, so that code using it gets (for example) a
+    dataclass instance instead of a dict that has to be checked by hand. The
+    calc returns None if the input is None.
+
+    Malformed values are rejected: a warning is issued, and the calc raises a
+    silent exception, so that reactive code depending on it doesn't run.
+
+    Parameters
+    ----------
+    value
+        The input, e.g. `input.batchdata`.
+    type_
+        The type to decode values as, typically a dataclass.
+    """
+    decode = input_decoder(type_)
+
+    @reactive.calc
+    def decoded() -> Optional[T]:
+        raw = value()
+        if raw is None:
+            return None
+        try:
+            return decode(raw)
+        except InputDecodeError as e:
+            warnings.warn(f"Rejected malformed input value: {e}", stacklevel=1)
+            raise SilentException() from e
+
+    return decoded
+
+
+def _type_name(type_: Any) -> str:
+    return getattr(type_, "__name__", None) or repr(type_)
+
+
+def _value_type_name(value: Any) -> str:
+    return type(value).__name__
+
+
+def _build_input_decoder(type_: Any) -> Callable[[Any], Any]:
+    if type_ is Any or type_ is object:
+        return lambda value: value
+
+    if type_ is None or type_ is type(None):
+
+        def decode_none(value: Any) -> None:
+            if value is not None:
+                raise InputDecodeError(f"expected null, got {_value_type_name(value)}")
+            return None
+
+        return decode_none
+
+    if type_ in (str, bool, int):
+        # Not isinstance(), because bool is a subclass of int
+        def decode_scalar(value: Any) -> Any:
+            if type(value) is not type_:
+                raise InputDecodeError(
+                    f"expected {type_.__name__}, got {_value_type_name(value)}"
+                )
+            return value
+
+        return decode_scalar
+
+    if type_ is float:
+
+        def decode_float(value: Any) -> float:
+            if type(value) is float:
+                return value
+            if type(value) is int:
+                return float(value)
+            raise InputDecodeError(f"expected float, got {_value_type_name(value)}")
+
+        return decode_float
+
+    origin = get_origin(type_)
+    args = get_args(type_)
+
+    if origin is Union or (
+        sys.version_info >= (3, 10) and origin is types.UnionType
+    ):
+        if len(args) == 2 and type(None) in args:
+            decode_inner = input_decoder(args[0] if args[1] is type(None) else args[1])
+
+            def decode_optional(value: Any) -> Any:
+                return None if value is None else decode_inner(value)
+
+            return decode_optional
+
+        decoders = [input_decoder(arg) for arg in args]
+
+        def decode_union(value: Any) -> Any:
+            for decode in decoders:
+                try:
+                    return decode(value)
+                except InputDecodeError:
+                    pass
+            raise InputDecodeError(
+                f"expected {_type_name(type_)}, got {_value_type_name(value)}"
+            )
+
+        return decode_union
+
+    if origin is Literal:
+        # Pair values with their types, so that e.g. 1 doesn't match True
+        allowed = frozenset((type(arg), arg) for arg in args)
+
+        def decode_literal(value: Any) -> Any:
+            try:
+                if (type(value), value) in allowed:
+                    return value
+            except TypeError:
+                # Unhashable
+                pass
+            raise InputDecodeError(f"expected one of {list(args)}, got {value!r}")
+
+        return decode_literal
+
+    if origin in (list, collections.abc.Sequence) or (
+        origin is tuple and len(args) == 2 and args[1] is Ellipsis
+    ):
+        decode_item = input_decoder(args[0] if args else Any)
+        make = tuple if origin is tuple else list
+
+        def decode_list(value: Any) -> Any:
+            if type(value) is not list:
+                raise InputDecodeError(f"expected list, got {_value_type_name(value)}")
+            items = []
+            for i, item in enumerate(value):
+                try:
+                    items.append(decode_item(item))
+                except InputDecodeError as e:
+                    raise InputDecodeError(e.message, (i, *e.path)) from None
+            return make(items)
+
+        return decode_list
+
+    if origin in (dict, collections.abc.Mapping):
+        if args and args[0] is not str:
+            raise TypeError(f"Input objects can only have str keys: {type_!r}")
+        decode_item = input_decoder(args[1] if args else Any)
+
+        def decode_dict(value: Any) -> Dict[str, Any]:
+            if type(value) is not dict:
+                raise InputDecodeError(
+                    f"expected object, got {_value_type_name(value)}"
+                )
+            result = {}
+            for key, item in value.items():
+                try:
+                    result[key] = decode_item(item)
+                except InputDecodeError as e:
+                    raise InputDecodeError(e.message, (key, *e.path)) from None
+            return result
+
+        return decode_dict
+
+    if dataclasses.is_dataclass(type_) and isinstance(type_, type):
+        return _build_dataclass_decoder(type_)
+
+    raise TypeError(f"Unsupported input type: {type_!r}")
+
+
+def _build_dataclass_decoder(cls: type) -> Callable[[Any], Any]:
+    # (name, decoder, required) for each field, filled in below. The decoder is
+    # cached before its fields' decoders are built, so that a dataclass can
+    # refer to itself.
+    fields: List[Tuple[str, Callable[[Any], Any], bool]] = []
+
+    def decode_dataclass(value: Any) -> Any:
+        if type(value) is not dict:
+            raise InputDecodeError(
+                f"expected {cls.__name__} object, got {_value_type_name(value)}"
+            )
+        kwargs = {}
+        for name, decode, required in fields:
+            if name in value:
+                try:
+                    kwargs[name] = decode(value[name])
+                except InputDecodeError as e:
+                    raise InputDecodeError(e.message, (name, *e.path)) from None
+            elif required:
+                raise InputDecodeError("missing", (name,))
+        return cls(**kwargs)
+
+    cached = set(_input_decoders)
+    _input_decoders[cls] = decode_dataclass
+    try:
+        hints = get_type_hints(cls)
+        for f in dataclasses.fields(cls):
+            if not f.init:
+                continue
+            required = (
+                f.default is dataclasses.MISSING
+                and f.default_factory is dataclasses.MISSING
+            )
+            fields.append((f.name, input_decoder(hints[f.name]), required))
+    except Exception:
+        # Don't leave the half-built decoder cached, or the decoders of other
+        # types built meanwhile, which may refer to it
+        for key in set(_input_decoders) - cached:
+            _input_decoders.pop(key, None)
+        raise
+
+    return decode_dataclass
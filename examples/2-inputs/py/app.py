@@ -1,10 +1,39 @@
+import asyncio
+import dataclasses
 import datetime
+import tempfile
 from pathlib import Path
-from shiny import App, Inputs, Outputs, Session
-from shinyreact import page_react, render_json
+from shiny import App, Inputs, Outputs, Session, reactive
+from shinyreact import page_react, render_json, typed_input
+from uploads import ChunkedUploads, serve_uploads
+
+# Large files are uploaded in chunks over HTTP, and written to this directory as
+# they arrive. Each upload belongs to a session, and is deleted when the session
+# ends or the file has been parsed.
+uploads = ChunkedUploads(Path(tempfile.gettempdir()) / "shiny-react-uploads")
+
+
+# The shape of the batch form's value. Values that don't match are rejected
+# before they reach the server logic.
+@dataclasses.dataclass
+class Features:
+    authentication: bool
+    notifications: bool
+    darkMode: bool
+    analytics: bool
+
+
+@dataclasses.dataclass
+class BatchData:
+    comment: str
+    priority: int
+    features: Features
 
 
 def server(input: Inputs, output: Outputs, session: Session):
+    # Let this session's client start uploads
+    uploads.attach(session)
+
     @render_json
     def txtout():
         return input.txtin().upper()
@@ -48,15 +77,73 @@ def server(input: Inputs, output: Outputs, session: Session):
     def fileout():
         return input.filein()
 
+    @reactive.calc
+    def large_upload():
+        info = input.largefilein()
+        if info is None:
+            return None
+        return uploads.get(info["id"])
+
+    # Lines parsed from the large file so far, and the task parsing them
+    parsed = reactive.value({"lines": 0, "header": None})
+    parse_task: asyncio.Task[None] | None = None
+
+    async def parse_upload(upload):
+        # Count lines (e.g. CSV rows) while the file is still uploading
+        lines = 0
+        header = None
+        async for batch in upload.iter_lines():
+            if header is None:
+                header = batch[0].decode("utf-8", errors="replace").strip()
+            lines += len(batch)
+            async with reactive.lock():
+                parsed.set({"lines": lines, "header": header})
+                await reactive.flush()
+        # Everything needed from the file has been read
+        uploads.remove(upload.id)
+
+    @reactive.effect
+    def _():
+        nonlocal parse_task
+        if parse_task is not None:
+            parse_task.cancel()
+        parsed.set({"lines": 0, "header": None})
+        upload = large_upload()
+        if upload is not None:
+            parse_task = asyncio.create_task(parse_upload(upload))
+        else:
+            parse_task = None
+
+    @session.on_ended
+    def _():
+        if parse_task is not None:
+            parse_task.cancel()
+
+    @render_json
+    def largefileout():
+        upload = large_upload()
+        if upload is None:
+            return None
+        return {
+            "name": upload.name,
+            "size": upload.size,
+            "received": upload.progress(),
+            "sha256": upload.sha256,
+            **parsed(),
+        }
+
+    batchdata = typed_input(input.batchdata, BatchData)
+
     @render_json
     def batchout():
-        data = input.batchdata()
+        data = batchdata()
         if data is None:
             return "No data submitted yet."
 
-        data["receivedAt"] = datetime.datetime.now().isoformat()
-
-        return data
+        return {
+            **dataclasses.asdict(data),
+            "receivedAt": datetime.datetime.now().isoformat(),
+        }
 
 
 app = App(
@@ -64,3 +151,4 @@ app = App(
     server,
     static_assets=str(Path(__file__).parent / "www"),
 )
+serve_uploads(app, uploads)
@@ -0,0 +1,330 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import secrets
+import time
+from pathlib import Path
+from typing import IO, AsyncIterator, Dict, List, Optional, Set
+
+from shiny import App, Session, reactive
+from starlette.requests import ClientDisconnect, Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+# Files are read back this many bytes at a time when parsing
+_READ_SIZE = 1024 * 1024
+# Data arriving in a request is written to disk in pieces of about this size
+_WRITE_SIZE = 1024 * 1024
+
+
+class QuotaExceededError(Exception):
+    """There isn't room for an upload within ChunkedUploads' `max_total`."""
+
+
+class Upload:
+    """
+    A file being uploaded in chunks, possibly over several connections.
+
+    Chunks are appended to a file on disk as they arrive, and hashed as they're
+    written, so the file never has to be held in memory. The number of bytes
+    received is a reactive value, so outputs can show the upload's progress.
+    """
+
+    def __init__(self, id: str, name: str, size: int, path: Path, owner: str):
+        self.id = id
+        self.name = name
+        self.size = size
+        self.path = path
+        # ID of the session that started the upload
+        self.owner = owner
+        self.received = 0
+        # Bytes that have been written and flushed, and can be read back
+        self._readable = 0
+        self.progress = reactive.value(0)
+        self.last_active = time.monotonic()
+        self._hash = hashlib.sha256()
+        self._sha256 = self._hash.hexdigest() if size == 0 else None
+        # Serializes writes, in case a retried chunk overlaps a stalled one
+        self._write_lock = asyncio.Lock()
+        # Set (and replaced) whenever data is appended
+        self._grew = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.received >= self.size
+
+    @property
+    def sha256(self) -> Optional[str]:
+        """Hex SHA-256 of the file, once it's complete."""
+        return self._sha256
+
+    def info(self) -> Dict[str, object]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "size": self.size,
+            "offset": self.received,
+            "sha256": self.sha256,
+        }
+
+    async def write(self, offset: int, chunks: AsyncIterator[bytes]) -> None:
+        """
+        Append a chunk, which must start at `offset` (the number of bytes
+        received so far). If the connection drops partway through, the bytes
+        that were written are kept, and the client resumes from there.
+        """
+        async with self._write_lock:
+            if offset != self.received:
+                raise ValueError("Chunk doesn't start at the end of the file")
+
+            try:
+                with open(self.path, "ab") as f:
+                    async for data in _batches(chunks, _WRITE_SIZE):
+                        if self.received + len(data) > self.size:
+                            raise ValueError("Upload is larger than its size")
+                        # Writing and hashing megabytes would stall every
+                        # session on the event loop, so they run in a thread
+                        await asyncio.to_thread(self._append, f, data)
+                        self.last_active = time.monotonic()
+            finally:
+                self._readable = self.received
+                if self.done and self._sha256 is None:
+                    self._sha256 = self._hash.hexdigest()
+                self._grew.set()
+                self._grew = asyncio.Event()
+
+        async with reactive.lock():
+            self.progress.set(self.received)
+            await reactive.flush()
+
+    async def iter_lines(self) -> AsyncIterator[List[bytes]]:
+        """
+        Yield the file's complete lines, a batch at a time, as they arrive.
+        This lets the file be parsed while it's still being uploaded. The last
+        line is yielded when the upload is done, even without a newline.
+        """
+        remainder = b""
+        position = 0
+        with open(self.path, "rb") as f:
+            while True:
+                grew = self._grew
+                available = self._readable
+                while position < available:
+                    data = await asyncio.to_thread(
+                        f.read, min(_READ_SIZE, available - position)
+                    )
+                    if not data:
+                        break
+                    position += len(data)
+                    lines = (remainder + data).split(b"\n")
+                    remainder = lines.pop()
+                    if lines:
+                        yield lines
+
+                if self.done and position >= self.size:
+                    if remainder:
+                        yield [remainder]
+                    return
+                await grew.wait()
+
+    def _append(self, f: IO[bytes], data: bytes) -> None:
+        # Counted here, so that the count matches the file even if the request
+        # is cancelled while the thread is writing
+        f.write(data)
+        f.flush()
+        self._hash.update(data)
+        self.received += len(data)
+
+
+async def _batches(chunks: AsyncIterator[bytes], size: int) -> AsyncIterator[bytes]:
+    # Request bodies arrive in small pieces; join them, so that each trip to a
+    # thread writes a useful amount
+    buffer = bytearray()
+    async for data in chunks:
+        buffer += data
+        if len(buffer) >= size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+class ChunkedUploads:
+    """
+    Resumable, chunked file uploads, received over HTTP (see `serve_uploads()`)
+    rather than through the websocket.
+
+    A client starts an upload by posting the file's name and size, along with
+    its Shiny session's ID, then sends the file in chunks, each with the offset
+    it starts at. If a chunk fails, the client asks for the current offset and
+    continues from there, so a dropped connection only costs the chunk in
+    flight.
+
+    Only sessions that have been registered with `attach()` can start uploads,
+    and an upload's file is deleted when its session ends, when it's removed
+    with `remove()` (for example, once the app has read it), or when nothing has
+    been written to it for `ttl` seconds.
+
+    Parameters
+    ----------
+    directory
+        Where to store uploaded files.
+    max_size
+        Largest file that can be uploaded, in bytes.
+    max_total
+        Most bytes that all uploads together can take up. An upload's whole size
+        counts against this from the start.
+    ttl
+        Seconds after which an upload that hasn't received data is deleted.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_size: int = 4 * 1024**3,
+        max_total: int = 16 * 1024**3,
+        ttl: float = 60 * 60,
+    ):
+        self.directory = Path(directory)
+        self.max_size = max_size
+        self.max_total = max_total
+        self.ttl = ttl
+        self._uploads: Dict[str, Upload] = {}
+        self._sessions: Set[str] = set()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.cleanup()
+
+    def attach(self, session: Session) -> None:
+        """
+        Let a session's client start uploads. They're deleted when the session
+        ends.
+        """
+        self._sessions.add(session.id)
+
+        @session.on_ended
+        def _():
+            self._sessions.discard(session.id)
+            for upload in list(self._uploads.values()):
+                if upload.owner == session.id:
+                    self.remove(upload.id)
+
+    def create(self, name: str, size: int, session_id: str) -> Upload:
+        if session_id not in self._sessions:
+            raise PermissionError("Uploads must belong to an active session")
+        if not 0 <= size <= self.max_size:
+            raise ValueError(f"File size must be between 0 and {self.max_size}")
+        self.cleanup()
+        if self.reserved() + size > self.max_total:
+            raise QuotaExceededError("Not enough space for the upload")
+
+        upload_id = secrets.token_urlsafe(16)
+        upload = Upload(
+            upload_id,
+            os.path.basename(name),
+            size,
+            self.directory / f"{upload_id}.part",
+            owner=session_id,
+        )
+        upload.path.touch()
+        self._uploads[upload_id] = upload
+        return upload
+
+    def get(self, upload_id: str) -> Optional[Upload]:
+        """The upload with the given ID, or None."""
+        return self._uploads.get(upload_id)
+
+    def remove(self, upload_id: str) -> None:
+        """Delete an upload and its file."""
+        upload = self._uploads.pop(upload_id, None)
+        if upload is not None:
+            upload.path.unlink(missing_ok=True)
+
+    def reserved(self) -> int:
+        """Bytes reserved by the current uploads."""
+        return sum(upload.size for upload in self._uploads.values())
+
+    def cleanup(self) -> None:
+        """
+        Delete uploads that haven't received data for `ttl` seconds, and files
+        left in the directory by earlier runs of the app.
+        """
+        now = time.monotonic()
+        for upload in list(self._uploads.values()):
+            if now - upload.last_active > self.ttl:
+                self.remove(upload.id)
+
+        cutoff = time.time() - self.ttl
+        known = {upload.path.name for upload in self._uploads.values()}
+        for path in self.directory.glob("*.part"):
+            try:
+                if path.name not in known and path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except OSError:
+                # Removed by another worker process
+                pass
+
+
+def serve_uploads(app: App, uploads: ChunkedUploads, path: str = "uploads") -> None:
+    """
+    Receive chunked uploads in the Shiny app, relative to the app's URL:
+
+    * `POST <path>` with a JSON body `{"name": ..., "size": ..., "session": ...}`
+      starts an upload, where `session` is the ID of a Shiny session that was
+      registered with `uploads.attach()`. The response is a 507 if there isn't
+      room for the file.
+    * `GET <path>/<id>` returns the upload's state, including `offset`, the
+      number of bytes received.
+    * `PUT <path>/<id>?offset=<n>` appends a chunk starting at byte `n`. If `n`
+      isn't the number of bytes received, the response is a 409 with the
+      correct offset.
+    """
+    path = path.strip("/")
+
+    async def start_upload(request: Request) -> Response:
+        try:
+            body = await request.json()
+            upload = uploads.create(
+                str(body["name"]), int(body["size"]), str(body["session"])
+            )
+        except PermissionError as e:
+            return JSONResponse({"error": str(e)}, status_code=403)
+        except QuotaExceededError as e:
+            return JSONResponse({"error": str(e)}, status_code=507)
+        except (ValueError, KeyError, TypeError) as e:
+            return JSONResponse({"error": str(e)}, status_code=400)
+        return JSONResponse(upload.info(), status_code=201)
+
+    async def upload_state(request: Request) -> Response:
+        upload = uploads.get(request.path_params["id"])
+        if upload is None:
+            return JSONResponse({"error": "Unknown upload"}, status_code=404)
+        return JSONResponse(upload.info())
+
+    async def upload_chunk(request: Request) -> Response:
+        upload = uploads.get(request.path_params["id"])
+        if upload is None:
+            return JSONResponse({"error": "Unknown upload"}, status_code=404)
+        try:
+            offset = int(request.query_params["offset"])
+        except (KeyError, ValueError):
+            return JSONResponse({"error": "Missing offset"}, status_code=400)
+
+        if offset != upload.received:
+            return JSONResponse(upload.info(), status_code=409)
+        try:
+            await upload.write(offset, request.stream())
+        except ClientDisconnect:
+            # The client will ask where to resume
+            return Response(status_code=499)
+        except ValueError as e:
+            return JSONResponse({"error": str(e), **upload.info()}, status_code=409)
+        return JSONResponse(upload.info())
+
+    # Ahead of the app's own routes, which include a catch-all for static files
+    app.starlette_app.router.routes[0:0] = [
+        Route(f"/{path}", start_upload, methods=["POST"]),
+        Route(f"/{path}/{{id}}", upload_state, methods=["GET"]),
+        Route(f"/{path}/{{id}}", upload_chunk, methods=["PUT"]),
+    ]
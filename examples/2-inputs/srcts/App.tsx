@@ -4,6 +4,7 @@ import ButtonInputCard from "./ButtonInputCard";
 import CheckboxInputCard from "./CheckboxInputCard";
 import DateInputCard from "./DateInputCard";
 import FileInputCard from "./FileInputCard";
+import LargeFileInputCard from "./LargeFileInputCard";
 import NumberInputCard from "./NumberInputCard";
 import RadioInputCard from "./RadioInputCard";
 import SelectInputCard from "./SelectInputCard";
@@ -24,6 +25,7 @@ function App() {
         <DateInputCard />
         <ButtonInputCard />
         <FileInputCard />
+        <LargeFileInputCard />
         <BatchFormCard />
       </div>
     </div>
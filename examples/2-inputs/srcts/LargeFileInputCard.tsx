@@ -0,0 +1,211 @@
+import { useShinyInput, useShinyOutput } from "@posit/shiny-react";
+import React, { useEffect, useRef, useState } from "react";
+import InputOutputCard from "./InputOutputCard";
+
+// Size of each chunk sent to the server. A failed chunk is retried from the
+// last byte the server received, so this bounds how much is resent.
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_RETRIES = 8;
+
+// Uploads started in this page, by file, so that selecting the same file again
+// after a failure resumes its upload. The server deletes a session's uploads
+// when the session ends, so they can't be resumed after reloading the page.
+const uploadIds = new Map<string, string>();
+
+type UploadState = {
+  id: string;
+  offset: number;
+};
+
+type LargeFileOutput = {
+  name: string;
+  size: number;
+  received: number;
+  sha256: string | null;
+  lines: number;
+  header: string | null;
+} | null;
+
+function sleep(ms: number): Promise<void> {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function fetchJson(url: string, init?: RequestInit) {
+  const response = await fetch(url, init);
+  // A 409 means the chunk didn't start where the server expected, and carries
+  // the offset to continue from.
+  if (!response.ok && response.status !== 409) {
+    throw new Error(`Upload request failed: ${response.status}`);
+  }
+  return (await response.json()) as UploadState;
+}
+
+/**
+ * Upload a file in chunks to the server's `uploads` route. Selecting the same
+ * file again (for example, after the network failed) resumes the upload
+ * instead of restarting it.
+ */
+async function uploadFile(
+  file: File,
+  onStart: (id: string) => void,
+  onProgress: (offset: number) => void,
+  signal: AbortSignal
+): Promise<void> {
+  const key = `${file.name}:${file.size}:${file.lastModified}`;
+
+  let state: UploadState | null = null;
+  const savedId = uploadIds.get(key);
+  if (savedId) {
+    try {
+      state = await fetchJson(`uploads/${savedId}`, { signal });
+    } catch {
+      // The server no longer has it; start over
+      state = null;
+    }
+  }
+  if (!state) {
+    state = await fetchJson("uploads", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        name: file.name,
+        size: file.size,
+        // The upload belongs to this session
+        session: window.Shiny.shinyapp?.config?.sessionId,
+      }),
+      signal,
+    });
+    uploadIds.set(key, state.id);
+  }
+
+  const id = state.id;
+  let offset = state.offset;
+  onStart(id);
+  onProgress(offset);
+
+  let retries = 0;
+  while (offset < file.size) {
+    try {
+      state = await fetchJson(`uploads/${id}?offset=${offset}`, {
+        method: "PUT",
+        body: file.slice(offset, offset + CHUNK_SIZE),
+        signal,
+      });
+      offset = state.offset;
+      retries = 0;
+    } catch (err) {
+      if (signal.aborted || retries >= MAX_RETRIES) {
+        throw err;
+      }
+      retries++;
+      await sleep(Math.min(500 * 2 ** retries, 30000));
+      // Part of the chunk may have arrived; ask where to continue from
+      try {
+        offset = (await fetchJson(`uploads/${id}`, { signal })).offset;
+      } catch {
+        // Still unreachable; try again from the same offset
+      }
+    }
+    onProgress(offset);
+  }
+
+  uploadIds.delete(key);
+}
+
+function LargeFileInputCard() {
+  const inputRef = useRef<HTMLInputElement>(null);
+  const [file, setFile] = useState<File | null>(null);
+  const [uploaded, setUploaded] = useState(0);
+  const [error, setError] = useState<string | null>(null);
+  const [, setUploadInfo] = useShinyInput<{
+    id: string;
+    name: string;
+    size: number;
+  } | null>("largefilein", null, { debounceMs: 0 });
+  const [largefileout] = useShinyOutput<LargeFileOutput>(
+    "largefileout",
+    null
+  );
+
+  useEffect(() => {
+    if (!file) return;
+
+    const controller = new AbortController();
+    setUploaded(0);
+    setError(null);
+
+    uploadFile(
+      file,
+      // The server can start parsing the file as soon as the upload starts
+      (id) => setUploadInfo({ id, name: file.name, size: file.size }),
+      setUploaded,
+      controller.signal
+    ).catch((err: Error) => {
+      if (!controller.signal.aborted) {
+        setError(err.message);
+      }
+    });
+
+    return () => controller.abort();
+  }, [file, setUploadInfo]);
+
+  const handleInputChange = (event: React.ChangeEvent<HTMLInputElement>) => {
+    setFile(event.target.files?.[0] ?? null);
+    // Allow selecting the same file again, to resume a failed upload
+    event.target.value = "";
+  };
+
+  const percent = file && file.size > 0 ? (100 * uploaded) / file.size : 0;
+
+  const inputElement = (
+    <div>
+      <input
+        ref={inputRef}
+        type='file'
+        onChange={handleInputChange}
+        style={{ display: "none" }}
+      />
+      <div
+        className='file-drop-zone'
+        onClick={() => inputRef.current?.click()}
+      >
+        <div className='file-drop-content'>
+          {file ? (
+            <>
+              <div className='file-drop-text'>
+                {file.name} ({Math.round(file.size / 1024)} KB)
+              </div>
+              <progress className='upload-progress' value={percent} max={100} />
+              <div className='file-drop-hint'>
+                {error
+                  ? `${error}. Select the file again to resume.`
+                  : `${percent.toFixed(1)}% uploaded`}
+              </div>
+            </>
+          ) : (
+            <>
+              <div className='file-drop-text'>Click to select a large file</div>
+              <div className='file-drop-hint'>
+                Uploaded in chunks; interrupted uploads can be resumed
+              </div>
+            </>
+          )}
+        </div>
+      </div>
+    </div>
+  );
+  const outputElement = (
+    <pre className='code-output'>{JSON.stringify(largefileout, null, 2)}</pre>
+  );
+
+  return (
+    <InputOutputCard
+      title='Large File Input'
+      inputElement={inputElement}
+      outputValue={outputElement}
+      layout='vertical'
+    />
+  );
+}
+
+export default LargeFileInputCard;
@@ -1,13 +1,65 @@
 from __future__ import annotations
 
-from shiny import App, Inputs, Outputs, Session, render
+from shiny import App, Inputs, Outputs, Session, reactive
 from shinyreact import page_react, render_json
+from plotoutput import (
+    PlotExecutor,
+    PlotStore,
+    plot_job,
+    render_plot,
+    serve_plots,
+)
+from pointindex import PointIndex
+from prefixstats import PrefixStats
+from shareddata import share_frame
 from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.figure import Figure
+
+# With multiple worker processes, the data is read once and shared among them.
+# The file's modification time is part of the name, so that a changed file isn't
+# served from an old block.
+mtcars_path = Path(__file__).parent / "mtcars.csv"
+mtcars = share_frame(
+    f"mtcars-{int(mtcars_path.stat().st_mtime)}", lambda: pd.read_csv(mtcars_path)
+)
+
+# Summary statistics for every number of leading rows, so that moving the slider
+# doesn't rescan the data
+mtcars_stats = PrefixStats(mtcars)
+
+# Plots are drawn in worker processes, so that drawing one doesn't hold up other
+# sessions.
+plot_executor = PlotExecutor(max_workers=2, max_pending=16, timeout=20)
+
+# Plot images are served over HTTP, so browsers can fetch them in parallel and
+# cache them, rather than receiving them through the websocket.
+plot_store = PlotStore()
+
+
+def draw_mpg_vs_weight(fig: Figure, mtcars_subset: pd.DataFrame):
+    # This runs in a worker process, so it must be defined at the top level
+    ax = fig.subplots()
+
+    # Create a scatter plot of mpg vs wt
+    ax.scatter(
+        mtcars_subset["wt"],
+        mtcars_subset["mpg"],
+        color="steelblue",
+        alpha=0.7,
+        s=60,
+    )
 
-mtcars = pd.read_csv(Path(__file__).parent / "mtcars.csv")
+    # Add a trend line
+    z = np.polyfit(mtcars_subset["wt"], mtcars_subset["mpg"], 1)
+    p = np.poly1d(z)
+    ax.plot(mtcars_subset["wt"], p(mtcars_subset["wt"]), "r--", alpha=0.8, linewidth=2)
+
+    ax.set_xlabel("Weight (1000 lbs)")
+    ax.set_ylabel("Miles per Gallon")
+    ax.set_title(f"MPG vs Weight - {len(mtcars_subset)} cars")
+    ax.grid(True, alpha=0.3)
 
 
 def server(input: Inputs, output: Outputs, session: Session):
@@ -27,45 +79,38 @@ def server(input: Inputs, output: Outputs, session: Session):
     @render_json
     def table_stats():
         num_rows = input.table_rows()
-        mtcars_subset = mtcars.head(num_rows)
 
         # Return some summary statistics
-        return {
-            "colname": "mpg",
-            "mean": float(mtcars_subset["mpg"].mean()),
-            "median": float(mtcars_subset["mpg"].median()),
-            "min": float(mtcars_subset["mpg"].min()),
-            "max": float(mtcars_subset["mpg"].max()),
-        }
+        return {"colname": "mpg", **mtcars_stats.head(num_rows)["mpg"]}
 
-    @render.plot()
+    # Plots are cached by row count and size, so moving the slider back to a
+    # previous value, or another session viewing the same plot, doesn't redraw it.
+    @render_plot(
+        cache_key=lambda: input.table_rows(),
+        # WebP is a fraction of the size of PNG, in browsers that support it
+        format=("webp", "png"),
+        store=plot_store,
+        executor=plot_executor,
+    )
     def plot1():
         num_rows = input.table_rows()
-        mtcars_subset = mtcars.head(num_rows)
-
-        # Create a scatter plot of mpg vs wt
-        fig, ax = plt.subplots(figsize=(8, 6))
-        ax.scatter(
-            mtcars_subset["wt"],
-            mtcars_subset["mpg"],
-            color="steelblue",
-            alpha=0.7,
-            s=60,
-        )
+        return plot_job(draw_mpg_vs_weight, mtcars.head(num_rows))
 
-        # Add a trend line
-        z = np.polyfit(mtcars_subset["wt"], mtcars_subset["mpg"], 1)
-        p = np.poly1d(z)
-        ax.plot(
-            mtcars_subset["wt"], p(mtcars_subset["wt"]), "r--", alpha=0.8, linewidth=2
-        )
+    # Index of the plotted points, for finding the ones under the pointer
+    @reactive.calc
+    def plot1_points():
+        mtcars_subset = mtcars.head(input.table_rows())
+        return PointIndex(mtcars_subset["wt"], mtcars_subset["mpg"])
 
-        ax.set_xlabel("Weight (1000 lbs)")
-        ax.set_ylabel("Miles per Gallon")
-        ax.set_title(f"MPG vs Weight - {len(mtcars_subset)} cars")
-        ax.grid(True, alpha=0.3)
-
-        return fig
+    @render_json
+    def plot1_selection():
+        models = mtcars["model"].head(input.table_rows())
+        hovered = plot1_points().hovered(input.plot1_hover())
+        brushed = plot1_points().brushed(input.plot1_brush())
+        return {
+            "hovered": None if hovered is None else models.iloc[hovered],
+            "brushed": models.iloc[brushed].tolist(),
+        }
 
 
 app = App(
@@ -73,3 +118,4 @@ app = App(
     server,
     static_assets=str(Path(__file__).parent / "www"),
 )
+serve_plots(app, plot_store)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import math
+from typing import Any, List, Mapping, Optional
+
+import numpy as np
+
+
+class PointIndex:
+    """
+    A k-d tree over the x/y positions of a plot's points, for finding the
+    points under a hover, click, or brush from ImageOutput.
+
+    The tree is balanced and implicit: each node covers a contiguous slice of a
+    permutation of the points, split at the median, and holds the bounding box
+    of its points. Finding the nearest point takes O(log n) time, and a brush
+    takes O(log n) time plus the number of points it selects (whole subtrees
+    inside the brush are taken without looking at their points).
+
+    Points with missing coordinates are never matched.
+    """
+
+    def __init__(self, x: Any, y: Any, leaf_size: int = 32):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        if self.x.shape != self.y.shape or self.x.ndim != 1:
+            raise ValueError("x and y must be one-dimensional and the same length")
+
+        order = np.flatnonzero(~(np.isnan(self.x) | np.isnan(self.y)))
+        n = len(order)
+        depth = max(0, math.ceil(math.log2(n / leaf_size))) if n > 0 else 0
+        n_nodes = 2 ** (depth + 1) - 1
+        self._first_leaf = 2**depth - 1
+
+        self._lo = np.zeros(n_nodes, dtype=np.int64)
+        self._hi = np.zeros(n_nodes, dtype=np.int64)
+        # Columns are xmin, xmax, ymin, ymax. Empty nodes get an inverted box,
+        # which no query overlaps.
+        self._bbox = np.tile([np.inf, -np.inf, np.inf, -np.inf], (n_nodes, 1))
+        self._hi[0] = n
+
+        coords = (self.x, self.y)
+        for node in range(n_nodes):
+            lo, hi = int(self._lo[node]), int(self._hi[node])
+            if hi == lo:
+                if node < self._first_leaf:
+                    self._lo[2 * node + 1 : 2 * node + 3] = lo
+                    self._hi[2 * node + 1 : 2 * node + 3] = lo
+                continue
+
+            idx = order[lo:hi]
+            xs, ys = self.x[idx], self.y[idx]
+            self._bbox[node] = (xs.min(), xs.max(), ys.min(), ys.max())
+            if node >= self._first_leaf:
+                continue
+
+            # Split the wider side of the box (relative to the whole data set)
+            bx0, bx1, by0, by1 = self._bbox[node]
+            rx0, rx1, ry0, ry1 = self._bbox[0]
+            x_extent = (bx1 - bx0) / ((rx1 - rx0) or 1)
+            y_extent = (by1 - by0) / ((ry1 - ry0) or 1)
+            values = coords[0 if x_extent >= y_extent else 1][idx]
+
+            mid = (lo + hi) // 2
+            if mid > lo:
+                order[lo:hi] = idx[np.argpartition(values, mid - lo)]
+            left, right = 2 * node + 1, 2 * node + 2
+            self._lo[left], self._hi[left] = lo, mid
+            self._lo[right], self._hi[right] = mid, hi
+
+        self._order = order
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def nearest(
+        self,
+        x: float,
+        y: float,
+        max_distance: float = math.inf,
+        x_scale: float = 1,
+        y_scale: float = 1,
+    ) -> Optional[int]:
+        """
+        The position of the point nearest to (x, y), or None if there is none
+        within `max_distance`. Distances are measured after multiplying x and y
+        differences by `x_scale` and `y_scale`, e.g. to measure in pixels.
+        """
+        if len(self) == 0:
+            return None
+        best = max_distance**2
+        best_index: Optional[int] = None
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self._box_distance2(node, x, y, x_scale, y_scale) > best:
+                continue
+
+            if node >= self._first_leaf:
+                idx = self._order[self._lo[node] : self._hi[node]]
+                if len(idx) == 0:
+                    continue
+                d2 = ((self.x[idx] - x) * x_scale) ** 2 + (
+                    (self.y[idx] - y) * y_scale
+                ) ** 2
+                i = int(np.argmin(d2))
+                if d2[i] <= best:
+                    best = float(d2[i])
+                    best_index = int(idx[i])
+                continue
+
+            # Visit the nearer child first; it's pushed last
+            left, right = 2 * node + 1, 2 * node + 2
+            if self._box_distance2(
+                left, x, y, x_scale, y_scale
+            ) <= self._box_distance2(right, x, y, x_scale, y_scale):
+                stack.extend((right, left))
+            else:
+                stack.extend((left, right))
+
+        return best_index
+
+    def within(self, xmin: float, xmax: float, ymin: float, ymax: float) -> np.ndarray:
+        """Positions of the points inside a rectangle, in increasing order."""
+        found: List[np.ndarray] = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            bx0, bx1, by0, by1 = self._bbox[node]
+            if bx0 > xmax or bx1 < xmin or by0 > ymax or by1 < ymin:
+                continue
+
+            idx = self._order[self._lo[node] : self._hi[node]]
+            if xmin <= bx0 and bx1 <= xmax and ymin <= by0 and by1 <= ymax:
+                found.append(idx)
+            elif node >= self._first_leaf:
+                xs, ys = self.x[idx], self.y[idx]
+                found.append(
+                    idx[(xs >= xmin) & (xs <= xmax) & (ys >= ymin) & (ys <= ymax)]
+                )
+            else:
+                stack.extend((2 * node + 1, 2 * node + 2))
+
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(found))
+
+    def hovered(
+        self, event: Optional[Mapping[str, Any]], max_distance: float = 5
+    ) -> Optional[int]:
+        """
+        The position of the point under a hover or click event from ImageOutput,
+        within `max_distance` CSS pixels, or None. Events over a panel whose
+        domain has no width or height never match.
+        """
+        if event is None:
+            return None
+        domain, range_ = event["domain"], event["range"]
+        if domain["right"] == domain["left"] or domain["top"] == domain["bottom"]:
+            return None
+        # Pixels per data unit, so that distances are measured on screen
+        x_scale = abs(
+            (range_["right"] - range_["left"]) / (domain["right"] - domain["left"])
+        )
+        y_scale = abs(
+            (range_["bottom"] - range_["top"]) / (domain["top"] - domain["bottom"])
+        )
+        return self.nearest(event["x"], event["y"], max_distance, x_scale, y_scale)
+
+    def brushed(self, event: Optional[Mapping[str, Any]]) -> np.ndarray:
+        """Positions of the points inside a brush event from ImageOutput."""
+        if event is None:
+            return np.empty(0, dtype=np.int64)
+        return self.within(event["xmin"], event["xmax"], event["ymin"], event["ymax"])
+
+    def _box_distance2(
+        self, node: int, x: float, y: float, x_scale: float, y_scale: float
+    ) -> float:
+        bx0, bx1, by0, by1 = self._bbox[node]
+        if bx0 > bx1:
+            return math.inf
+        dx = max(bx0 - x, 0.0, x - bx1) * x_scale
+        dy = max(by0 - y, 0.0, y - by1) * y_scale
+        return dx * dx + dy * dy
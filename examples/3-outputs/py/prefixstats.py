@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Summary statistics for a run of rows of one column
+ColumnStats = Dict[str, Optional[float]]
+
+
+class PrefixStats:
+    """
+    Precomputed summary statistics (mean, median, min, and max) for the numeric
+    columns of a data frame, which answer queries about any number of leading
+    rows in constant time.
+
+    For each column, this stores cumulative sums, running minimums and
+    maximums, and the median of every prefix. The medians are computed all at
+    once with a wavelet matrix (see `_WaveletMatrix`), in O(n log n) time.
+
+    With `ranges=True`, the statistics for any range of rows can also be
+    queried: sums from the cumulative sums, minimums and maximums from sparse
+    tables in constant time, and medians from a wavelet matrix in O(log n)
+    time. These take O(n log n) memory per column (several hundred bytes per row
+    for a million rows), so they're only built when asked for. Without them,
+    `range()` still works, but takes time proportional to the size of the range.
+
+    The data is treated as immutable. Columns must not contain missing values.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        columns: Optional[Sequence[str]] = None,
+        ranges: bool = False,
+    ):
+        if columns is None:
+            columns = list(df.select_dtypes("number").columns)
+
+        self.columns: List[str] = list(columns)
+        self._n = len(df)
+        self._values: Dict[str, np.ndarray] = {}
+        self._cumsums: Dict[str, np.ndarray] = {}
+        self._cummins: Dict[str, np.ndarray] = {}
+        self._cummaxs: Dict[str, np.ndarray] = {}
+        self._medians: Dict[str, np.ndarray] = {}
+        self._min_tables: Dict[str, List[np.ndarray]] = {}
+        self._max_tables: Dict[str, List[np.ndarray]] = {}
+        self._wavelets: Dict[str, _WaveletMatrix] = {}
+
+        for col in self.columns:
+            values = df[col].to_numpy(dtype=np.float64)
+            if np.isnan(values).any():
+                raise ValueError(f"Column {col!r} contains missing values")
+            self._values[col] = values
+            if self._n == 0:
+                continue
+
+            # Leading zero, so the sum of rows [i, j) is cumsum[j] - cumsum[i]
+            cumsum = np.zeros(self._n + 1)
+            np.cumsum(values, out=cumsum[1:])
+            self._cumsums[col] = cumsum
+            self._cummins[col] = np.minimum.accumulate(values)
+            self._cummaxs[col] = np.maximum.accumulate(values)
+
+            wavelet = _WaveletMatrix(values)
+            self._medians[col] = wavelet.median(0, np.arange(1, self._n + 1))
+            if ranges:
+                self._wavelets[col] = wavelet
+                self._min_tables[col] = _sparse_table(values, np.minimum)
+                self._max_tables[col] = _sparse_table(values, np.maximum)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def head(self, n: int) -> Dict[str, ColumnStats]:
+        """Statistics for the first `n` rows (like `df.head(n)`) of each column."""
+        n = min(max(n, 0), self._n)
+        if n == 0:
+            return {col: _empty_stats() for col in self.columns}
+
+        return {
+            col: {
+                "mean": float(self._cumsums[col][n] / n),
+                "median": float(self._medians[col][n - 1]),
+                "min": float(self._cummins[col][n - 1]),
+                "max": float(self._cummaxs[col][n - 1]),
+            }
+            for col in self.columns
+        }
+
+    def range(self, start: int, stop: int) -> Dict[str, ColumnStats]:
+        """Statistics for rows `start` (inclusive) to `stop` (exclusive)."""
+        start, stop, _ = slice(start, stop).indices(self._n)
+        n = stop - start
+        if n <= 0:
+            return {col: _empty_stats() for col in self.columns}
+        if start == 0:
+            return self.head(stop)
+
+        result: Dict[str, ColumnStats] = {}
+        for col in self.columns:
+            mean = (self._cumsums[col][stop] - self._cumsums[col][start]) / n
+            if col in self._wavelets:
+                median = self._wavelets[col].median(start, stop)
+                min_value = _sparse_table_query(
+                    self._min_tables[col], np.minimum, start, stop
+                )
+                max_value = _sparse_table_query(
+                    self._max_tables[col], np.maximum, start, stop
+                )
+            else:
+                values = self._values[col][start:stop]
+                median = np.median(values)
+                min_value = values.min()
+                max_value = values.max()
+
+            result[col] = {
+                "mean": float(mean),
+                "median": float(median),
+                "min": float(min_value),
+                "max": float(max_value),
+            }
+        return result
+
+
+def _empty_stats() -> ColumnStats:
+    return {"mean": None, "median": None, "min": None, "max": None}
+
+
+def _sparse_table(values: np.ndarray, op: np.ufunc) -> List[np.ndarray]:
+    # Level j holds op() over each run of 2**j rows
+    table = [values]
+    width = 1
+    while 2 * width <= len(values):
+        prev = table[-1]
+        table.append(op(prev[:-width], prev[width:]))
+        width *= 2
+    return table
+
+
+def _sparse_table_query(
+    table: List[np.ndarray], op: np.ufunc, start: int, stop: int
+) -> float:
+    # Two (possibly overlapping) runs of 2**j rows cover the range
+    j = (stop - start).bit_length() - 1
+    return op(table[j][start], table[j][stop - (1 << j)])
+
+
+class _WaveletMatrix:
+    """
+    A wavelet matrix over the ranks of a column's values, which finds the k-th
+    smallest value in any range of rows in O(log n) time.
+
+    Each value is replaced by its rank (0 to n-1, breaking ties by position).
+    Level i holds one bit of every rank, from the most significant bit down,
+    with the rows stably sorted by the higher bits. Walking down the levels
+    narrows a range of rows to those whose ranks share the bits of the answer.
+    """
+
+    def __init__(self, values: np.ndarray):
+        n = len(values)
+        order = np.argsort(values, kind="stable")
+        self.sorted_values = values[order]
+        ranks = np.empty(n, dtype=np.int64)
+        ranks[order] = np.arange(n)
+
+        self.n_levels = max(1, (n - 1).bit_length())
+        # zeros[i, j] is the number of zero bits in level i before row j
+        self.zeros = np.zeros((self.n_levels, n + 1), dtype=np.int32)
+        self.n_zeros = np.empty(self.n_levels, dtype=np.int64)
+        for i in range(self.n_levels):
+            is_zero = ((ranks >> (self.n_levels - 1 - i)) & 1) == 0
+            np.cumsum(is_zero, dtype=np.int32, out=self.zeros[i, 1:])
+            self.n_zeros[i] = self.zeros[i, n]
+            ranks = np.concatenate([ranks[is_zero], ranks[~is_zero]])
+
+    def kth(self, start, stop, k) -> np.ndarray:
+        """
+        The k-th smallest (from 0) value in rows `start` to `stop`. Arguments
+        can be arrays, to answer many queries at once.
+        """
+        start, stop, k = (
+            np.array(x, dtype=np.int64) for x in np.broadcast_arrays(start, stop, k)
+        )
+        rank = np.zeros_like(k)
+        for i in range(self.n_levels):
+            zeros_start = self.zeros[i, start]
+            zeros_stop = self.zeros[i, stop]
+            count = zeros_stop - zeros_start
+            # Does the answer have a zero bit in this level?
+            left = k < count
+            rank |= (~left).astype(np.int64) << (self.n_levels - 1 - i)
+            k = np.where(left, k, k - count)
+            start = np.where(left, zeros_start, self.n_zeros[i] + start - zeros_start)
+            stop = np.where(left, zeros_stop, self.n_zeros[i] + stop - zeros_stop)
+        return self.sorted_values[rank]
+
+    def median(self, start, stop) -> np.ndarray:
+        n = np.asarray(stop) - np.asarray(start)
+        return (self.kth(start, stop, (n - 1) // 2) + self.kth(start, stop, n // 2)) / 2
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import struct
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Pyodide (Shinylive) has no shared memory support
+    shared_memory = None
+
+# Column data is aligned to this many bytes within the shared block
+_ALIGN = 64
+
+# The block starts with the length of the JSON header. It is written last, so a
+# length of zero means that the publishing process is still filling the block --
+# or that it died before finishing.
+_LENGTH = struct.Struct("<Q")
+
+# Keep attached blocks open for the lifetime of the process; the data frames
+# returned by share_frames() are views into them.
+_attached: Dict[str, "shared_memory.SharedMemory"] = {}
+
+
+def share_frames(
+    name: str,
+    factory: Callable[[], Dict[str, pd.DataFrame]],
+    timeout: float = 30,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Share a set of immutable data frames across worker processes.
+
+    The first process to call this with a given name calls `factory()` and
+    copies the resulting data frames into a shared memory block. Every other
+    process attaches to that block, and gets data frames whose columns are
+    read-only, zero-copy views of it. With N workers, the data is generated
+    once and held in memory once, instead of N times.
+
+    The process that creates the block unlinks it when it exits; processes
+    that are attached keep using their copy, and the next process to start
+    creates the block again. Include a version in `name` if the data can
+    change, and call `unlink_frames()` to remove an old version that a running
+    process created. If a process died while creating the block, so that it's
+    still incomplete after `timeout` seconds, it's removed and created again.
+
+    If shared memory is not available (as in Shinylive), this simply returns the
+    result of `factory()`.
+
+    Parameters
+    ----------
+    name
+        Name of the shared memory block. Keep it short; some platforms limit
+        names to 31 characters.
+    factory
+        A function that returns a dict of data frames. Columns must be numeric,
+        boolean, datetime, or strings. String columns are stored in the block,
+        but pandas converts them to Python objects in each process.
+    timeout
+        Seconds to wait for another process to finish publishing the data.
+
+    Returns
+    -------
+    :
+        A dict of data frames, with the same keys as returned by `factory()`.
+    """
+    if shared_memory is None:
+        return factory()
+
+    try:
+        shm = _open_sized(name, timeout)
+    except FileNotFoundError:
+        shm = None
+    if shm is not None:
+        try:
+            return _attach(shm, timeout)
+        except TimeoutError:
+            # The process that created the block died before filling it in
+            _unlink(shm)
+            shm.close()
+
+    frames = factory()
+    try:
+        shm = _publish(name, frames)
+    except FileExistsError:
+        # Another worker won the race to publish
+        return _attach(_open_sized(name, timeout), timeout)
+    except OSError:
+        # No usable shared memory (e.g. /dev/shm is too small); fall back to a
+        # private copy.
+        return frames
+
+    # Don't leave the block behind after the app shuts down. Other processes
+    # that are attached to it keep their mapping.
+    atexit.register(_unlink_at_exit, shm)
+    return _attach(shm, timeout)
+
+
+def share_frame(
+    name: str, factory: Callable[[], pd.DataFrame], timeout: float = 30
+) -> pd.DataFrame:
+    """
+    Share a single immutable data frame across worker processes.
+
+    See `share_frames()` for details.
+    """
+    return share_frames(name, lambda: {"data": factory()}, timeout=timeout)["data"]
+
+
+def unlink_frames(name: str) -> None:
+    """Remove a shared memory block created by `share_frames()`, if it exists."""
+    if shared_memory is None:
+        return
+    try:
+        shm = _open(name)
+    except FileNotFoundError:
+        return
+    _unlink(shm)
+    if name not in _attached:
+        shm.close()
+
+
+def _open(name: str, create: bool = False, size: int = 0):
+    if name in _attached and not create:
+        return _attached[name]
+
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    if os.name == "posix":
+        # Before Python 3.13, every process that opens a block registers it with
+        # the resource tracker, which unlinks it when that process exits --
+        # removing it out from under the other workers.
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+    return shm
+
+
+def _open_sized(name: str, timeout: float):
+    # A block that another process has only just created has no size until that
+    # process sets it, and opening it in the meantime fails with a ValueError
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return _open(name)
+        except ValueError:
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Timed out waiting for shared data {name!r}"
+                ) from None
+            time.sleep(0.05)
+
+
+def _unlink(shm) -> None:
+    if os.name == "posix":
+        # unlink() unregisters the block, so it must be registered first
+        resource_tracker.register(shm._name, "shared_memory")  # type: ignore
+    shm.unlink()
+
+
+def _unlink_at_exit(shm) -> None:
+    try:
+        _unlink(shm)
+    except FileNotFoundError:
+        # Already removed, e.g. with unlink_frames()
+        pass
+
+
+def _column_array(col: pd.Series) -> np.ndarray:
+    arr = col.to_numpy()
+    if arr.dtype == object:
+        # Strings are stored as fixed-width unicode so they can live in the block
+        arr = arr.astype(str)
+    if arr.dtype.hasobject:
+        raise TypeError(f"Column {col.name!r} can't be stored in shared memory")
+    return np.ascontiguousarray(arr)
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def _publish(name: str, frames: Dict[str, pd.DataFrame]):
+    arrays: list[np.ndarray] = []
+    layout: dict[str, list[dict]] = {}
+    offset = 0
+    for key, df in frames.items():
+        layout[key] = []
+        for col_name in df.columns:
+            arr = _column_array(df[col_name])
+            arrays.append(arr)
+            layout[key].append(
+                {
+                    "name": col_name,
+                    "dtype": arr.dtype.str,
+                    "length": len(arr),
+                    "offset": offset,
+                }
+            )
+            offset = _align(offset + arr.nbytes)
+
+    header = json.dumps(layout).encode("utf-8")
+    data_start = _align(_LENGTH.size + len(header))
+
+    shm = _open(name, create=True, size=max(data_start + offset, 1))
+    try:
+        columns = [c for key in layout for c in layout[key]]
+        for arr, col in zip(arrays, columns):
+            start = data_start + col["offset"]
+            shm.buf[start : start + arr.nbytes] = arr.view(np.uint8).reshape(-1)
+        shm.buf[_LENGTH.size : _LENGTH.size + len(header)] = header
+        _LENGTH.pack_into(shm.buf, 0, len(header))
+    except BaseException:
+        _unlink(shm)
+        shm.close()
+        raise
+
+    return shm
+
+
+def _attach(shm, timeout: float) -> Dict[str, pd.DataFrame]:
+    deadline = time.monotonic() + timeout
+    while (header_len := _LENGTH.unpack_from(shm.buf, 0)[0]) == 0:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for shared data {shm.name!r}")
+        time.sleep(0.05)
+
+    layout = json.loads(bytes(shm.buf[_LENGTH.size : _LENGTH.size + header_len]))
+    data_start = _align(_LENGTH.size + header_len)
+
+    frames: Dict[str, pd.DataFrame] = {}
+    for key, columns in layout.items():
+        data: Dict[str, np.ndarray] = {}
+        for col in columns:
+            arr = np.ndarray(
+                shape=(col["length"],),
+                dtype=np.dtype(col["dtype"]),
+                buffer=shm.buf,
+                offset=data_start + col["offset"],
+            )
+            arr.flags.writeable = False
+            data[col["name"]] = arr
+        # copy=False keeps each column as a view of the shared block
+        frames[key] = pd.DataFrame(data, copy=False)
+
+    _attached[shm.name] = shm
+    return frames
@@ -1,13 +1,34 @@
-import { ImageOutput } from "@posit/shiny-react";
+import { ImageOutput, useShinyOutput } from "@posit/shiny-react";
 import React from "react";
 import Card from "./Card";
 
+interface PlotSelection {
+  hovered: string | null;
+  brushed: string[];
+}
+
 function PlotCard() {
+  const [selection] = useShinyOutput<PlotSelection | undefined>(
+    "plot1_selection",
+    undefined
+  );
+
   return (
     <Card title='Plot output'>
       <div className='plot-section'>
         <div className='plot-container'>
-          <ImageOutput id='plot1' className='data-plot' />
+          <ImageOutput
+            id='plot1'
+            className='data-plot'
+            hoverId='plot1_hover'
+            brushId='plot1_brush'
+          />
+        </div>
+        <div className='plot-selection'>
+          {selection?.hovered ?? "Hover over a point, or drag to select"}
+          {selection && selection.brushed.length > 0 && (
+            <div>Selected: {selection.brushed.join(", ")}</div>
+          )}
         </div>
       </div>
     </Card>
@@ -1,11 +1,18 @@
 from __future__ import annotations
 
-from shiny import App, Inputs, Outputs, Session, render, reactive
+from shiny import App, Inputs, Outputs, Session, reactive
 from shinyreact import page_react, render_json
+from plotoutput import (
+    PlotExecutor,
+    PlotStore,
+    plot_job,
+    render_plot,
+    serve_plots,
+)
 from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
+from matplotlib.figure import Figure
 from datetime import datetime
 
 # Generate sample data
@@ -18,6 +25,32 @@ sample_data = pd.DataFrame(
     }
 )
 
+# Plots are drawn in a worker process, so that drawing one doesn't hold up other
+# sessions.
+plot_executor = PlotExecutor(max_workers=1, timeout=20)
+
+# Send plots as URLs (see serve_plots() below), so the browser caches them
+plot_store = PlotStore()
+
+
+def draw_age_vs_score(fig: Figure, data: pd.DataFrame):
+    # This runs in a worker process, so it must be defined at the top level
+    ax = fig.subplots()
+
+    ax.scatter(data["age"], data["score"], s=30, alpha=0.7)
+
+    # Add trend line
+    z = np.polyfit(data["age"], data["score"], 1)
+    p = np.poly1d(z)
+    # Create sorted x values for smooth trend line
+    x_trend = np.linspace(data["age"].min(), data["age"].max(), 100)
+    ax.plot(x_trend, p(x_trend), "r--", linewidth=2, alpha=0.8)
+
+    ax.set_xlabel("Age")
+    ax.set_ylabel("Score")
+    ax.set_title("Age vs Score")
+    ax.grid(True, alpha=0.3)
+
 
 def server(input: Inputs, output: Outputs, session: Session):
 
@@ -41,26 +74,17 @@ def server(input: Inputs, output: Outputs, session: Session):
         now = datetime.now()
         return f"Event received at: {now.strftime('%Y-%m-%d %H:%M:%S')}.{now.microsecond//10000:02d}"
 
-    # Plot output
-    @render.plot()
+    # Plot output. The data never changes, so the plot only needs to be drawn once
+    # for each size; the cache is shared by all sessions. A scatter plot with few
+    # points is smaller, and sharper, as SVG.
+    @render_plot(
+        cache_key=lambda: None,
+        format="svg",
+        store=plot_store,
+        executor=plot_executor,
+    )
     def plot1():
-        fig, ax = plt.subplots()
-
-        ax.scatter(sample_data["age"], sample_data["score"], s=30, alpha=0.7)
-
-        # Add trend line
-        z = np.polyfit(sample_data["age"], sample_data["score"], 1)
-        p = np.poly1d(z)
-        # Create sorted x values for smooth trend line
-        x_trend = np.linspace(sample_data["age"].min(), sample_data["age"].max(), 100)
-        ax.plot(x_trend, p(x_trend), "r--", linewidth=2, alpha=0.8)
-
-        ax.set_xlabel("Age")
-        ax.set_ylabel("Score")
-        ax.set_title("Age vs Score")
-        ax.grid(True, alpha=0.3)
-
-        return fig
+        return plot_job(draw_age_vs_score, sample_data)
 
 
 app = App(
@@ -68,3 +92,4 @@ app = App(
     server,
     static_assets=str(Path(__file__).parent / "www"),
 )
+serve_plots(app, plot_store)
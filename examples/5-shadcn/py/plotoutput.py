@@ -0,0 +1,905 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import sys
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Hashable,
+    Iterator,
+    Optional,
+    Sequence,
+    Union,
+)
+
+from shiny import App
+from shiny.render.renderer import Renderer, ValueFn
+from shiny.session import require_active_session
+from shiny.types import Jsonifiable, SilentException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.routing import Route
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+    from matplotlib.figure import Figure
+
+# CSS pixels per inch. Figures are sized in inches, so this sets how large text
+# and markers (which are sized in points) appear in the browser.
+PPI = 96
+
+# Plot sizes are rounded up to a multiple of this many CSS pixels. This must
+# match the default sizeStep of ImageOutput, which reports its size this way.
+SIZE_STEP = 64
+
+# Device pixel ratios are rounded up to one of these, so that (for example)
+# browsers zoomed to 110% and 125% share the same 1.5x plots.
+PIXELRATIO_TIERS = (1.0, 1.5, 2.0, 3.0)
+
+
+# Image formats that plots can be encoded as. "png8" is a PNG with a 256-color
+# palette, which for most plots looks the same as a full-color PNG but is much
+# smaller.
+IMAGE_FORMATS = {
+    "png": "image/png",
+    "png8": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "svg": "image/svg+xml",
+}
+
+# Formats that every browser can display
+BASELINE_FORMATS = ("png", "svg")
+
+# A hex SHA-256 digest, which is how stored plots are named
+_DIGEST_RE = re.compile(r"[0-9a-f]{64}")
+
+
+def size_bucket(size: float, step: int = SIZE_STEP) -> int:
+    """Round a size in pixels up to a multiple of step."""
+    return max(step, math.ceil(size / step) * step)
+
+
+def pixelratio_tier(
+    pixelratio: float, tiers: tuple[float, ...] = PIXELRATIO_TIERS
+) -> float:
+    """Round a device pixel ratio up to the nearest tier (at most the largest)."""
+    for tier in tiers:
+        if pixelratio <= tier:
+            return tier
+    return tiers[-1]
+
+
+@dataclass(frozen=True)
+class RenderedPlot:
+    """An encoded plot image, along with what's needed to display it."""
+
+    data: bytes
+    mime_type: str
+    # Size in CSS pixels
+    width: int
+    height: int
+    pixelratio: float
+    coordmap: dict[str, Any]
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def digest(self) -> str:
+        """Hash of the image data, which identifies it in a PlotStore."""
+        return hashlib.sha256(self.data).hexdigest()
+
+    def img_data(
+        self, alt: Optional[str] = None, src: Optional[str] = None
+    ) -> dict[str, Jsonifiable]:
+        """
+        The output value consumed by ImageOutput on the client. If `src` is not
+        given, the image is embedded as a data URI.
+        """
+        if src is None:
+            src = f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode()}"
+        return {
+            "src": src,
+            "width": self.width,
+            "height": self.height,
+            "alt": alt,
+            "coordmap": self.coordmap,
+        }
+
+
+class PlotCache:
+    """
+    A cache of rendered plots, shared by all sessions.
+
+    Plots are kept in memory, evicting the least recently used ones when the
+    total size exceeds `max_memory_bytes`. If `directory` is given, plots are
+    also written there, so they survive restarts and can be shared by worker
+    processes; the directory is likewise kept under `max_disk_bytes`. Each file
+    holds a line of JSON describing the plot, followed by the encoded image.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, RenderedPlot] = OrderedDict()
+        self._memory_bytes = 0
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the parts of a cache key into a string usable as a file name."""
+        encoded = json.dumps(parts, sort_keys=True, default=repr).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._memory or (
+            self.directory is not None and os.path.exists(self._path(key))
+        )
+
+    def get(self, key: str) -> Optional[RenderedPlot]:
+        plot = self._memory.get(key)
+        if plot is not None:
+            self._memory.move_to_end(key)
+        elif self.directory is not None:
+            plot = self._read_disk(key)
+            if plot is not None:
+                self._set_memory(key, plot)
+
+        if plot is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return plot
+
+    def set(self, key: str, plot: RenderedPlot) -> None:
+        self._set_memory(key, plot)
+        if self.directory is not None:
+            self._write_disk(key, plot)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        self._memory_bytes = 0
+        for path, _, _ in self._disk_entries():
+            os.remove(path)
+
+    def _set_memory(self, key: str, plot: RenderedPlot) -> None:
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.nbytes
+        self._memory[key] = plot
+        self._memory_bytes += plot.nbytes
+
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _path(self, key: str) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, key + ".plot")
+
+    def _read_disk(self, key: str) -> Optional[RenderedPlot]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header, _, data = f.read().partition(b"\n")
+            info = json.loads(header)
+            plot = RenderedPlot(
+                data=data,
+                mime_type=str(info["mime_type"]),
+                width=int(info["width"]),
+                height=int(info["height"]),
+                pixelratio=float(info["pixelratio"]),
+                coordmap=dict(info["coordmap"]),
+            )
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        # Record the access, for least-recently-used eviction
+        os.utime(path)
+        return plot
+
+    def _write_disk(self, key: str, plot: RenderedPlot) -> None:
+        path = self._path(key)
+        # Write to a temporary file first, so other processes never see a
+        # partially written entry.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        header = {
+            "mime_type": plot.mime_type,
+            "width": plot.width,
+            "height": plot.height,
+            "pixelratio": plot.pixelratio,
+            "coordmap": plot.coordmap,
+        }
+        with open(tmp_path, "wb") as f:
+            # JSON without indentation is a single line
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(plot.data)
+        os.replace(tmp_path, path)
+
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for old_path, size, _ in entries:
+            if total <= self.max_disk_bytes:
+                break
+            if old_path == path:
+                continue
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _disk_entries(self) -> list[tuple[str, int, float]]:
+        if self.directory is None:
+            return []
+        entries: list[tuple[str, int, float]] = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".plot"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((entry.path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+# Cache shared by all render_plot outputs that don't specify their own
+default_plot_cache = PlotCache()
+
+
+class PlotStore(PlotCache):
+    """
+    Rendered plots, stored by the hash of their image data and served over
+    HTTP by `serve_plots()`.
+
+    Sending a URL instead of the image itself keeps large images off the
+    websocket, and because the URL changes whenever the image does, browsers
+    can cache each image indefinitely.
+
+    Plots must stay in the store until browsers have fetched them, so its size
+    limits should be generous. With multiple worker processes, give it a
+    `directory` that they share.
+
+    Images are served at `<path>/<digest>`, relative to the app's URL.
+    """
+
+    def __init__(self, path: str = "plots", **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path.strip("/")
+
+    def add(self, plot: RenderedPlot) -> str:
+        """Add a plot, if it isn't already stored, and return its URL."""
+        digest = plot.digest
+        url = f"{self.path}/{digest}"
+        # An existing entry is marked as recently used, so that it isn't the
+        # next to be evicted before the browser has fetched it
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+        if self.directory is not None:
+            try:
+                os.utime(self._path(digest))
+                return url
+            except FileNotFoundError:
+                pass
+        elif digest in self._memory:
+            return url
+        self.set(digest, plot)
+        return url
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in ("*", etag):
+            return True
+    return False
+
+
+def serve_plots(app: App, store: PlotStore) -> None:
+    """
+    Serve the plots in `store` from the Shiny app. Pass the same store to
+    `render_plot()`.
+    """
+
+    async def plot_image(request: Request) -> Response:
+        digest = request.path_params["digest"]
+        # Anything else isn't a plot, and mustn't become a file path
+        if not _DIGEST_RE.fullmatch(digest):
+            return Response(status_code=404)
+        etag = f'"{digest}"'
+        headers = {
+            "ETag": etag,
+            # The content at a URL never changes
+            "Cache-Control": "public, max-age=31536000, immutable",
+        }
+
+        # Plots are stored by the hash of their contents, so a matching ETag
+        # means the browser has the image, whether or not it's still stored.
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+
+        plot = store.get(digest)
+        if plot is None:
+            return Response(status_code=404)
+        return Response(plot.data, media_type=plot.mime_type, headers=headers)
+
+    # Ahead of the app's own routes, which include a catch-all for static files
+    app.starlette_app.router.routes.insert(
+        0, Route(f"/{store.path}/{{digest}}", plot_image, methods=["GET", "HEAD"])
+    )
+
+
+def figure_coordmap(fig: "Figure", width: int, height: int) -> dict[str, Any]:
+    """
+    Compute the coordinate map for a drawn figure: for each set of axes, the
+    data limits and the pixel (CSS, from the top left) area they occupy.
+    """
+    panels: list[dict[str, Any]] = []
+    for i, ax in enumerate(fig.axes):
+        # Skip things like colorbars, which aren't plots of the data
+        if not hasattr(ax, "get_subplotspec") or ax.get_subplotspec() is None:
+            continue
+        spec = ax.get_subplotspec()
+        pos = ax.get_position()
+        xlim = ax.get_xlim()
+        ylim = ax.get_ylim()
+        panels.append(
+            {
+                "panel": i + 1,
+                "row": spec.rowspan.start + 1,
+                "col": spec.colspan.start + 1,
+                "domain": {
+                    "left": float(xlim[0]),
+                    "right": float(xlim[1]),
+                    "bottom": float(ylim[0]),
+                    "top": float(ylim[1]),
+                },
+                "range": {
+                    "left": pos.x0 * width,
+                    "right": pos.x1 * width,
+                    "bottom": (1 - pos.y0) * height,
+                    "top": (1 - pos.y1) * height,
+                },
+                "log": {
+                    "x": "10" if ax.get_xscale() == "log" else None,
+                    "y": "10" if ax.get_yscale() == "log" else None,
+                },
+                "mapping": {"x": None, "y": None},
+            }
+        )
+
+    return {"panels": panels, "dims": {"width": width, "height": height}}
+
+
+def can_encode(format: str) -> bool:
+    """Whether plots can be encoded in the given format on this server."""
+    if format in ("png", "svg"):
+        return True
+    if format not in IMAGE_FORMATS:
+        return False
+
+    # The other formats are encoded with Pillow, which matplotlib depends on,
+    # but which may have been built without WebP or AVIF support.
+    from PIL import Image
+
+    Image.init()
+    return ("PNG" if format == "png8" else format.upper()) in Image.SAVE
+
+
+def _encode_figure(
+    fig: "Figure", format: str, dpi: float, quality: Optional[int]
+) -> bytes:
+    buf = io.BytesIO()
+    if format in ("png", "svg"):
+        fig.savefig(buf, format=format, dpi=dpi)
+        return buf.getvalue()
+
+    import numpy as np
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image
+
+    fig.set_dpi(dpi)
+    canvas = FigureCanvasAgg(fig)
+    canvas.draw()
+    image = Image.fromarray(np.asarray(canvas.buffer_rgba()))
+
+    if format == "png8":
+        # Method 2 is fast octree, which (unlike the default) supports alpha
+        image.quantize(colors=256, method=2).save(buf, "PNG", optimize=True)
+    elif format == "webp":
+        if quality is None:
+            # Lossless WebP is typically smaller than PNG for plots
+            image.save(buf, "WEBP", lossless=True)
+        else:
+            image.save(buf, "WEBP", quality=quality)
+    elif format == "avif":
+        image.save(buf, "AVIF", quality=quality if quality is not None else 75)
+    else:
+        raise ValueError(f"Unknown image format: {format}")
+
+    return buf.getvalue()
+
+
+def render_figure(
+    fig: "Figure",
+    width: int,
+    height: int,
+    pixelratio: float = 1,
+    format: str = "png",
+    quality: Optional[int] = None,
+) -> RenderedPlot:
+    """
+    Draw a figure at the given size (in CSS pixels) and encode it in the given
+    format. `quality` (0-100) applies to lossy WebP and AVIF; if None, WebP is
+    lossless and AVIF uses a default quality.
+    """
+    fig.set_size_inches(width / PPI, height / PPI)
+    data = _encode_figure(fig, format, PPI * pixelratio, quality)
+
+    return RenderedPlot(
+        data=data,
+        mime_type=IMAGE_FORMATS[format],
+        width=width,
+        height=height,
+        pixelratio=pixelratio,
+        coordmap=figure_coordmap(fig, width, height),
+    )
+
+
+@dataclass(frozen=True)
+class PlotJob:
+    """
+    A plot to be drawn by calling `fn(fig, *args, **kwargs)` on a blank figure.
+
+    Unlike a figure, a job can be sent to another process to be drawn, so `fn`
+    must be a function defined at the top level of a module, and the arguments
+    must be picklable.
+
+    The figure comes from a `FigurePool`, and is cleared and reused after the
+    plot is encoded, so `fn` shouldn't keep a reference to it.
+    """
+
+    fn: Callable[..., None]
+    args: tuple[Any, ...] = ()
+    kwargs: dict[str, Any] = field(default_factory=dict)
+
+
+def plot_job(fn: Callable[..., None], *args: Any, **kwargs: Any) -> PlotJob:
+    """Create a PlotJob that draws on a figure with `fn(fig, *args, **kwargs)`."""
+    return PlotJob(fn, args, kwargs)
+
+
+class FigurePool:
+    """
+    A pool of matplotlib figures that are reused from one plot to the next.
+
+    Figures are created directly rather than with pyplot, so they aren't kept
+    alive by pyplot's global figure manager. After each use a figure is
+    cleared and kept for the next plot, so a long-running process allocates
+    figures only when several plots are drawn at once, and holds at most
+    `max_idle` of them between plots.
+    """
+
+    def __init__(self, max_idle: int = 4) -> None:
+        self.max_idle = max_idle
+        self.created = 0
+        self.reused = 0
+        self.in_use = 0
+        self._idle: list["Figure"] = []
+
+    @contextmanager
+    def figure(self) -> Iterator["Figure"]:
+        """Borrow a blank figure for the duration of a `with` block."""
+        if self._idle:
+            fig = self._idle.pop()
+            self.reused += 1
+        else:
+            from matplotlib.figure import Figure
+
+            fig = Figure()
+            self.created += 1
+
+        self.in_use += 1
+        try:
+            yield fig
+        finally:
+            self.in_use -= 1
+            fig.clear()
+            if len(self._idle) < self.max_idle:
+                self._idle.append(fig)
+
+
+# Each process (including each PlotExecutor worker) has its own pool
+figure_pool = FigurePool()
+
+
+def render_job(
+    job: PlotJob,
+    width: int,
+    height: int,
+    pixelratio: float = 1,
+    format: str = "png",
+    quality: Optional[int] = None,
+) -> RenderedPlot:
+    """Draw a PlotJob on a figure from the pool and encode it."""
+    with figure_pool.figure() as fig:
+        job.fn(fig, *job.args, **job.kwargs)
+        return render_figure(fig, width, height, pixelratio, format, quality)
+
+
+def _pyplot_figure_numbers() -> set[int]:
+    # Don't import pyplot if the app doesn't use it
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    return set(pyplot.get_fignums()) if pyplot is not None else set()
+
+
+def _close_pyplot_figures(*figs: Any) -> None:
+    pyplot = sys.modules.get("matplotlib.pyplot")
+    if pyplot is not None:
+        for fig in figs:
+            pyplot.close(fig)
+
+
+def _init_worker() -> None:
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+class PlotExecutor:
+    """
+    Renders plots in a pool of worker processes.
+
+    Drawing and encoding a plot can take long enough that, when done on the
+    server process, every other session on that process has to wait for it.
+    With an executor, `render_plot` outputs whose functions return a `PlotJob`
+    are drawn in worker processes (using the non-interactive Agg backend) while
+    the server keeps handling other sessions.
+
+    The worker processes are started when the first plot is rendered. Where
+    processes aren't available (as in Shinylive), plots are drawn in-process.
+
+    Parameters
+    ----------
+    max_workers
+        Number of worker processes. Defaults to the number of CPUs.
+    max_pending
+        Maximum number of plots that may be queued or drawing at once. Further
+        plots wait for a slot. If None, there is no limit.
+    queue_timeout
+        Seconds a plot may wait for a slot before failing. If None, wait
+        indefinitely.
+    timeout
+        Seconds a plot may take to draw, including time queued in the pool,
+        before failing. A plot that times out while drawing still occupies its
+        worker, and its slot in `max_pending`, until it finishes.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        *,
+        max_pending: Optional[int] = None,
+        queue_timeout: Optional[float] = None,
+        timeout: Optional[float] = 30,
+    ) -> None:
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+        self._pool: Optional["ProcessPoolExecutor"] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_pool(self) -> "ProcessPoolExecutor":
+        if self._pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                # Forking a server process that has running threads isn't safe
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._pool
+
+    async def render(
+        self,
+        job: PlotJob,
+        width: int,
+        height: int,
+        pixelratio: float = 1,
+        format: str = "png",
+        quality: Optional[int] = None,
+    ) -> RenderedPlot:
+        args = (job, width, height, pixelratio, format, quality)
+        if sys.platform == "emscripten":
+            return render_job(*args)
+
+        from concurrent.futures.process import BrokenProcessPool
+
+        if self.max_pending is not None:
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_pending)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(
+                    f"Timed out waiting to render plot; {self.max_pending} plots "
+                    "are already pending"
+                ) from None
+
+        pool = self._get_pool()
+        future = None
+        try:
+            future = pool.submit(render_job, *args)
+            if self._slots is not None:
+                # The slot is released when the worker is done with the plot,
+                # even if waiting for it times out or is cancelled
+                slots = self._slots
+                loop = asyncio.get_running_loop()
+                future.add_done_callback(
+                    lambda _: loop.call_soon_threadsafe(slots.release)
+                )
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"Plot took longer than {self.timeout} seconds to render"
+            ) from None
+        except BrokenProcessPool:
+            # A worker died; start a new pool for the next plot, unless another
+            # plot that was on the broken pool already has
+            if self._pool is pool:
+                pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            raise
+        finally:
+            if future is None and self._slots is not None:
+                self._slots.release()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class render_plot(Renderer[Any]):
+    """
+    Reactively render a matplotlib figure, for display with ImageOutput.
+
+    ImageOutput reports its size rounded up to a multiple of 64 pixels, and
+    scales the plot to fit. The plot is drawn at that size (rounded to a
+    multiple of `size_step`, in case the client reports exact sizes), and at a
+    pixel ratio rounded up to one of `pixelratio_tiers`. Resizing the window
+    therefore only draws a new plot when the size crosses into a new bucket,
+    and with a cache, plots for every bucket that has been seen are reused.
+
+    If `cache_key` is given, rendered plots are cached in `cache`, keyed on the
+    output, the value returned by `cache_key()`, and the plot size. When there's
+    a cached plot, the plotting function isn't called, so `cache_key()` must
+    read every reactive input that the plot depends on, e.g.
+    `cache_key=lambda: (input.x(), input.y())`. Because the cache is shared,
+    identical plots requested by different sessions are drawn only once.
+
+    The function can return a matplotlib figure, or a `PlotJob` (see
+    `plot_job()`). If it returns a job and `executor` is given, the plot is
+    drawn in a worker process without blocking the server.
+
+    Returning a job is preferred: it's drawn on a reused figure that isn't
+    tracked by pyplot. A returned pyplot figure is closed after it's encoded.
+    If the function leaves other pyplot figures open, they are closed too, with
+    a warning, since otherwise they'd accumulate for the life of the process.
+
+    Plots are encoded as `format`. Given a sequence of formats, the first one
+    that both the browser (as reported by ImageOutput) and the server support is
+    used, falling back to PNG. For example, `format=("avif", "webp", "png8")`.
+    WebP or palette PNG (`"png8"`) is often several times smaller than PNG, and
+    SVG suits line charts with few points.
+
+    By default, images are embedded in the output value. With a `store`, they
+    are instead sent as URLs, so the browser downloads them over HTTP and can
+    cache them:
+
+        plot_store = PlotStore()
+
+        @render_plot(store=plot_store)
+        def plot(): ...
+
+        app = App(app_ui, server)
+        serve_plots(app, plot_store)
+
+    Parameters
+    ----------
+    alt
+        Alternative text for the image.
+    cache_key
+        A function that returns a JSON-serializable value identifying the plot's
+        contents. If None, plots aren't cached.
+    cache
+        The cache to use. Defaults to a cache shared by all outputs.
+    size_step
+        Plot width and height are rounded up to a multiple of this many pixels.
+        Should match the `sizeStep` of the ImageOutput.
+    pixelratio_tiers
+        Device pixel ratios that plots are drawn at.
+    format
+        Image format, or formats in order of preference: `"png"`, `"png8"`,
+        `"webp"`, `"avif"`, or `"svg"`.
+    quality
+        Quality (0-100) for lossy WebP and AVIF. If None, WebP is lossless.
+    store
+        If given, images are kept in this store and sent to the browser as URLs,
+        which must be served with `serve_plots()`. Otherwise, images are
+        embedded in the output value.
+    executor
+        A PlotExecutor for drawing PlotJobs. If None, they're drawn in-process.
+
+    Returns
+    -------
+    :
+        A decorator for a function that returns a matplotlib figure or a
+        PlotJob.
+    """
+
+    def __init__(
+        self,
+        _fn: Optional[ValueFn[Any]] = None,
+        *,
+        alt: Optional[str] = None,
+        cache_key: Optional[Callable[[], Hashable]] = None,
+        cache: Optional[PlotCache] = None,
+        size_step: int = SIZE_STEP,
+        pixelratio_tiers: tuple[float, ...] = PIXELRATIO_TIERS,
+        format: Union[str, Sequence[str]] = "png",
+        quality: Optional[int] = None,
+        store: Optional[PlotStore] = None,
+        executor: Optional[PlotExecutor] = None,
+    ) -> None:
+        formats = (format,) if isinstance(format, str) else tuple(format)
+        for f in formats:
+            if f not in IMAGE_FORMATS:
+                raise ValueError(f"Unknown image format: {f}")
+        self.formats = formats
+        self.quality = quality
+        self.store = store
+        self.alt = alt
+        self.executor = executor
+        self.cache_key = cache_key
+        self.cache = cache if cache is not None else default_plot_cache
+        self.size_step = size_step
+        self.pixelratio_tiers = pixelratio_tiers
+        super().__init__(_fn)
+
+    def _plot_size(self) -> tuple[int, int, float]:
+        session = require_active_session(None)
+        prefix = f".clientdata_output_{self.output_id}"
+        width = session.input[f"{prefix}_width"]()
+        height = session.input[f"{prefix}_height"]()
+        if not isinstance(width, (int, float)) or not isinstance(height, (int, float)):
+            # ImageOutput hasn't measured itself yet
+            raise SilentException()
+
+        try:
+            pixelratio = session.input[".clientdata_pixelratio"]()
+        except SilentException:
+            pixelratio = 1
+        if not isinstance(pixelratio, (int, float)) or pixelratio <= 0:
+            pixelratio = 1
+
+        return (
+            size_bucket(width, self.size_step),
+            size_bucket(height, self.size_step),
+            pixelratio_tier(pixelratio, self.pixelratio_tiers),
+        )
+
+    def _image_format(self) -> str:
+        # Only ask the client what it supports if it matters
+        if all(f in BASELINE_FORMATS or f == "png8" for f in self.formats):
+            return self.formats[0]
+
+        session = require_active_session(None)
+        try:
+            accepted = session.input[f".clientdata_output_{self.output_id}_formats"]()
+        except SilentException:
+            accepted = None
+        if not isinstance(accepted, (list, tuple)):
+            accepted = BASELINE_FORMATS
+
+        for f in self.formats:
+            if ("png" if f == "png8" else f) in accepted and can_encode(f):
+                return f
+        return "png"
+
+    def _img_data(self, plot: RenderedPlot) -> Jsonifiable:
+        src = self.store.add(plot) if self.store is not None else None
+        return plot.img_data(self.alt, src)
+
+    async def render(self) -> Jsonifiable:
+        width, height, pixelratio = self._plot_size()
+        format = self._image_format()
+
+        key = None
+        if self.cache_key is not None:
+            key = self.cache.make_key(
+                self.output_id,
+                self.cache_key(),
+                width,
+                height,
+                pixelratio,
+                format,
+                self.quality,
+            )
+            plot = self.cache.get(key)
+            if plot is not None:
+                return self._img_data(plot)
+
+        # Sync functions can't be interleaved with other sessions' plots, so any
+        # new pyplot figures were opened by this one.
+        check_leaks = not self.fn.is_async()
+        open_figures = _pyplot_figure_numbers() if check_leaks else set()
+
+        value = await self.fn()
+
+        if check_leaks:
+            if isinstance(value, PlotJob) or value is None:
+                returned = set()
+            else:
+                returned = {getattr(value, "number", None)}
+            leaked = _pyplot_figure_numbers() - open_figures - returned
+            if leaked:
+                _close_pyplot_figures(*leaked)
+                warnings.warn(
+                    f"Plot output '{self.output_id}' left {len(leaked)} pyplot "
+                    "figure(s) open. They have been closed; return the figure "
+                    "(or a PlotJob) instead.",
+                    stacklevel=1,
+                )
+
+        if value is None:
+            return None
+
+        if not isinstance(value, PlotJob):
+            try:
+                plot = render_figure(
+                    value, width, height, pixelratio, format, self.quality
+                )
+            finally:
+                _close_pyplot_figures(value)
+        elif self.executor is not None:
+            plot = await self.executor.render(
+                value, width, height, pixelratio, format, self.quality
+            )
+        else:
+            plot = render_job(value, width, height, pixelratio, format, self.quality)
+        if key is not None:
+            self.cache.set(key, plot)
+
+        return self._img_data(plot)
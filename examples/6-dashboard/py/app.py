@@ -1,17 +1,109 @@
 from shiny import App, Inputs, Outputs, Session, ui, reactive
-from shinyreact import page_react, render_json
-from data import generate_sample_data, filter_data, calculate_metrics
+from shinyreact import page_react, render_json, post_message
+from data import (
+    DATE_RANGE_DAYS,
+    generate_sample_data,
+    filter_data,
+    downsample_trend,
+    calculate_range_metrics,
+)
+from livedata import LiveSalesData
+from shareddata import share_frames, unlink_frames
+from sessionmemory import SessionMemory, serve_memory_report
+from tracing import TraceFileExporter, enable_tracing
+from profiling import enable_profiling, profiled_calc, serve_profile_report
+from datetime import date, timedelta
 from pathlib import Path
+import asyncio
+import os
+
+# Generate sample data once when app starts. With multiple worker processes, it's
+# generated by the first one and shared with the others. The data depends on the
+# current date, so the date is part of the name, and yesterday's data is removed
+# (if a process that's still running created it).
+unlink_frames(f"dashboard-{date.today() - timedelta(days=1):%Y%m%d}")
+sample_data = share_frames(f"dashboard-{date.today():%Y%m%d}", generate_sample_data)
+
+# The live data starts from the sample data and can have rows appended while the
+# app runs. It keeps cumulative sums of the time series, for metrics over
+# arbitrary date windows.
+live_data = LiveSalesData(sample_data)
+
+# Set this to a number of seconds to append a simulated day at that interval
+LIVE_UPDATE_SECONDS = float(os.environ.get("LIVE_UPDATE_SECONDS", "0"))
+
+# Set this to a file name to append latency traces of every session's input
+# changes to it, as JSON lines
+TRACE_FILE = os.environ.get("SHINY_REACT_TRACE_FILE")
+trace_exporter = TraceFileExporter(TRACE_FILE) if TRACE_FILE else None
+
+# Set this to a file name to append a timeline of every session's reactive
+# invalidations and runs to it, as JSON lines. The hot spots across sessions
+# are served at profile/ (e.g. http://localhost:8000/profile?format=text).
+PROFILE_FILE = os.environ.get("SHINY_REACT_PROFILE_FILE")
+profile_exporter = TraceFileExporter(PROFILE_FILE) if PROFILE_FILE else None
+
+# Set this to serve a report of the memory each session retains, largest
+# consumers first, at memory/ (e.g. http://localhost:8000/memory?n=20)
+MEMORY_REPORT = os.environ.get("SHINY_REACT_MEMORY_REPORT", "") not in ("", "0")
 
-# Generate sample data once when app starts
-sample_data = generate_sample_data()
+# Horizontal pixels per point in the revenue trend chart. There's no use sending
+# more points than the chart can show.
+PIXELS_PER_POINT = 4
+
+
+def chart_columns(data: dict, chart_width: int) -> dict:
+    revenue_trend = data["revenue_trend"]
+    if chart_width > 0:
+        revenue_trend = downsample_trend(
+            revenue_trend, max_points=chart_width // PIXELS_PER_POINT
+        )
+
+    # Convert DataFrames to column-major format (dict with column arrays)
+    revenue_trend_columns = revenue_trend.to_dict("list")
+    category_performance_columns = data["category_performance"].to_dict("list")
+
+    return {
+        "revenue_trend": revenue_trend_columns,
+        "category_performance": category_performance_columns,
+        # The client keeps rows from revenue_trend_append messages past this
+        "trend_rows": data["trend_rows"],
+    }
 
 
 def server(input: Inputs, output: Outputs, session: Session):
 
-    @reactive.calc
+    if trace_exporter is not None:
+        enable_tracing(session, trace_exporter)
+    if profile_exporter is not None:
+        enable_profiling(
+            session,
+            profile_exporter,
+            inputs=("date_range", "search_term", "selected_categories", "chart_width"),
+        )
+
+    if LIVE_UPDATE_SECONDS > 0:
+        live_data.simulate(LIVE_UPDATE_SECONDS)
+
+    # Each session keeps its own filtered copies of the data, and the last
+    # values of its outputs. The shared sample data isn't counted against it.
+    memory = SessionMemory(session, shared=[sample_data])
+
+    # Number of time series rows this session has been sent, either in
+    # chart_data or in appended rows. chart_data includes the rows that existed
+    # when filtered_data was computed, and the client keeps the appended rows
+    # past that, so each row only has to be appended once.
+    sent_trend_rows = live_data.n_rows
+
+    @profiled_calc
+    @memory.track()
     def filtered_data():
         """Reactive data filtering"""
+        # Appending to the time series doesn't invalidate this; new rows are sent
+        # to the client by push_trend_rows() instead.
+        live_data.products_version()
+        n_rows = live_data.n_rows
+
         # Get input values with defaults
         date_range = (
             input.date_range() if input.date_range() is not None else "last_30_days"
@@ -23,34 +115,73 @@ def server(input: Inputs, output: Outputs, session: Session):
             else []
         )
 
-        return filter_data(
-            sample_data,
+        data = filter_data(
+            {"revenue_trend": live_data.trend(), "products": live_data.products()},
             date_range=date_range,
             search_term=search_term,
             selected_categories=selected_categories,
+            end_date=live_data.latest_date(),
         )
+        return {**data, "trend_rows": n_rows}
 
     @render_json
+    @memory.track()
     def metrics_data():
         """Calculate and return metrics"""
-        data = filtered_data()
-        return calculate_metrics(data)
+        # The metrics only depend on the time series, which is filtered by date
+        # range alone, so there's no need to wait on filtered_data().
+        date_range = (
+            input.date_range() if input.date_range() is not None else "last_30_days"
+        )
+        # Recomputing is cheap, because the index is updated as rows are appended
+        live_data.trend_rows()
+        return calculate_range_metrics(
+            live_data.metrics_index(), date_range, end_date=live_data.latest_date()
+        )
 
-    @render_json
+    # Downsampling and serializing a long time series takes a while, so it's done
+    # in a thread. When the filters or the chart width change again before it's
+    # done, the outdated result is dropped.
+    @render_json(cancel_superseded=True)
     def chart_data():
         """Return chart data in column-major format"""
         data = filtered_data()
+        chart_width = input.chart_width() if input.chart_width() is not None else 0
+        return asyncio.to_thread(chart_columns, data, chart_width)
+
+    @reactive.effect
+    async def push_trend_rows():
+        """Send rows appended to the time series that haven't been sent yet"""
+        n_rows = live_data.trend_rows()
 
-        # Convert DataFrames to column-major format (dict with column arrays)
-        revenue_trend_columns = data["revenue_trend"].to_dict("list")
-        category_performance_columns = data["category_performance"].to_dict("list")
+        nonlocal sent_trend_rows
+        if n_rows <= sent_trend_rows:
+            return
+        first_row = sent_trend_rows
+        rows = live_data.trend(first_row)
+        sent_trend_rows = n_rows
 
-        return {
-            "revenue_trend": revenue_trend_columns,
-            "category_performance": category_performance_columns,
-        }
+        with reactive.isolate():
+            date_range = (
+                input.date_range() if input.date_range() is not None else "last_30_days"
+            )
+        days_back = DATE_RANGE_DAYS.get(date_range, 30)
+        start_date = live_data.latest_date() - timedelta(days=days_back - 1)
+
+        # The client appends the rows to the chart and drops rows before
+        # start_date, so the chart keeps showing the selected date range.
+        await post_message(
+            session,
+            "revenue_trend_append",
+            {
+                "rows": rows.to_dict("list"),
+                "first_row": first_row,
+                "start_date": start_date.isoformat(),
+            },
+        )
 
     @render_json
+    @memory.track()
     def table_data():
         """Return table data in column-major format"""
         data = filtered_data()
@@ -83,3 +214,8 @@ app = App(
     server,
     static_assets=str(Path(__file__).parent / "www"),
 )
+
+if MEMORY_REPORT:
+    serve_memory_report(app)
+if PROFILE_FILE:
+    serve_profile_report(app)
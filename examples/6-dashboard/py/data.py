@@ -1,7 +1,18 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+
+# Number of days covered by each date range option
+DATE_RANGE_DAYS = {
+    "last_7_days": 7,
+    "last_30_days": 30,
+    "last_90_days": 90,
+    "this_year": 365,
+}
+
+# Time series columns that are summed for the metrics cards
+METRIC_COLUMNS = ["revenue", "orders", "users"]
 
 
 def generate_sample_data(n_days: int = 180, n_products: int = 20) -> Dict[str, Any]:
@@ -98,20 +109,18 @@ def filter_data(
     date_range: str = "last_30_days",
     search_term: str = "",
     selected_categories: List[str] = None,
+    end_date: Optional[date] = None,
 ) -> Dict[str, Any]:
-    """Filter data based on inputs"""
+    """Filter data based on inputs. Date ranges end at end_date (default: today)"""
     if selected_categories is None:
         selected_categories = []
+    if end_date is None:
+        end_date = datetime.now().date()
 
     # Filter by date range (for time series data)
-    days_back = {
-        "last_7_days": 7,
-        "last_30_days": 30,
-        "last_90_days": 90,
-        "this_year": 365,
-    }.get(date_range, 30)
-
-    start_date = datetime.now().date() - timedelta(days=days_back - 1)
+    days_back = DATE_RANGE_DAYS.get(date_range, 30)
+
+    start_date = end_date - timedelta(days=days_back - 1)
     revenue_trend = data["revenue_trend"].copy()
     revenue_trend["date_parsed"] = pd.to_datetime(revenue_trend["date"]).dt.date
     filtered_revenue = revenue_trend[revenue_trend["date_parsed"] >= start_date].drop(
@@ -169,23 +178,196 @@ def filter_data(
     }
 
 
+def lttb_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick n_out row indices of an evenly spaced series using the
+    Largest-Triangle-Three-Buckets algorithm, which preserves its visual shape.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64)
+    # First and last points are always kept; the rest are split into buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.intp)
+    counts = np.diff(np.append(edges, n))
+    avg_x = np.add.reduceat(x, edges) / counts
+    avg_y = np.add.reduceat(y, edges) / counts
+
+    selected = np.empty(n_out, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Pick the point in this bucket forming the largest triangle with the
+        # previously selected point and the average of the next bucket
+        areas = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (avg_y[i + 1] - y[a])
+        )
+        a = lo + int(np.argmax(areas))
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Pick at most n_out row indices of a series by keeping the minimum and
+    maximum of each bucket, so that peaks and troughs are never dropped.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    n_buckets = (n_out - 2) // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    bucket = np.arange(n) * n_buckets // n
+    starts = np.searchsorted(bucket, np.arange(n_buckets))
+    # Sort by bucket, then by value; the first row of each bucket is its extreme
+    mins = np.lexsort((y, bucket))[starts]
+    maxs = np.lexsort((-y, bucket))[starts]
+
+    return np.unique(np.concatenate(([0, n - 1], mins, maxs)))
+
+
+def downsample_trend(
+    revenue_trend: pd.DataFrame,
+    max_points: int,
+    column: str = "revenue",
+    method: str = "lttb",
+) -> pd.DataFrame:
+    """Reduce the time series to at most max_points rows for charting"""
+    if method == "lttb":
+        indices = lttb_indices(revenue_trend[column].to_numpy(), max_points)
+    elif method == "minmax":
+        indices = minmax_indices(revenue_trend[column].to_numpy(), max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    return revenue_trend.iloc[indices]
+
+
+def build_metrics_index(revenue_trend: pd.DataFrame) -> Dict[str, Any]:
+    """Precompute cumulative sums of the metric columns for range queries"""
+    dates = np.asarray(revenue_trend["date"], dtype="datetime64[D]")
+    order = np.argsort(dates, kind="stable")
+
+    # A leading zero makes the sum over rows [i, j) equal to cumsum[j] - cumsum[i]
+    cumsums = {
+        col: np.concatenate(
+            ([0.0], np.cumsum(revenue_trend[col].to_numpy(dtype=np.float64)[order]))
+        )
+        for col in METRIC_COLUMNS
+    }
+
+    return {"dates": dates[order], "cumsums": cumsums}
+
+
+def range_sums(
+    index: Dict[str, Any], start_dates: Any, end_dates: Any
+) -> Dict[str, np.ndarray]:
+    """
+    Sum each metric column between start and end dates (both inclusive).
+
+    Dates may be scalars or arrays, so many windows can be computed at once
+    (e.g. one per sparkline). Each window costs two binary searches and two
+    lookups, regardless of how many days it covers.
+    """
+    start_dates = np.asarray(start_dates, dtype="datetime64[D]")
+    end_dates = np.asarray(end_dates, dtype="datetime64[D]")
+
+    starts = np.searchsorted(index["dates"], start_dates, side="left")
+    ends = np.maximum(np.searchsorted(index["dates"], end_dates, side="right"), starts)
+
+    return {
+        col: cumsum[ends] - cumsum[starts] for col, cumsum in index["cumsums"].items()
+    }
+
+
+def period_comparison(
+    index: Dict[str, Any], start_dates: Any, end_dates: Any
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """
+    Sum each metric over the given windows and over the windows of equal length
+    immediately preceding them. Returns (current, previous).
+    """
+    start_dates = np.asarray(start_dates, dtype="datetime64[D]")
+    end_dates = np.asarray(end_dates, dtype="datetime64[D]")
+    one_day = np.timedelta64(1, "D")
+    length = end_dates - start_dates + one_day
+
+    current = range_sums(index, start_dates, end_dates)
+    previous = range_sums(index, start_dates - length, start_dates - one_day)
+    return current, previous
+
+
+def calculate_range_metrics(
+    index: Dict[str, Any],
+    date_range: str = "last_30_days",
+    end_date: Optional[date] = None,
+) -> Dict[str, Any]:
+    """
+    Calculate metrics for a date range ending at end_date (default: today),
+    compared to the preceding period
+    """
+    if end_date is None:
+        end_date = datetime.now().date()
+    days_back = DATE_RANGE_DAYS.get(date_range, 30)
+    end = np.datetime64(end_date, "D")
+    start = end - np.timedelta64(days_back - 1, "D")
+
+    current, previous = period_comparison(index, start, end)
+
+    return _format_metrics(
+        {col: float(total) for col, total in current.items()},
+        {col: float(total) for col, total in previous.items()},
+    )
+
+
 def calculate_metrics(
     current_data: Dict[str, Any], previous_data: Optional[Dict[str, Any]] = None
 ) -> Dict[str, Any]:
     """Calculate metrics with comparison to previous period"""
 
     # Current metrics
-    current_revenue = current_data["revenue_trend"]["revenue"].sum()
-    current_users = current_data["revenue_trend"]["users"].sum()
-    current_orders = current_data["revenue_trend"]["orders"].sum()
+    current = {
+        col: float(current_data["revenue_trend"][col].sum()) for col in METRIC_COLUMNS
+    }
+
+    if previous_data is not None:
+        previous = {
+            col: float(previous_data["revenue_trend"][col].sum())
+            for col in METRIC_COLUMNS
+        }
+    else:
+        # Previous metrics (mock calculation for demo). Use
+        # calculate_range_metrics() for a real previous-period comparison.
+        previous = {
+            "revenue": current["revenue"] * 0.9,
+            "users": current["users"] * 0.85,
+            "orders": current["orders"] * 0.88,
+        }
+
+    return _format_metrics(current, previous)
+
+
+def _format_metrics(
+    current: Dict[str, float], previous: Dict[str, float]
+) -> Dict[str, Any]:
+    """Format metric totals for the current and previous periods as cards"""
+    current_revenue = current["revenue"]
+    current_users = current["users"]
+    current_orders = current["orders"]
     current_conversion = (
         (current_orders / current_users * 100) if current_users > 0 else 0
     )
 
-    # Previous metrics (mock calculation for demo)
-    previous_revenue = current_revenue * 0.9
-    previous_users = current_users * 0.85
-    previous_orders = current_orders * 0.88
+    previous_revenue = previous["revenue"]
+    previous_users = previous["users"]
+    previous_orders = previous["orders"]
     previous_conversion = (
         (previous_orders / previous_users * 100) if previous_users > 0 else 0
     )
@@ -206,7 +388,9 @@ def calculate_metrics(
         if previous_orders > 0
         else 0
     )
-    conversion_change = current_conversion - previous_conversion
+    conversion_change = (
+        (current_conversion - previous_conversion) if previous_users > 0 else 0
+    )
 
     return {
         "revenue": {
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from shiny import reactive
+
+from data import METRIC_COLUMNS
+
+
+class LiveSalesData:
+    """
+    Sales data that keeps growing while the app runs.
+
+    Time series rows are appended to column buffers that double in capacity
+    when full, and the cumulative sums used for metrics are extended as rows
+    arrive. An append therefore costs time proportional to the number of new
+    rows, not to the size of the table.
+
+    Changes are tracked with two reactive values, so that only the outputs that
+    depend on the changed data are invalidated:
+
+    * `trend_rows`: the number of rows in the time series.
+    * `products_version`: incremented whenever the products table is replaced.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        capacity = max(2 * len(data["revenue_trend"]), 64)
+        self._n = 0
+        self._dates = np.empty(capacity, dtype="datetime64[D]")
+        self._values = {col: np.empty(capacity) for col in METRIC_COLUMNS}
+        # Leading zero, as in build_metrics_index()
+        self._cumsums = {col: np.zeros(capacity + 1) for col in METRIC_COLUMNS}
+        self._products: pd.DataFrame = data["products"]
+        self._simulation: Optional[asyncio.Task[None]] = None
+        self._append_rows(data["revenue_trend"])
+
+        self.trend_rows = reactive.value(self._n)
+        self.products_version = reactive.value(0)
+
+    @property
+    def n_rows(self) -> int:
+        """Number of rows in the time series (not reactive)"""
+        return self._n
+
+    def latest_date(self) -> date:
+        """Date of the most recent row in the time series (not reactive)"""
+        return self._dates[self._n - 1].item()
+
+    def trend(self, start: int = 0) -> pd.DataFrame:
+        """Time series rows from `start` onward, as in generate_sample_data()"""
+        data = {"date": np.datetime_as_string(self._dates[start : self._n], unit="D")}
+        for col in METRIC_COLUMNS:
+            data[col] = self._values[col][start : self._n]
+        return pd.DataFrame(data)
+
+    def products(self) -> pd.DataFrame:
+        return self._products
+
+    def metrics_index(self) -> Dict[str, Any]:
+        """The time series' cumulative sums, in the form of build_metrics_index()"""
+        return {
+            "dates": self._dates[: self._n],
+            "cumsums": {
+                col: cumsum[: self._n + 1] for col, cumsum in self._cumsums.items()
+            },
+        }
+
+    async def append_trend(self, rows: pd.DataFrame) -> None:
+        """Append rows, newer than any existing rows, to the time series"""
+        async with reactive.lock():
+            self._append_rows(rows)
+            self.trend_rows.set(self._n)
+            await reactive.flush()
+
+    async def update_products(self, products: pd.DataFrame) -> None:
+        """Replace the products table"""
+        async with reactive.lock():
+            self._products = products
+            with reactive.isolate():
+                self.products_version.set(self.products_version() + 1)
+            await reactive.flush()
+
+    def simulate(self, interval: float) -> None:
+        """
+        Append a randomly generated day to the time series every `interval`
+        seconds. Does nothing if the simulation is already running.
+        """
+        if self._simulation is None:
+            self._simulation = asyncio.create_task(self._simulate(interval))
+
+    async def _simulate(self, interval: float) -> None:
+        rng = np.random.default_rng()
+        while True:
+            await asyncio.sleep(interval)
+            t = self._n
+            revenue = 2000 + 500 * np.sin(t * 0.3) + rng.normal(0, 200)
+            orders = 50 + 20 * np.sin(t * 0.2) + rng.poisson(10)
+            users = 25 + 15 * np.sin(t * 0.25) + rng.poisson(5)
+            await self.append_trend(
+                pd.DataFrame(
+                    {
+                        "date": [str(self.latest_date() + timedelta(days=1))],
+                        "revenue": [max(1000, revenue)],
+                        "orders": [max(10, orders)],
+                        "users": [max(5, users)],
+                    }
+                )
+            )
+
+    def _append_rows(self, rows: pd.DataFrame) -> None:
+        k = len(rows)
+        if k == 0:
+            return
+
+        dates = np.asarray(rows["date"], dtype="datetime64[D]")
+        if np.any(np.diff(dates) <= np.timedelta64(0, "D")) or (
+            self._n > 0 and dates[0] <= self._dates[self._n - 1]
+        ):
+            raise ValueError("Rows must be appended in increasing date order")
+
+        n = self._n
+        if n + k > len(self._dates):
+            self._grow(n + k)
+
+        self._dates[n : n + k] = dates
+        for col in METRIC_COLUMNS:
+            values = rows[col].to_numpy(dtype=np.float64)
+            self._values[col][n : n + k] = values
+            cumsum = self._cumsums[col]
+            cumsum[n + 1 : n + k + 1] = cumsum[n] + np.cumsum(values)
+
+        # Publish the new length only after the rows are written
+        self._n = n + k
+
+    def _grow(self, min_capacity: int) -> None:
+        capacity = len(self._dates)
+        while capacity < min_capacity:
+            capacity *= 2
+
+        # Existing data frames and indexes keep views of the old buffers, which
+        # stay valid because rows are never modified after they're written.
+        n = self._n
+        dates = np.empty(capacity, dtype="datetime64[D]")
+        dates[:n] = self._dates[:n]
+        self._dates = dates
+        for col in METRIC_COLUMNS:
+            values = np.empty(capacity)
+            values[:n] = self._values[col][:n]
+            self._values[col] = values
+            cumsum = np.zeros(capacity + 1)
+            cumsum[: n + 1] = self._cumsums[col][: n + 1]
+            self._cumsums[col] = cumsum
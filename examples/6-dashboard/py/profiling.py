@@ -0,0 +1,529 @@
+from __future__ import annotations
+
+import contextvars
+import dataclasses
+import functools
+import inspect
+import time
+import weakref
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from shiny import App, Session, reactive
+from shiny.session import get_current_session
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from shinyreact import RenderHook, add_render_hook, render_json
+from tracing import TraceHook, emit_span
+
+T = TypeVar("T")
+
+
+@dataclasses.dataclass
+class _Running:
+    name: str
+    # Time spent in profiled calcs it computed, to exclude from its self time
+    children_s: float = 0.0
+
+
+# The profiled node that's running in the current task
+_running: "contextvars.ContextVar[Optional[_Running]]" = contextvars.ContextVar(
+    "shinyreact_profile_running", default=None
+)
+
+
+@dataclasses.dataclass
+class _NodeProfile:
+    runs: int = 0
+    total_s: float = 0.0
+    # Excluding the time of profiled calcs computed while it ran
+    self_s: float = 0.0
+    max_s: float = 0.0
+    # Runs that produced a value equal to the previous one
+    unchanged_runs: int = 0
+    unchanged_s: float = 0.0
+    # Work started by outputs with cancel_superseded=True
+    background_s: float = 0.0
+    invalidations: int = 0
+    # Number of times each profiled calc or input invalidated it directly
+    invalidated_by: Dict[str, int] = dataclasses.field(default_factory=dict)
+
+
+@dataclasses.dataclass
+class _ChainProfile:
+    count: int = 0
+    # Self time of the runs of the chain's last node that it caused
+    compute_s: float = 0.0
+
+
+@dataclasses.dataclass
+class _Profile:
+    nodes: Dict[str, _NodeProfile] = dataclasses.field(default_factory=dict)
+    chains: Dict[Tuple[str, ...], _ChainProfile] = dataclasses.field(
+        default_factory=dict
+    )
+
+    def node(self, name: str) -> _NodeProfile:
+        if name not in self.nodes:
+            self.nodes[name] = _NodeProfile()
+        return self.nodes[name]
+
+    def chain(self, chain: Tuple[str, ...]) -> _ChainProfile:
+        if chain not in self.chains:
+            self.chains[chain] = _ChainProfile()
+        return self.chains[chain]
+
+
+# Hot spots across all sessions that have been profiled
+_all_profiles = _Profile()
+
+
+class _SessionProfiler:
+    def __init__(
+        self, session: Session, hooks: Iterable[TraceHook], inputs: Iterable[str]
+    ) -> None:
+        self.session = session
+        self.hooks = list(hooks)
+        self.profile = _Profile()
+        self.flushes = 0
+        # The flush that's collecting invalidations and runs, and its start
+        self.flush_id: Optional[str] = None
+        self.flush_start = 0.0
+        self.flush_runs = 0
+        # The profiled calcs that each node read in its latest run
+        self._reads: Dict[str, Set[str]] = {}
+        # The nodes invalidated in this flush, with when, and their invalidation
+        # chains, once they've been worked out
+        self._invalidated_at: Dict[str, float] = {}
+        self._chains: Dict[str, Tuple[str, ...]] = {}
+        # Watched inputs that changed in this flush
+        self._changed: List[str] = []
+        # The reactive contexts of runs, by id(), until they're invalidated
+        self._contexts: Set[int] = set()
+        # Each node's latest value, to tell whether it recomputed the same one
+        self._values: Dict[str, Any] = {}
+        for input_id in inputs:
+            self._watch(input_id)
+
+    def emit(self, name: str, start: float, end: float, **attributes: Any) -> None:
+        emit_span(self.hooks, self.session, name, start, end, self.flush_id, attributes)
+
+    def run(self, name: str, fn: Callable[[], T]) -> T:
+        start, chain = self._start(name)
+        running = _Running(name)
+        token = _running.set(running)
+        try:
+            value = fn()
+        finally:
+            _running.reset(token)
+        self._finish(name, start, chain, running, value)
+        return value
+
+    async def run_async(self, name: str, fn: Callable[[], Awaitable[T]]) -> T:
+        start, chain = self._start(name)
+        running = _Running(name)
+        token = _running.set(running)
+        try:
+            value = await fn()
+        finally:
+            _running.reset(token)
+        self._finish(name, start, chain, running, value)
+        return value
+
+    def read(self, name: str) -> None:
+        """Record that the running node read the profiled calc `name`."""
+        running = _running.get()
+        if running is not None:
+            self._reads.setdefault(running.name, set()).add(name)
+
+    def background(self, name: str, start: float, value: Any) -> None:
+        """Record work that an output with cancel_superseded=True ran."""
+        self._touch()
+        end = time.time()
+        unchanged = self._unchanged(name, value)
+        for profile in (self.profile, _all_profiles):
+            node = profile.node(name)
+            node.background_s += end - start
+            if unchanged:
+                node.unchanged_runs += 1
+                node.unchanged_s += end - start
+        self.emit("reactive.background", start, end, node=name, unchanged=unchanged)
+
+    def _watch(self, input_id: str) -> None:
+        value = self.session.input[input_id]
+
+        # Ahead of outputs, so the inputs that changed are known when they run
+        @reactive.effect(priority=100)
+        def _():
+            value()
+            self._touch()
+            self._changed.append(input_id)
+
+    def _start(self, name: str) -> Tuple[float, Optional[Tuple[str, ...]]]:
+        self._touch()
+        # Worked out before the run replaces the reads it's based on
+        chain = self._chain(name) if name in self._invalidated_at else None
+        self._reads[name] = set()
+        context = reactive.get_current_context()
+        if id(context) not in self._contexts:
+            self._contexts.add(id(context))
+            context.on_invalidate(lambda: self._invalidated(context, name))
+        return time.time(), chain
+
+    def _finish(
+        self,
+        name: str,
+        start: float,
+        chain: Optional[Tuple[str, ...]],
+        running: _Running,
+        value: Any,
+    ) -> None:
+        end = time.time()
+        duration = end - start
+        self_time = duration - running.children_s
+        parent = _running.get()
+        if parent is not None:
+            parent.children_s += duration
+
+        # For cancel_superseded outputs, the value is the work to start, so it's
+        # compared in background() instead
+        unchanged = None if inspect.isawaitable(value) else self._unchanged(name, value)
+        for profile in (self.profile, _all_profiles):
+            node = profile.node(name)
+            node.runs += 1
+            node.total_s += duration
+            node.self_s += self_time
+            node.max_s = max(node.max_s, duration)
+            if unchanged:
+                node.unchanged_runs += 1
+                node.unchanged_s += self_time
+            if chain is not None:
+                profile.chain(chain).compute_s += self_time
+
+        self.flush_runs += 1
+        self.emit(
+            "reactive.run",
+            start,
+            end,
+            node=name,
+            self_ms=self_time * 1000,
+            unchanged=unchanged,
+        )
+
+    def _unchanged(self, name: str, value: Any) -> bool:
+        previous = self._values.get(name, _NO_VALUE)
+        self._values[name] = value
+        return previous is not _NO_VALUE and _same_value(previous, value)
+
+    def _invalidated(self, context: reactive.Context, name: str) -> None:
+        self._touch()
+        self._contexts.discard(id(context))
+        self._invalidated_at.setdefault(name, time.time())
+
+    def _chain(self, name: str) -> Tuple[str, ...]:
+        # A node's context is invalidated after those of the nodes that read it,
+        # so causes can't be told as invalidations happen. Instead, once they're
+        # all known, a node's cause is a profiled calc it read that was also
+        # invalidated, or else the watched inputs that changed.
+        chain = self._chains.get(name)
+        if chain is not None:
+            return chain
+        # In case the reads recorded in different runs form a cycle
+        self._chains[name] = ("(cycle)", name)
+
+        causes = sorted(self._reads.get(name, set()) & self._invalidated_at.keys())
+        if causes:
+            chain = self._chain(causes[0]) + (name,)
+        else:
+            chain = (", ".join(self._changed) or "(other)", name)
+        self._chains[name] = chain
+
+        cause = chain[-2]
+        for profile in (self.profile, _all_profiles):
+            node = profile.node(name)
+            node.invalidations += 1
+            node.invalidated_by[cause] = node.invalidated_by.get(cause, 0) + 1
+            profile.chain(chain).count += 1
+        at = self._invalidated_at[name]
+        self.emit("reactive.invalidate", at, at, node=name, chain=" > ".join(chain))
+        return chain
+
+    def _touch(self) -> None:
+        # Invalidations and runs belong to the flush that's in progress, or to
+        # the one they'll cause
+        if self.flush_id is not None:
+            return
+        self.flushes += 1
+        self.flush_id = f"flush-{self.flushes}"
+        self.flush_start = time.time()
+        self.flush_runs = 0
+        self.session.on_flushed(self._flushed, once=True)
+
+    def _flushed(self) -> None:
+        # Nodes that were invalidated but didn't run again, such as calcs that
+        # nothing read
+        for name in list(self._invalidated_at):
+            self._chain(name)
+        self._invalidated_at.clear()
+        self._chains.clear()
+        self._changed.clear()
+        self.emit("reactive.flush", self.flush_start, time.time(), runs=self.flush_runs)
+        self.flush_id = None
+
+
+_NO_VALUE = object()
+
+
+def _same_value(a: Any, b: Any) -> bool:
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+    if isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(map(_same_value, a, b))
+    # pandas objects
+    equals = getattr(a, "equals", None)
+    if callable(equals):
+        return bool(equals(b))
+    try:
+        # numpy arrays compare element-wise
+        result = a == b
+        return bool(result.all() if hasattr(result, "all") else result)
+    except (TypeError, ValueError):
+        return False
+
+
+_profilers: "weakref.WeakKeyDictionary[Session, _SessionProfiler]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _active_profiler() -> Optional[_SessionProfiler]:
+    if not _profilers:
+        return None
+    session = get_current_session()
+    return _profilers.get(session) if session is not None else None
+
+
+class _ProfileRenderHook(RenderHook):
+    async def value(
+        self, renderer: render_json, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        profiler = _active_profiler()
+        if profiler is None:
+            return await fn()
+        return await profiler.run_async(renderer.output_id, fn)
+
+    def background(
+        self, renderer: render_json
+    ) -> Optional[Callable[[float, str, Any], None]]:
+        profiler = _active_profiler()
+        if profiler is None:
+            return None
+
+        def finished(start: float, status: str, value: Any) -> None:
+            if status == "done":
+                profiler.background(renderer.output_id, start, value)
+
+        return finished
+
+
+_profile_hook = _ProfileRenderHook()
+
+
+class _ProfiledCalc:
+    # Records each read of a calc, including reads of its cached value
+    def __init__(self, calc: Callable[[], Any], name: str) -> None:
+        self._calc = calc
+        self.name = name
+
+    def __call__(self) -> Any:
+        profiler = _active_profiler()
+        if profiler is not None:
+            profiler.read(self.name)
+        return self._calc()
+
+
+def profiled_calc(
+    fn: Optional[Callable[[], Any]] = None, *, name: Optional[str] = None
+) -> Any:
+    """
+    A reactive calc that's recorded when its session is being profiled (see
+    `enable_profiling()`): its runs, and the profiled nodes that read it, so
+    that invalidations can be traced through it. Use it in place of
+    `@reactive.calc`:
+
+        @profiled_calc
+        def filtered_data():
+            ...
+
+    Parameters
+    ----------
+    name
+        The calc's name in the profile (default: the function's name).
+    """
+
+    def decorator(fn: Callable[[], Any]) -> _ProfiledCalc:
+        key = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def run_async() -> Any:
+                profiler = _active_profiler()
+                if profiler is None:
+                    return await fn()
+                return await profiler.run_async(key, fn)
+
+            return _ProfiledCalc(reactive.calc(run_async), key)
+
+        @functools.wraps(fn)
+        def run() -> Any:
+            profiler = _active_profiler()
+            if profiler is None:
+                return fn()
+            return profiler.run(key, fn)
+
+        return _ProfiledCalc(reactive.calc(run), key)
+
+    return decorator if fn is None else decorator(fn)
+
+
+def enable_profiling(
+    session: Session, *hooks: TraceHook, inputs: Iterable[str] = ()
+) -> None:
+    """
+    Profile a session's reactive graph: what invalidated what, how long each
+    `render_json` output and `@profiled_calc` took, and which of them
+    recomputed a value equal to the previous one.
+
+    Each of these is passed to every hook as a span, like those of
+    `enable_tracing()`, with the flush it belongs to as the `trace_id`. This
+    makes a timeline of the session, which `scripts/trace-to-chrome.py` can
+    convert into a flame chart:
+
+    * `reactive.invalidate`: a node was invalidated (`start` and `end` are the
+      same). The `chain` attribute shows what caused it, starting from the
+      input, such as `date_range > filtered_data > table_data`.
+    * `reactive.run`: a node ran, with its time excluding profiled calcs it
+      computed (`self_ms`), and whether its value was `unchanged`.
+    * `reactive.background`: the work started by an output with
+      `cancel_superseded=True` finished.
+    * `reactive.flush`: from the first invalidation or run of a flush until the
+      session's output values were sent.
+
+    A chain goes back through the profiled calcs that the node read, as long as
+    they were invalidated in the same flush. It starts from the `inputs` that
+    changed in that flush, or `(other)` if none of them did (for example, when
+    a timer or an input that isn't watched caused it).
+
+    The times are also added up, for this session and for all sessions, in the
+    hot spots report from `profile_report()`.
+
+    Parameters
+    ----------
+    session
+        The session to profile.
+    *hooks
+        Functions to call with each span, like a `TraceFileExporter`.
+    inputs
+        IDs of the inputs to start invalidation chains from.
+    """
+    add_render_hook(_profile_hook)
+    _profilers[session] = _SessionProfiler(session, hooks, inputs)
+    session.on_ended(lambda: _profilers.pop(session, None))
+
+
+def profile_report(session: Optional[Session] = None) -> Dict[str, Any]:
+    """
+    The hot spots of one session that's being profiled, or of all sessions that
+    have been: its nodes, by total time, and its invalidation chains, by the
+    time spent recomputing because of them.
+    """
+    if session is None:
+        profile = _all_profiles
+    else:
+        profiler = _profilers.get(session)
+        profile = profiler.profile if profiler is not None else _Profile()
+
+    nodes = [
+        {
+            "node": name,
+            "runs": node.runs,
+            "total_ms": node.total_s * 1000,
+            "self_ms": node.self_s * 1000,
+            "mean_ms": node.total_s * 1000 / node.runs if node.runs else None,
+            "max_ms": node.max_s * 1000,
+            "background_ms": node.background_s * 1000,
+            "unchanged_runs": node.unchanged_runs,
+            "unchanged_ms": node.unchanged_s * 1000,
+            "invalidations": node.invalidations,
+            "invalidated_by": dict(node.invalidated_by),
+        }
+        for name, node in profile.nodes.items()
+    ]
+    nodes.sort(key=lambda n: n["total_ms"] + n["background_ms"], reverse=True)
+    chains = [
+        {"chain": list(chain), "count": c.count, "compute_ms": c.compute_s * 1000}
+        for chain, c in profile.chains.items()
+    ]
+    chains.sort(key=lambda c: c["compute_ms"], reverse=True)
+    return {"nodes": nodes, "chains": chains}
+
+
+def format_profile_report(report: Dict[str, Any], n: int = 10) -> str:
+    """Format the top `n` nodes and chains of `profile_report()` as text."""
+    lines = ["Reactive hot spots (total / self / unchanged ms, runs):"]
+    for node in report["nodes"][:n]:
+        background = (
+            f", {node['background_ms']:.1f} ms in background"
+            if node["background_ms"]
+            else ""
+        )
+        lines.append(
+            f"  {node['node']:<24} {node['total_ms']:>9.1f} {node['self_ms']:>9.1f} "
+            f"{node['unchanged_ms']:>9.1f}  {node['runs']} runs, "
+            f"{node['unchanged_runs']} unchanged{background}"
+        )
+    lines.append("Invalidation chains (compute ms, count):")
+    for chain in report["chains"][:n]:
+        lines.append(
+            f"  {' > '.join(chain['chain']):<48} {chain['compute_ms']:>9.1f}  "
+            f"{chain['count']}x"
+        )
+    return "\n".join(lines)
+
+
+def serve_profile_report(app: App, path: str = "profile") -> None:
+    """
+    Serve `profile_report()` for all sessions as JSON at `GET <path>`, relative
+    to the app's URL, or as text from `format_profile_report()` at
+    `GET <path>?format=text&n=<n>`. Like the memory report, this is meant for
+    development, or for deployments where the route isn't publicly reachable.
+    """
+    path = path.strip("/")
+
+    async def report(request: Request) -> Response:
+        if request.query_params.get("format") != "text":
+            return JSONResponse(profile_report())
+        try:
+            n = int(request.query_params.get("n", "10"))
+        except ValueError:
+            return JSONResponse({"error": "n must be an integer"}, status_code=400)
+        return PlainTextResponse(format_profile_report(profile_report(), n))
+
+    # Ahead of the app's own routes, which include a catch-all for static files
+    app.starlette_app.router.routes[0:0] = [Route(f"/{path}", report)]
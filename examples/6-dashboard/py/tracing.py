@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import dataclasses
+import inspect
+import json
+import os
+import time
+import warnings
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from shiny import Session, reactive
+from shiny.session import require_active_session
+from shiny.types import Jsonifiable
+from shinyreact import (
+    RenderHook,
+    add_render_hook,
+    post_message,
+    render_json,
+    typed_input,
+)
+
+# A function that receives trace spans; see enable_tracing()
+TraceHook = Callable[[Dict[str, Any]], None]
+
+
+@dataclasses.dataclass
+class _DebounceSpan:
+    input: str
+    start: float
+
+
+@dataclasses.dataclass
+class _InputTrace:
+    id: str
+    sentAt: float
+    debounce: List[_DebounceSpan]
+
+
+@dataclasses.dataclass
+class _ClientSpan:
+    name: str
+    start: float
+    end: float
+    output: Optional[str] = None
+
+
+@dataclasses.dataclass
+class _ClientTrace:
+    id: str
+    spans: List[_ClientSpan]
+
+
+def emit_span(
+    hooks: Sequence[TraceHook],
+    session: Session,
+    name: str,
+    start: float,
+    end: float,
+    trace_id: Optional[str],
+    attributes: Dict[str, Any],
+) -> None:
+    """Pass a span, in the format described in `enable_tracing()`, to hooks."""
+    span = {
+        "trace_id": trace_id,
+        "session": session.id,
+        "name": name,
+        "start": start,
+        "end": end,
+        "duration_ms": (end - start) * 1000,
+        "attributes": attributes,
+    }
+    for hook in hooks:
+        try:
+            hook(span)
+        except Exception as e:
+            warnings.warn(f"Trace hook failed: {e}", stacklevel=1)
+
+
+class _SessionTracer:
+    def __init__(self, session: Session, hooks: Sequence[TraceHook]) -> None:
+        self.session = session
+        self.hooks = list(hooks)
+        # The batch of input changes being processed, if the server is in the
+        # middle of processing one, and when it was received
+        self.trace_id: Optional[str] = None
+        self.received = 0.0
+
+    def emit(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        trace_id: Optional[str] = None,
+        **attributes: Any,
+    ) -> None:
+        emit_span(
+            self.hooks,
+            self.session,
+            name,
+            start,
+            end,
+            trace_id or self.trace_id,
+            attributes,
+        )
+
+    def start(self, trace: _InputTrace) -> None:
+        received = time.time()
+        self.trace_id = trace.id
+        self.received = received
+        sent = trace.sentAt / 1000
+        for debounce in trace.debounce:
+            self.emit(
+                "client.debounce", debounce.start / 1000, sent, input=debounce.input
+            )
+        self.emit("network.upload", sent, received)
+
+        async def flushed() -> None:
+            end = time.time()
+            self.emit("reactive.flush", received, end, trace_id=trace.id)
+            if self.trace_id == trace.id:
+                self.trace_id = None
+            # The client adds the spans for receiving the values, and sends them
+            # back to the server
+            await post_message(
+                self.session,
+                "shinyReactTrace",
+                {"id": trace.id, "flushedAt": end * 1000},
+            )
+
+        self.session.on_flushed(flushed, once=True)
+
+    def finish(self, trace: _ClientTrace) -> None:
+        for span in trace.spans:
+            attributes = {"output": span.output} if span.output else {}
+            self.emit(
+                span.name, span.start / 1000, span.end / 1000, trace.id, **attributes
+            )
+
+
+_tracers: "weakref.WeakKeyDictionary[Session, _SessionTracer]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _active_tracer() -> Optional[_SessionTracer]:
+    # The session's tracer, if it's processing a traced batch of inputs
+    if not _tracers:
+        return None
+    tracer = _tracers.get(require_active_session(None))
+    if tracer is None or tracer.trace_id is None:
+        return None
+    return tracer
+
+
+class _TraceRenderHook(RenderHook):
+    async def value(
+        self, renderer: render_json, fn: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        tracer = _active_tracer()
+        if tracer is None:
+            return await fn()
+        output_id = renderer.output_id
+        start = time.time()
+        tracer.emit("reactive.queue", tracer.received, start, output=output_id)
+        value = await fn()
+        # Work that runs in the background is reported when it finishes
+        if not inspect.isawaitable(value):
+            tracer.emit("output.value", start, time.time(), output=output_id)
+        return value
+
+    async def transform(
+        self, renderer: render_json, fn: Callable[[], Awaitable[Jsonifiable]]
+    ) -> Jsonifiable:
+        tracer = _active_tracer()
+        if tracer is None:
+            return await fn()
+        start = time.time()
+        result = await fn()
+        # Shiny serializes the value when it sends it. Doing it here too is
+        # wasteful, but shows how long that takes, and the value's size.
+        size = len(json.dumps(result, default=str))
+        tracer.emit(
+            "output.transform",
+            start,
+            time.time(),
+            output=renderer.output_id,
+            bytes=size,
+        )
+        return result
+
+    def background(
+        self, renderer: render_json
+    ) -> Optional[Callable[[float, str, Any], None]]:
+        tracer = _active_tracer()
+        if tracer is None:
+            return None
+        trace_id = tracer.trace_id
+
+        def finished(start: float, status: str, value: Any) -> None:
+            tracer.emit(
+                "output.value", start, time.time(), trace_id, output=renderer.output_id
+            )
+
+        return finished
+
+
+_trace_hook = _TraceRenderHook()
+
+
+def enable_tracing(session: Session, *hooks: TraceHook) -> None:
+    """
+    Trace where the time goes between changing inputs in the browser and the
+    resulting outputs reaching React components, for one session.
+
+    The browser gives each batch of input changes it sends a trace ID, and the
+    batch is followed through these spans:
+
+    * `client.debounce`: from an input's first change until the batch is sent.
+    * `network.upload`: from sending the batch until the server processes it.
+    * `reactive.queue`: from then until a `render_json` output starts running
+      (invalidation, and waiting for reactives that run before it).
+    * `output.value`: running the output's function. For outputs with
+      `cancel_superseded=True`, this covers the background work.
+    * `output.transform`: transforming and serializing the output's value.
+    * `reactive.flush`: from receiving the batch until the resulting output
+      values have been sent.
+    * `network.download`: from then until the browser receives the values.
+    * `client.apply`: passing an output's value to the components using it.
+
+    Each span is passed to every hook as a dict with the `trace_id`, the
+    `session` ID, the span's `name`, `start` and `end` (Unix times, in seconds),
+    `duration_ms`, and `attributes`, such as the input or output ID. Spans are
+    reported as they end, so a trace's spans can arrive in any order.
+
+    Times in the browser come from its own clock, so spans that cross the
+    network are only accurate when the browser and server run on the same
+    machine, or have synchronized clocks.
+
+    Parameters
+    ----------
+    session
+        The session to trace.
+    *hooks
+        Functions to call with each span, like a `TraceFileExporter`.
+    """
+    add_render_hook(_trace_hook)
+    tracer = _SessionTracer(session, hooks)
+    _tracers[session] = tracer
+
+    @reactive.effect
+    async def _start_client_tracing():
+        await post_message(session, "shinyReactTracing", {"enabled": True})
+
+    input_trace = typed_input(session.input[".shinyreact_trace"], _InputTrace)
+    client_trace = typed_input(session.input[".shinyreact_trace_client"], _ClientTrace)
+
+    # Higher priority than outputs, so the trace starts before they run
+    @reactive.effect(priority=100)
+    def _trace_inputs():
+        trace = input_trace()
+        if trace is not None:
+            tracer.start(trace)
+
+    @reactive.effect
+    def _trace_client():
+        trace = client_trace()
+        if trace is not None:
+            tracer.finish(trace)
+
+    session.on_ended(lambda: _tracers.pop(session, None))
+
+
+class TraceFileExporter:
+    """
+    A trace hook that appends spans to a file, one JSON object per line, for
+    analysis elsewhere (for example, building a flame chart of each trace).
+
+    Parameters
+    ----------
+    path
+        The file to append to.
+    """
+
+    def __init__(self, path: str | os.PathLike[str]) -> None:
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, span: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(span) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
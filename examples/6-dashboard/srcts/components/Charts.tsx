@@ -1,8 +1,12 @@
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Skeleton } from "@/components/ui/skeleton";
-import { useShinyOutput } from "@posit/shiny-react";
+import {
+  useShinyInput,
+  useShinyMessageHandler,
+  useShinyOutput,
+} from "@posit/shiny-react";
 import { BarChart3, TrendingUp } from "lucide-react";
-import React from "react";
+import React, { useCallback, useEffect, useRef, useState } from "react";
 import {
   Bar,
   BarChart,
@@ -28,19 +32,24 @@ interface CategoryPerformancePoint {
   revenue: number;
 }
 
+interface RevenueTrendColumns {
+  date: string[];
+  revenue: number[];
+  orders: number[];
+  users: number[];
+}
+
 // Column-major format from backend
 interface ChartColumns {
-  revenue_trend: {
-    date: string[];
-    revenue: number[];
-    orders: number[];
-    users: number[];
-  };
+  revenue_trend: RevenueTrendColumns;
   category_performance: {
     category: string[];
     sales: number[];
     revenue: number[];
   };
+  // Number of time series rows on the server when this was computed. Rows
+  // appended after that arrive in revenue_trend_append messages.
+  trend_rows?: number;
 }
 
 // Row-major format for Recharts
@@ -49,24 +58,117 @@ interface ChartData {
   category_performance: CategoryPerformancePoint[];
 }
 
+// Rows appended to the time series on the server after chart_data was sent
+interface RevenueTrendAppend {
+  rows: RevenueTrendColumns;
+  // Row number of the first row, counting all rows on the server
+  first_row: number;
+  start_date: string;
+}
+
+interface AppendedRows {
+  rows: { row: number; point: ChartDataPoint }[];
+  windowStart: string | null;
+}
+
+function revenueTrendRows(
+  columns: RevenueTrendColumns | undefined
+): ChartDataPoint[] {
+  if (!Array.isArray(columns?.date)) {
+    return [];
+  }
+  return columns.date.map((date: string, index: number) => ({
+    date,
+    revenue: columns.revenue?.[index] || 0,
+    orders: columns.orders?.[index] || 0,
+    users: columns.users?.[index] || 0,
+  }));
+}
+
 export function Charts() {
+  // On small screens the charts start below the fold; chart_data isn't
+  // computed until they're scrolled near the viewport.
+  const containerRef = useRef<HTMLDivElement>(null);
   const [chartColumnsData, isLoading] = useShinyOutput<
     ChartColumns | undefined
-  >("chart_data", undefined);
+  >("chart_data", undefined, { ref: containerRef });
+
+  // Report the chart width to the server, which uses it to limit the number of
+  // points sent for the revenue trend.
+  const [_, setChartWidth] = useShinyInput<number | null>("chart_width", null);
+
+  useEffect(() => {
+    const el = containerRef.current;
+    if (!el) return;
+
+    const resizeObserver = new ResizeObserver((entries) => {
+      for (const entry of entries) {
+        // Round to 50px steps so small layout shifts don't trigger recomputes
+        setChartWidth(Math.round(entry.contentRect.width / 50) * 50);
+      }
+    });
+
+    resizeObserver.observe(el);
+
+    return () => {
+      resizeObserver.disconnect();
+    };
+  }, [setChartWidth]);
+
+  // When the server gets new data, it sends just the new rows instead of
+  // recomputing chart_data.
+  const [appended, setAppended] = useState<AppendedRows>({
+    rows: [],
+    windowStart: null,
+  });
+
+  // Rows already included in chart_data
+  const trendRowsRef = useRef(0);
+
+  const handleTrendAppend = useCallback((msg: RevenueTrendAppend) => {
+    const newRows = revenueTrendRows(msg.rows)
+      .map((point, index) => ({ row: msg.first_row + index, point }))
+      .filter(({ row }) => row >= trendRowsRef.current);
+    // Rows that have left the window are dropped here, rather than only when
+    // rendering, so that a live chart's state doesn't grow without bound
+    setAppended((prev) => ({
+      rows: [...prev.rows, ...newRows].filter(
+        ({ point }) => point.date >= msg.start_date
+      ),
+      windowStart: msg.start_date,
+    }));
+  }, []);
+
+  useShinyMessageHandler("revenue_trend_append", handleTrendAppend);
+
+  // A new chart_data value includes the rows that existed when it was
+  // computed. Rows appended since then (possibly while it was computed in the
+  // background) are kept.
+  useEffect(() => {
+    const trendRows = chartColumnsData?.trend_rows;
+    trendRowsRef.current = trendRows ?? 0;
+    setAppended((prev) => {
+      const rows = prev.rows.filter(
+        ({ row }) => trendRows !== undefined && row >= trendRows
+      );
+      return {
+        rows,
+        windowStart: rows.length > 0 ? prev.windowStart : null,
+      };
+    });
+  }, [chartColumnsData]);
 
   // Convert column-major format to row-major format for Recharts
   const chartData: ChartData | undefined = chartColumnsData
     ? {
-        revenue_trend: Array.isArray(chartColumnsData.revenue_trend?.date)
-          ? chartColumnsData.revenue_trend.date.map(
-              (date: string, index: number) => ({
-                date,
-                revenue: chartColumnsData.revenue_trend.revenue?.[index] || 0,
-                orders: chartColumnsData.revenue_trend.orders?.[index] || 0,
-                users: chartColumnsData.revenue_trend.users?.[index] || 0,
-              })
-            )
-          : [],
+        revenue_trend: [
+          ...revenueTrendRows(chartColumnsData.revenue_trend),
+          ...appended.rows.map(({ point }) => point),
+        ].filter(
+          (point) =>
+            appended.windowStart === null ||
+            point.date >= appended.windowStart
+        ),
         category_performance: Array.isArray(
           chartColumnsData.category_performance?.category
         )
@@ -102,7 +204,7 @@ export function Charts() {
 
   if (!chartData || isLoading) {
     return (
-      <div className='space-y-6'>
+      <div ref={containerRef} className='space-y-6'>
         {/* Revenue Trend Skeleton */}
         <Card>
           <CardHeader>
@@ -127,7 +229,7 @@ export function Charts() {
   }
 
   return (
-    <div className='space-y-6'>
+    <div ref={containerRef} className='space-y-6'>
       {/* Revenue Trend Chart */}
       <Card>
         <CardHeader>
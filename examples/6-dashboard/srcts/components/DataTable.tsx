@@ -11,7 +11,7 @@ import {
 } from "@/components/ui/table";
 import { useShinyOutput } from "@posit/shiny-react";
 import { ArrowUpDown, Package } from "lucide-react";
-import React from "react";
+import React, { useRef } from "react";
 
 interface TableRowData {
   id: string;
@@ -39,9 +39,12 @@ interface TableData {
 }
 
 export function DataTable() {
+  // Only compute the table while it's on (or near) the screen
+  const cardRef = useRef<HTMLDivElement>(null);
   const [tableData, isLoading] = useShinyOutput<TableData | undefined>(
     "table_data",
-    undefined
+    undefined,
+    { ref: cardRef }
   );
 
   // Get column names and number of rows from the column-major data
@@ -90,7 +93,7 @@ export function DataTable() {
   };
 
   return (
-    <Card>
+    <Card ref={cardRef}>
       <CardHeader>
         <CardTitle className='text-lg flex items-center'>
           <Package className='mr-2 h-5 w-5' />
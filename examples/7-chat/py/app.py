@@ -1,10 +1,14 @@
+import dataclasses
+import os
 from pathlib import Path
+from typing import List
 
 import dotenv
 from chatlas import ChatOpenAI, content_image_url
 from shiny import App, Inputs, Outputs, Session, reactive
 
-from shinyreact import page_react
+from sessionmemory import SessionMemory
+from shinyreact import page_react, typed_input
 
 # Load .env file in this directory for OPENAI_API_KEY
 app_dir = Path(__file__).parent
@@ -12,52 +16,84 @@ env_file = app_dir / ".env"
 print(env_file)
 dotenv.load_dotenv(env_file)
 
-# Initialize chat with OpenAI GPT-4o-mini by default
-chat = ChatOpenAI(
-    model="gpt-4o-mini",
-    system_prompt="You are a helpful AI assistant. Be concise but informative in your responses.",
-)
+# Most memory a session's conversation may retain, in megabytes. Image
+# attachments make it grow quickly; the oldest exchanges are forgotten to stay
+# under it.
+CHAT_MEMORY_LIMIT_MB = float(os.environ.get("CHAT_MEMORY_LIMIT_MB", "50"))
+
+
+def new_chat() -> ChatOpenAI:
+    # Initialize chat with OpenAI GPT-4o-mini by default
+    return ChatOpenAI(
+        model="gpt-4o-mini",
+        system_prompt="You are a helpful AI assistant. Be concise but informative in your responses.",
+    )
+
+
+def forget_oldest_turns(chat: ChatOpenAI) -> None:
+    """Forget the older half of a conversation, keeping whole exchanges"""
+    turns = chat.get_turns()
+    # Turns alternate between the user and the assistant
+    n_exchanges = len(turns) // 2
+    chat.set_turns(turns[2 * ((n_exchanges + 1) // 2) :])
+
+
+@dataclasses.dataclass
+class ImageAttachment:
+    name: str
+    content: str  # base64 encoded data
+    type: str  # MIME type
+    size: int
+
+
+@dataclasses.dataclass
+class ChatMessage:
+    text: str
+    attachments: List[ImageAttachment] = dataclasses.field(default_factory=list)
 
 
 def server(input: Inputs, output: Outputs, session: Session):
 
+    # Each session has its own conversation, so its history is freed when the
+    # session ends, and can be trimmed when it gets too large.
+    chat = new_chat()
+    responding = False
+
+    def evict_history():
+        # Changing the turns while a response streams in would lose it
+        if not responding:
+            forget_oldest_turns(chat)
+
+    memory = SessionMemory(session, limit=int(CHAT_MEMORY_LIMIT_MB * 1024**2))
+    memory.track_object("chat_history", chat.get_turns, evict=evict_history)
+
+    # Decoded and checked once per message, so the handler gets a ChatMessage
+    chat_input = typed_input(input.chat_input, ChatMessage)
+
     @reactive.effect
-    @reactive.event(input.chat_input)
+    @reactive.event(chat_input)
     async def handle_chat_input():
-        message_data = input.chat_input()
-        if not message_data or not message_data["text"]:
+        message = chat_input()
+        if message is None or not message.text:
             return
 
+        nonlocal responding
+        responding = True
         try:
-            # Parse structured input (dict with text and attachments)
-            # Handle both string (backwards compatibility) and structured input
-            if isinstance(message_data, str):
-                user_text = message_data.strip()
-                attachments = []
-            elif isinstance(message_data, dict):
-                user_text = message_data.get("text", "").strip()
-                attachments = message_data.get("attachments", [])
-            else:
-                user_text = ""
-                attachments = []
-
             # Build chat arguments
             chat_args = []
 
             # Add user text if present
+            user_text = message.text.strip()
             if user_text:
                 chat_args.append(user_text)
 
             # Add image attachments as content_image_url objects
-            if attachments:
-                for attachment in attachments:
-                    if attachment.get("content") and attachment.get("type"):
-                        # Create data URL from base64 content
-                        data_url = (
-                            f"data:{attachment['type']};base64,{attachment['content']}"
-                        )
-                        # Add image content to chat arguments
-                        chat_args.append(content_image_url(data_url))
+            for attachment in message.attachments:
+                if attachment.content and attachment.type:
+                    # Create data URL from base64 content
+                    data_url = f"data:{attachment.type};base64,{attachment.content}"
+                    chat_args.append(content_image_url(data_url))
 
             # Ensure we have at least some content to send
             if not chat_args:
@@ -76,6 +112,8 @@ def server(input: Inputs, output: Outputs, session: Session):
                 "Sorry, I encountered an error processing your request. Please try again.",
                 done=True,
             )
+        finally:
+            responding = False
 
     # Send a chunk of text to the front end
     async def send_chunk(chunk: str, done: bool = False):
@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import random
+import sys
+import threading
+import types
+import warnings
+import weakref
+from collections import deque
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from shiny import App, Session, reactive
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# Objects that are never walked into when estimating sizes: they're shared by
+# everything, and walking them would count the whole program.
+_OPAQUE_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+    weakref.ref,
+)
+
+# Stop walking an object graph after this many objects. Sizes are estimated in
+# a thread, but it still holds the GIL while it walks, and so competes with the
+# event loop for the whole walk.
+_MAX_OBJECTS = 100_000
+
+# Everything reachable from each set of `shared` objects, keyed by their IDs.
+# The objects are kept with it, so that their IDs can't be reused.
+_shared_exclude: Dict[Tuple[int, ...], Tuple[List[Any], Set[int]]] = {}
+_shared_exclude_lock = threading.Lock()
+
+# Every live session's accounting, for reports across sessions
+_accountants: "weakref.WeakSet[SessionMemory]" = weakref.WeakSet()
+
+
+def estimate_size(obj: Any, exclude: Iterable[int] = ()) -> int:
+    """
+    Estimate the memory retained by an object and everything it refers to, in
+    bytes.
+
+    Data frames and series report their own size (including the contents of
+    string columns), and arrays their buffers. Containers, and the attributes of
+    other objects, are walked. Each object is counted once, however often it's
+    reachable, and objects whose IDs are in `exclude` aren't counted at all.
+    """
+    return _estimate(obj, set(exclude))
+
+
+def _estimate(obj: Any, seen: Set[int]) -> int:
+    # Adds the IDs of the objects it counts to `seen`
+    total = 0
+    counted = 0
+    stack = [obj]
+    while stack and counted < _MAX_OBJECTS:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _OPAQUE_TYPES):
+            continue
+        seen.add(id(o))
+        counted += 1
+
+        # pandas objects
+        if hasattr(o, "memory_usage") and hasattr(o, "index"):
+            usage = o.memory_usage(deep=True)
+            total += int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+            continue
+        # numpy arrays and other buffers
+        nbytes = getattr(o, "nbytes", None)
+        if isinstance(nbytes, int):
+            total += nbytes
+            continue
+
+        total += sys.getsizeof(o)
+        if isinstance(o, (str, bytes, bytearray, int, float, complex, bool)):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif hasattr(o, "__dict__"):
+            stack.append(vars(o))
+    return total
+
+
+def _exclude_shared(shared: List[Any]) -> Set[int]:
+    # Walked once per process, by the first sample that needs it, rather than
+    # by every session as it starts
+    key = tuple(id(o) for o in shared)
+    with _shared_exclude_lock:
+        entry = _shared_exclude.get(key)
+        if entry is None:
+            exclude: Set[int] = set()
+            for o in shared:
+                _estimate(o, exclude)
+            entry = _shared_exclude[key] = (shared, exclude)
+    return entry[1]
+
+
+def format_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(n) < 1024 or unit == "GB":
+            break
+        n /= 1024
+    return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+
+
+class SessionMemory:
+    """
+    Accounts for the memory a session retains: the cached values of its reactive
+    calcs, the last values of its outputs, and state the app keeps per session
+    (such as a conversation's history). It reports the largest consumers, warns
+    about values that keep growing, and can enforce a per-session limit.
+
+    The values of calcs and outputs are tracked by decorating their functions
+    with `track()`, which keeps a reference to the latest result. (A calc keeps
+    its value anyway; for an output, it's the value last sent to the client,
+    which is usually small.) Other state is tracked with `track_object()`, which
+    can be given a function that evicts some of it when the session is over its
+    limit. Sizes are estimated with `estimate_size()` every `interval` seconds,
+    in a thread, and each session's first sample comes at a random point in the
+    first interval, so that sessions started together don't sample together.
+
+    Parameters
+    ----------
+    session
+        The session to account for.
+    limit
+        Bytes the session may retain. When the tracked total is over it, the
+        eviction functions are called, largest consumer first, until it's under.
+    interval
+        Seconds between samples.
+    growth_samples
+        A consumer whose size has grown in this many consecutive samples is
+        reported as possibly leaking.
+    shared
+        Objects shared by all sessions that don't change, such as data loaded
+        at startup. They aren't counted when a session's values refer to them.
+        What they refer to is found once per process, and reused by every
+        session given the same objects.
+    """
+
+    def __init__(
+        self,
+        session: Session,
+        *,
+        limit: Optional[int] = None,
+        interval: float = 30,
+        growth_samples: int = 10,
+        shared: Iterable[Any] = (),
+    ):
+        self.session = session
+        self.limit = limit
+        self.growth_samples = growth_samples
+        # Latest estimated size of each consumer
+        self.sizes: Dict[str, int] = {}
+        # Consumers that have grown in each of the last growth_samples samples
+        self.growing: Set[str] = set()
+        self._shared = list(shared)
+        self._getters: Dict[str, Callable[[], Any]] = {}
+        self._evictors: Dict[str, Callable[[], None]] = {}
+        self._values: Dict[str, Any] = {}
+        self._history: Dict[str, Deque[int]] = {}
+        self._sampling: Optional[asyncio.Task[None]] = None
+        _accountants.add(self)
+
+        started = False
+
+        @reactive.effect
+        def _sample():
+            nonlocal started
+            if not started:
+                started = True
+                reactive.invalidate_later(random.uniform(0, interval))
+                return
+            reactive.invalidate_later(interval)
+            # Sampling runs as a task, so that the session's outputs don't wait
+            # for it. A sample that's still running is left to finish.
+            if self._sampling is None or self._sampling.done():
+                with reactive.isolate():
+                    self._sampling = asyncio.create_task(self.sample())
+
+        session.on_ended(self._end)
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes.values())
+
+    def track(self, name: Optional[str] = None) -> Callable[[F], F]:
+        """
+        Decorate a calc's or an output's function to account for the value it
+        returns, under `name` (default: the function's name). It goes beneath
+        the `@reactive.calc` or `@render_json` decorator:
+
+            @reactive.calc
+            @memory.track()
+            def filtered_data():
+                ...
+        """
+
+        def decorator(fn: F) -> F:
+            key = name or fn.__name__
+            self._getters[key] = lambda: self._values.get(key)
+
+            if inspect.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    value = await fn(*args, **kwargs)
+                    self._values[key] = value
+                    return value
+
+                return async_wrapper  # type: ignore[return-value]
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                value = fn(*args, **kwargs)
+                self._values[key] = value
+                return value
+
+            return wrapper  # type: ignore[return-value]
+
+        return decorator
+
+    def track_object(
+        self,
+        name: str,
+        get: Callable[[], Any],
+        evict: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Account for the object returned by `get`, under `name`. If `evict` is
+        given, it's called to free some of the object's memory when the session
+        is over its limit; it may be called several times in a row.
+        """
+        self._getters[name] = get
+        if evict is not None:
+            self._evictors[name] = evict
+
+    async def sample(self) -> None:
+        """Estimate the size of every consumer, and enforce the limit."""
+        await self._measure(list(self._getters))
+        if self.limit is not None and self.total > self.limit:
+            await self._evict()
+
+    def report(self) -> List[Dict[str, Any]]:
+        """The consumers' latest sizes, largest first."""
+        return [
+            {"name": name, "bytes": size, "growing": name in self.growing}
+            for name, size in sorted(
+                self.sizes.items(), key=lambda item: item[1], reverse=True
+            )
+        ]
+
+    async def _measure(self, names: List[str]) -> None:
+        # The objects are fetched on the event loop, and walked in a thread
+        objects = [self._getters[name]() for name in names]
+        sizes = await asyncio.to_thread(self._estimate_all, objects)
+        for name, size in zip(names, sizes):
+            if size is not None:
+                self._record(name, size)
+
+    def _estimate_all(self, objects: List[Any]) -> List[Optional[int]]:
+        exclude = _exclude_shared(self._shared)
+        sizes: List[Optional[int]] = []
+        for obj in objects:
+            try:
+                sizes.append(estimate_size(obj, exclude))
+            except RuntimeError:
+                # Changed in place while it was being walked; the next sample
+                # will measure it
+                sizes.append(None)
+        return sizes
+
+    def _record(self, name: str, size: int) -> None:
+        self.sizes[name] = size
+
+        history = self._history.get(name)
+        if history is None:
+            history = self._history[name] = deque(maxlen=self.growth_samples + 1)
+        history.append(size)
+
+        # A leak shows as steady growth, not as one large value
+        growing = len(history) == history.maxlen and all(
+            after > before for before, after in zip(history, islice(history, 1, None))
+        )
+        if growing and name not in self.growing:
+            warnings.warn(
+                f"Session {self.session.id}: {name} has grown in each of the last "
+                f"{self.growth_samples} samples, to {format_bytes(size)}. "
+                "It may be leaking."
+            )
+        if growing:
+            self.growing.add(name)
+        else:
+            self.growing.discard(name)
+
+    async def _evict(self) -> None:
+        assert self.limit is not None
+        candidates = sorted(
+            self._evictors, key=lambda n: self.sizes.get(n, 0), reverse=True
+        )
+        for name in candidates:
+            # Evict from the largest consumer until it can't shrink any more,
+            # then move on to the next
+            while self.total > self.limit:
+                before = self.sizes.get(name, 0)
+                self._evictors[name]()
+                await self._measure([name])
+                if self.sizes.get(name, 0) >= before:
+                    break
+            if self.total <= self.limit:
+                return
+
+        warnings.warn(
+            f"Session {self.session.id} retains {format_bytes(self.total)}, over "
+            f"its limit of {format_bytes(self.limit)}, after evicting what it can."
+        )
+
+    def _end(self) -> None:
+        _accountants.discard(self)
+        if self._sampling is not None:
+            self._sampling.cancel()
+        self._values.clear()
+
+
+def memory_report(n: int = 10) -> Dict[str, Any]:
+    """
+    The `n` largest consumers across all sessions, and each session's total,
+    largest first.
+    """
+    accountants = list(_accountants)
+    consumers = [
+        {"session": a.session.id, **row} for a in accountants for row in a.report()
+    ]
+    consumers.sort(key=lambda row: row["bytes"], reverse=True)
+    sessions = sorted(
+        ({"session": a.session.id, "bytes": a.total} for a in accountants),
+        key=lambda row: row["bytes"],
+        reverse=True,
+    )
+    return {"sessions": sessions, "top_consumers": consumers[:n]}
+
+
+def serve_memory_report(app: App, path: str = "memory") -> None:
+    """
+    Serve `memory_report()` as JSON at `GET <path>`, relative to the app's URL.
+    The report includes session IDs, so this is meant for development, or for
+    deployments where the route isn't publicly reachable.
+    """
+    path = path.strip("/")
+
+    async def report(request: Request) -> Response:
+        try:
+            n = int(request.query_params.get("n", "10"))
+        except ValueError:
+            return JSONResponse({"error": "n must be an integer"}, status_code=400)
+        return JSONResponse(memory_report(n))
+
+    # Ahead of the app's own routes, which include a catch-all for static files
+    app.starlette_app.router.routes[0:0] = [Route(f"/{path}", report)]
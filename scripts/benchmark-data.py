@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Benchmark the dashboard example's data functions (examples/6-dashboard/py/data.py)
+at increasing data sizes.
+
+For each size, this generates the sample data, then runs filter_data(),
+calculate_metrics() and calculate_range_metrics() with several combinations of
+filters. Each benchmark reports the minimum and median time of several runs,
+and the peak memory allocated during one run (measured separately, because
+tracing allocations slows the code down).
+
+Usage, from the top level of the repository:
+
+    python scripts/benchmark-data.py --json baseline.json
+    python scripts/benchmark-data.py --sizes 1e3,1e4,1e5 --baseline baseline.json
+
+With --baseline, the exit status is 1 if any benchmark got slower, or allocated
+more memory, than in a previous --json report by more than the tolerances.
+
+A size is the number of products. The revenue time series has one row per day,
+ending today, so it's capped at MAX_DAYS rows: pandas can't represent dates
+much more than that far in the past.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(
+    0, str(Path(__file__).resolve().parent.parent / "examples" / "6-dashboard" / "py")
+)
+
+from data import (  # noqa: E402
+    build_metrics_index,
+    calculate_metrics,
+    calculate_range_metrics,
+    filter_data,
+    generate_sample_data,
+)
+
+DEFAULT_SIZES = [10**3, 10**4, 10**5, 10**6, 10**7]
+
+# pandas timestamps start in 1677
+MAX_DAYS = 100_000
+
+# Filter combinations, as arguments to filter_data()
+FILTERS: dict[str, dict[str, Any]] = {
+    "default": {"date_range": "last_30_days"},
+    "year": {"date_range": "this_year"},
+    "search": {"date_range": "last_30_days", "search_term": "phone"},
+    "categories": {
+        "date_range": "last_30_days",
+        "selected_categories": ["electronics", "books"],
+    },
+    "combined": {
+        "date_range": "this_year",
+        "search_term": "o",
+        "selected_categories": ["electronics", "clothing", "books"],
+    },
+}
+
+# Time differences smaller than this are noise, however large in proportion
+NOISE_FLOOR_S = 0.0005
+
+
+def measure(fn: Callable[[], Any], repeat: int, max_time: float) -> dict[str, Any]:
+    """
+    Time `repeat` runs of fn (fewer, if they take more than `max_time` seconds
+    in all), after one run that measures peak memory and warms up caches.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    times: list[float] = []
+    while len(times) < repeat and (not times or sum(times) < max_time):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    return {
+        "runs": len(times),
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_bytes": peak,
+    }
+
+
+def run_benchmarks(
+    sizes: list[int], repeat: int, max_time: float
+) -> dict[str, dict[str, Any]]:
+    """Results of each benchmark, keyed by function, size, and filters."""
+    results: dict[str, dict[str, Any]] = {}
+
+    def run(key: str, fn: Callable[[], Any]) -> None:
+        results[key] = measure(fn, repeat, max_time)
+        print(format_result(key, results[key]), flush=True)
+
+    end_date = datetime.now().date()
+    for size in sizes:
+        n_days = min(size, MAX_DAYS)
+        run(
+            f"generate_sample_data/{size}",
+            lambda: generate_sample_data(n_days=n_days, n_products=size),
+        )
+
+        data = generate_sample_data(n_days=n_days, n_products=size)
+        index = build_metrics_index(data["revenue_trend"])
+        for name, filters in FILTERS.items():
+            run(
+                f"filter_data/{size}/{name}",
+                lambda: filter_data(data, end_date=end_date, **filters),
+            )
+            filtered = filter_data(data, end_date=end_date, **filters)
+            run(
+                f"calculate_metrics/{size}/{name}",
+                lambda: calculate_metrics(filtered),
+            )
+            run(
+                f"calculate_range_metrics/{size}/{name}",
+                lambda: calculate_range_metrics(
+                    index, filters["date_range"], end_date=end_date
+                ),
+            )
+
+    return results
+
+
+def format_result(key: str, result: dict[str, Any]) -> str:
+    return (
+        f"{key:<44} {result['median_s'] * 1000:>10.2f} ms median, "
+        f"{result['min_s'] * 1000:>10.2f} ms min, "
+        f"{result['peak_bytes'] / 1024**2:>9.1f} MiB peak "
+        f"(n={result['runs']})"
+    )
+
+
+def find_regressions(
+    results: dict[str, dict[str, Any]],
+    baseline: dict[str, dict[str, Any]],
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> list[str]:
+    """Benchmarks that are worse than the baseline by more than the tolerances."""
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        median, base_median = result["median_s"], base["median_s"]
+        if (
+            median > base_median * (1 + time_tolerance)
+            and median - base_median > NOISE_FLOOR_S
+        ):
+            regressions.append(
+                f"{key}: {median * 1000:.2f} ms vs. {base_median * 1000:.2f} ms "
+                "in baseline"
+            )
+        peak, base_peak = result["peak_bytes"], base["peak_bytes"]
+        if peak > base_peak * (1 + memory_tolerance):
+            regressions.append(
+                f"{key}: {peak / 1024**2:.1f} MiB vs. {base_peak / 1024**2:.1f} MiB "
+                "peak in baseline"
+            )
+    return regressions
+
+
+def parse_sizes(value: str) -> list[int]:
+    # Accepts e.g. "1000,1e5"
+    return [int(float(size)) for size in value.split(",") if size.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dashboard example's data functions."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=parse_sizes,
+        default=DEFAULT_SIZES,
+        help="Comma-separated numbers of products (default: 1e3,1e4,1e5,1e6,1e7)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed runs of each benchmark"
+    )
+    parser.add_argument(
+        "--max-time",
+        type=float,
+        default=10,
+        help="Seconds after which a benchmark stops repeating",
+    )
+    parser.add_argument("--json", type=Path, help="Write the results to a file")
+    parser.add_argument(
+        "--baseline", type=Path, help="Compare with results from a --json file"
+    )
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=0.2,
+        help="Fraction by which median times can be worse than the baseline",
+    )
+    parser.add_argument(
+        "--memory-tolerance",
+        type=float,
+        default=0.1,
+        help="Fraction by which peak memory can be worse than the baseline",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.repeat, args.max_time)
+
+    if args.json:
+        report = {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "results": results,
+        }
+        args.json.write_text(json.dumps(report, indent=2))
+        print(f"\nWrote results to {args.json}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = find_regressions(
+            results,
+            baseline["results"],
+            args.time_tolerance,
+            args.memory_tolerance,
+        )
+        if regressions:
+            print("\nRegressions compared to the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions compared to the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,692 @@
+#!/usr/bin/env python3
+"""
+Load test an example app's Python backend.
+
+This starts the app (or connects to one that's already running), opens many
+simulated sessions that speak Shiny's websocket protocol, and has each one play
+a scripted sequence of input changes, such as typing, slider sweeps, or filter
+changes. It reports the time from sending an input to receiving the outputs
+that depend on it, message and byte rates, and the server's CPU and memory use.
+
+Usage, from the top level of the repository:
+
+    python scripts/loadtest.py 6-dashboard --sessions 20 --duration 60
+    python scripts/loadtest.py 2-inputs --scenario slider_sweep --json out.json
+    python scripts/loadtest.py 6-dashboard --baseline out.json
+
+With --baseline, the exit status is 1 if latency or memory got worse than in a
+previous --json report by more than --tolerance, to catch regressions.
+
+Requires the `websockets` package, which Shiny depends on. Server CPU and memory
+are only reported if `psutil` is installed. Build the example first (see
+scripts/build-all-examples.sh), because the app serves its www/ directory.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import websockets
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+EXAMPLES_DIR = Path(__file__).resolve().parent.parent / "examples"
+
+
+@dataclass
+class Step:
+    """Input values to send, and the outputs that should update in response."""
+
+    inputs: dict[str, Any]
+    expect: tuple[str, ...]
+    # Seconds to wait after the outputs update, like a user pausing
+    pause: float = 0.1
+    # An output, and a function of its value, that the step should change. If
+    # it doesn't, the step is counted as unchanged: the app probably didn't
+    # recognize the inputs.
+    changes: Optional[tuple[str, Callable[[Any], Any]]] = None
+
+
+@dataclass
+class Scenario:
+    """
+    A session's script. The session starts with `initial` inputs, waits for
+    the `expect` outputs, then plays the steps in a loop until time is up.
+
+    Every step must change at least one input, including the first step after
+    the last (when the loop restarts). Otherwise the server doesn't recompute
+    anything, and the step times out.
+    """
+
+    initial: dict[str, Any]
+    expect: tuple[str, ...]
+    steps: list[Step]
+    # Client data for outputs that need it, like plots' sizes
+    clientdata: dict[str, Any] = field(default_factory=dict)
+
+
+def typing(
+    input_id: str, text: str, expect: tuple[str, ...], pause: float = 0.15
+) -> list[Step]:
+    """Steps that type `text` into an input, one character at a time."""
+    return [Step({input_id: text[:i]}, expect, pause) for i in range(1, len(text) + 1)]
+
+
+def sweep(
+    input_id: str, values: list[Any], expect: tuple[str, ...], pause: float = 0.05
+) -> list[Step]:
+    """Steps that set an input to each of `values` in turn, like a slider drag."""
+    return [Step({input_id: value}, expect, pause) for value in values]
+
+
+def plot_clientdata(
+    *output_ids: str, width: int = 600, height: int = 400, formats: Any = None
+) -> dict[str, Any]:
+    """Client data that ImageOutput sends for plot outputs."""
+    data: dict[str, Any] = {}
+    for output_id in output_ids:
+        data[f".clientdata_output_{output_id}_width"] = width
+        data[f".clientdata_output_{output_id}_height"] = height
+        if formats is not None:
+            data[f".clientdata_output_{output_id}_formats"] = formats
+    return data
+
+
+DASHBOARD_OUTPUTS = ("metrics_data", "chart_data", "table_data")
+# Outputs that don't depend on the date range alone
+DASHBOARD_FILTERED = ("chart_data", "table_data")
+MPG_OUTPUTS = ("table_data", "table_stats", "plot1", "plot1_selection")
+# The number of products the dashboard's filters matched
+DASHBOARD_ROWS = ("table_data", lambda value: value["total_rows"])
+
+# Scenarios for each example. The first is the default.
+SCENARIOS: dict[str, dict[str, Scenario]] = {
+    "1-hello-world": {
+        "typing": Scenario(
+            initial={"txtin": "Hello, world!"},
+            expect=("txtout",),
+            steps=typing("txtin", "The quick brown fox", ("txtout",)),
+        ),
+    },
+    "2-inputs": {
+        "typing": Scenario(
+            initial={"txtin": ""},
+            expect=("txtout",),
+            steps=typing("txtin", "The quick brown fox", ("txtout",)),
+        ),
+        "slider_sweep": Scenario(
+            initial={"sliderin": 50},
+            expect=("sliderout",),
+            steps=sweep("sliderin", list(range(0, 101, 5)), ("sliderout",)),
+        ),
+        "batch_submit": Scenario(
+            initial={"batchdata": None},
+            expect=("batchout",),
+            steps=[
+                Step(
+                    {
+                        "batchdata": {
+                            "comment": "Load test",
+                            "priority": priority,
+                            "features": {
+                                "authentication": True,
+                                "notifications": priority > 50,
+                                "darkMode": False,
+                                "analytics": True,
+                            },
+                        }
+                    },
+                    ("batchout",),
+                    pause=0.5,
+                )
+                for priority in range(10, 101, 10)
+            ],
+        ),
+    },
+    "3-outputs": {
+        "row_sweep": Scenario(
+            initial={"table_rows": 5, "plot1_hover": None, "plot1_brush": None},
+            expect=MPG_OUTPUTS,
+            clientdata=plot_clientdata("plot1", formats=["png", "svg", "webp"]),
+            steps=sweep("table_rows", [*range(1, 33), *range(31, 4, -1)], MPG_OUTPUTS),
+        ),
+    },
+    "4-messages": {
+        # The server sends messages on a timer; there are no inputs to change
+        "listen": Scenario(initial={}, expect=(), steps=[]),
+    },
+    "5-shadcn": {
+        "typing": Scenario(
+            initial={"user_text": ""},
+            expect=("processed_text", "text_length"),
+            clientdata=plot_clientdata("plot1"),
+            steps=typing(
+                "user_text", "Shiny and React", ("processed_text", "text_length")
+            ),
+        ),
+    },
+    "6-dashboard": {
+        "filters": Scenario(
+            initial={
+                "date_range": "last_30_days",
+                "search_term": "",
+                "selected_categories": [],
+                "chart_width": 800,
+            },
+            expect=DASHBOARD_OUTPUTS,
+            steps=[
+                Step({"date_range": "last_7_days"}, DASHBOARD_OUTPUTS, pause=1),
+                Step({"date_range": "last_90_days"}, DASHBOARD_OUTPUTS, pause=1),
+                Step(
+                    {"selected_categories": ["electronics"]},
+                    DASHBOARD_FILTERED,
+                    changes=DASHBOARD_ROWS,
+                ),
+                Step(
+                    {"selected_categories": ["electronics", "books"]},
+                    DASHBOARD_FILTERED,
+                    pause=1,
+                    changes=DASHBOARD_ROWS,
+                ),
+                *typing("search_term", "pro", DASHBOARD_FILTERED),
+                Step(
+                    {"search_term": "", "selected_categories": []},
+                    DASHBOARD_FILTERED,
+                    changes=DASHBOARD_ROWS,
+                ),
+                Step({"date_range": "last_30_days"}, DASHBOARD_OUTPUTS, pause=1),
+            ],
+        ),
+        "resize": Scenario(
+            initial={
+                "date_range": "last_90_days",
+                "search_term": "",
+                "selected_categories": [],
+                "chart_width": 800,
+            },
+            expect=DASHBOARD_OUTPUTS,
+            steps=sweep(
+                "chart_width",
+                [*range(400, 1201, 50), *range(1150, 799, -50)],
+                ("chart_data",),
+            ),
+        ),
+    },
+}
+
+# Client data that every Shiny client sends when it connects
+BASE_CLIENTDATA: dict[str, Any] = {
+    ".clientdata_pixelratio": 1,
+    ".clientdata_url_protocol": "http:",
+    ".clientdata_url_hostname": "127.0.0.1",
+    ".clientdata_url_port": "",
+    ".clientdata_url_pathname": "/",
+    ".clientdata_url_search": "",
+    ".clientdata_url_hash_initial": "",
+    ".clientdata_url_hash": "",
+    ".clientdata_singletons": "",
+    ".clientdata_allowDataUriScheme": True,
+}
+
+
+@dataclass
+class LoadStats:
+    """Measurements from all sessions."""
+
+    # Seconds from connecting until the initial outputs arrived
+    startup: list[float] = field(default_factory=list)
+    # Seconds from sending a step's inputs until its outputs arrived
+    latencies: list[float] = field(default_factory=list)
+    timeouts: int = 0
+    output_errors: int = 0
+    # Steps whose `changes` output didn't change
+    unchanged_steps: int = 0
+    failed_sessions: int = 0
+    messages_received: int = 0
+    bytes_received: int = 0
+    messages_sent: int = 0
+    bytes_sent: int = 0
+    cpu_percent: list[float] = field(default_factory=list)
+    rss_bytes: list[int] = field(default_factory=list)
+
+
+class SimulatedSession:
+    """One client session, connected to the app's websocket."""
+
+    def __init__(self, ws_url: str, stats: LoadStats, timeout: float):
+        self.ws_url = ws_url
+        self.stats = stats
+        self.timeout = timeout
+        # When each output last received a value (or error)
+        self._updated: dict[str, float] = {}
+        # Each output's last value
+        self._values: dict[str, Any] = {}
+        self._changed = asyncio.Event()
+
+    async def run(self, scenario: Scenario, deadline: float) -> None:
+        try:
+            async with websockets.connect(self.ws_url, max_size=None) as ws:
+                reader = asyncio.create_task(self._read(ws))
+                try:
+                    await self._play(ws, scenario, deadline)
+                finally:
+                    reader.cancel()
+        except (OSError, websockets.exceptions.WebSocketException) as e:
+            print(f"Session failed: {e}", file=sys.stderr)
+            self.stats.failed_sessions += 1
+
+    async def _play(self, ws: Any, scenario: Scenario, deadline: float) -> None:
+        start = time.perf_counter()
+        init = {
+            **BASE_CLIENTDATA,
+            # Outputs that aren't known to be visible may be suspended
+            **{f".clientdata_output_{id}_hidden": False for id in _outputs(scenario)},
+            **scenario.clientdata,
+            **scenario.initial,
+        }
+        await self._send(ws, {"method": "init", "data": init})
+        try:
+            self.stats.startup.append(await self._wait_for(scenario.expect, start))
+        except asyncio.TimeoutError:
+            self.stats.timeouts += 1
+
+        if not scenario.steps:
+            await asyncio.sleep(max(0, deadline - time.monotonic()))
+            return
+
+        while True:
+            for step in scenario.steps:
+                if time.monotonic() >= deadline:
+                    return
+                before = self._checked_value(step)
+                sent = time.perf_counter()
+                await self._send(ws, {"method": "update", "data": step.inputs})
+                try:
+                    self.stats.latencies.append(await self._wait_for(step.expect, sent))
+                except asyncio.TimeoutError:
+                    self.stats.timeouts += 1
+                else:
+                    after = self._checked_value(step)
+                    if step.changes is not None and after == before:
+                        self.stats.unchanged_steps += 1
+                        if self.stats.unchanged_steps == 1:
+                            print(
+                                f"Warning: {step.changes[0]} didn't change after "
+                                f"sending {step.inputs}",
+                                file=sys.stderr,
+                            )
+                await asyncio.sleep(step.pause)
+
+    def _checked_value(self, step: Step) -> Any:
+        if step.changes is None:
+            return None
+        output_id, get = step.changes
+        value = self._values.get(output_id)
+        try:
+            return None if value is None else get(value)
+        except (KeyError, IndexError, TypeError):
+            return None
+
+    async def _send(self, ws: Any, message: dict[str, Any]) -> None:
+        text = json.dumps(message)
+        self.stats.messages_sent += 1
+        self.stats.bytes_sent += len(text.encode())
+        await ws.send(text)
+
+    async def _read(self, ws: Any) -> None:
+        async for raw in ws:
+            received = time.perf_counter()
+            self.stats.messages_received += 1
+            self.stats.bytes_received += len(
+                raw.encode() if isinstance(raw, str) else raw
+            )
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+
+            for output_id, value in (message.get("values") or {}).items():
+                self._updated[output_id] = received
+                self._values[output_id] = value
+            for output_id in message.get("errors") or {}:
+                self._updated[output_id] = received
+                self.stats.output_errors += 1
+            self._changed.set()
+
+    async def _wait_for(self, output_ids: tuple[str, ...], since: float) -> float:
+        """
+        Wait until all of the outputs have updated after `since`, and return the
+        time from `since` to the last update.
+        """
+
+        async def wait() -> float:
+            while True:
+                self._changed.clear()
+                times = [self._updated.get(id, -math.inf) for id in output_ids]
+                if min(times, default=since) >= since:
+                    return max(times, default=since) - since
+                await self._changed.wait()
+
+        return await asyncio.wait_for(wait(), self.timeout)
+
+
+def _outputs(scenario: Scenario) -> set[str]:
+    outputs = set(scenario.expect)
+    for step in scenario.steps:
+        outputs.update(step.expect)
+    return outputs
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(example: str, port: int) -> subprocess.Popen[bytes]:
+    """Run an example's Python app in a subprocess."""
+    app_dir = EXAMPLES_DIR / example / "py"
+    if not (app_dir / "www").exists():
+        print(f"Warning: {app_dir / 'www'} doesn't exist; build the example first")
+    return subprocess.Popen(
+        [sys.executable, "-m", "shiny", "run", "--port", str(port), "app.py"],
+        cwd=app_dir,
+    )
+
+
+async def wait_until_listening(
+    port: int, proc: subprocess.Popen[bytes], timeout: float = 60
+) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with status {proc.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            await asyncio.sleep(0.25)
+            continue
+        writer.close()
+        return
+    raise RuntimeError(f"App didn't start listening on port {port}")
+
+
+async def monitor_server(pid: int, stats: LoadStats, interval: float = 1) -> None:
+    """Sample the server's CPU and memory use, including worker processes."""
+    if psutil is None:
+        return
+    server = psutil.Process(pid)
+    # The first cpu_percent() call for each process only starts measuring
+    tracked: dict[int, Any] = {}
+    while True:
+        try:
+            procs = [server, *server.children(recursive=True)]
+        except psutil.NoSuchProcess:
+            return
+        cpu = 0.0
+        rss = 0
+        for proc in procs:
+            try:
+                if proc.pid not in tracked:
+                    tracked[proc.pid] = proc
+                    proc.cpu_percent()
+                else:
+                    cpu += tracked[proc.pid].cpu_percent()
+                rss += proc.memory_info().rss
+            except psutil.NoSuchProcess:
+                tracked.pop(proc.pid, None)
+        stats.cpu_percent.append(cpu)
+        stats.rss_bytes.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def run_load(
+    ws_url: str,
+    scenario: Scenario,
+    sessions: int,
+    duration: float,
+    ramp_up: float,
+    timeout: float,
+    server_pid: Optional[int],
+) -> tuple[LoadStats, float]:
+    """Run the sessions, and return their stats and the elapsed time."""
+    stats = LoadStats()
+    monitor = (
+        asyncio.create_task(monitor_server(server_pid, stats))
+        if server_pid is not None
+        else None
+    )
+
+    start = time.monotonic()
+    deadline = start + ramp_up + duration
+
+    async def session(i: int) -> None:
+        # Stagger the sessions' starts over the ramp-up period
+        await asyncio.sleep(ramp_up * i / sessions)
+        await SimulatedSession(ws_url, stats, timeout).run(scenario, deadline)
+
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.monotonic() - start
+    if monitor is not None:
+        monitor.cancel()
+    return stats, elapsed
+
+
+def percentile(values: list[float], p: float) -> Optional[float]:
+    """The p-th percentile (0-100) of values, by the nearest-rank method."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(stats: LoadStats, elapsed: float) -> dict[str, Any]:
+    def latency_summary(values: list[float]) -> dict[str, Any]:
+        return {
+            "n": len(values),
+            **{
+                f"p{p}_ms": None if (v := percentile(values, p)) is None else v * 1000
+                for p in (50, 90, 99)
+            },
+            "max_ms": max(values) * 1000 if values else None,
+        }
+
+    return {
+        "elapsed_s": elapsed,
+        "startup": latency_summary(stats.startup),
+        "latency": latency_summary(stats.latencies),
+        "timeouts": stats.timeouts,
+        "output_errors": stats.output_errors,
+        "unchanged_steps": stats.unchanged_steps,
+        "failed_sessions": stats.failed_sessions,
+        "received_messages_per_s": stats.messages_received / elapsed,
+        "received_bytes_per_s": stats.bytes_received / elapsed,
+        "sent_messages_per_s": stats.messages_sent / elapsed,
+        "sent_bytes_per_s": stats.bytes_sent / elapsed,
+        "server_cpu_percent_mean": (
+            sum(stats.cpu_percent) / len(stats.cpu_percent)
+            if stats.cpu_percent
+            else None
+        ),
+        "server_rss_bytes_peak": max(stats.rss_bytes) if stats.rss_bytes else None,
+    }
+
+
+def format_latency(summary: dict[str, Any]) -> str:
+    if summary["n"] == 0:
+        return "no samples"
+    return (
+        f"p50 {summary['p50_ms']:.1f} ms, p90 {summary['p90_ms']:.1f} ms, "
+        f"p99 {summary['p99_ms']:.1f} ms, max {summary['max_ms']:.1f} ms "
+        f"(n={summary['n']})"
+    )
+
+
+def print_report(title: str, summary: dict[str, Any]) -> None:
+    print(f"\n{title} ({summary['elapsed_s']:.1f}s)")
+    print(f"  Startup:   {format_latency(summary['startup'])}")
+    print(f"  Latency:   {format_latency(summary['latency'])}")
+    print(
+        f"  Problems:  {summary['timeouts']} timeouts, "
+        f"{summary['output_errors']} output errors, "
+        f"{summary['unchanged_steps']} unchanged steps, "
+        f"{summary['failed_sessions']} failed sessions"
+    )
+    print(
+        f"  Received:  {summary['received_messages_per_s']:.1f} msg/s, "
+        f"{summary['received_bytes_per_s'] / 1024:.1f} KiB/s"
+    )
+    print(
+        f"  Sent:      {summary['sent_messages_per_s']:.1f} msg/s, "
+        f"{summary['sent_bytes_per_s'] / 1024:.1f} KiB/s"
+    )
+    if summary["server_rss_bytes_peak"] is not None:
+        print(
+            f"  Server:    {summary['server_cpu_percent_mean']:.0f}% CPU (mean), "
+            f"{summary['server_rss_bytes_peak'] / 1024**2:.0f} MiB RSS (peak)"
+        )
+
+
+def find_regressions(
+    summary: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """Measurements that are worse than the baseline by more than tolerance."""
+    checks = [
+        ("p50 latency", summary["latency"]["p50_ms"], baseline["latency"]["p50_ms"]),
+        ("p90 latency", summary["latency"]["p90_ms"], baseline["latency"]["p90_ms"]),
+        ("p99 latency", summary["latency"]["p99_ms"], baseline["latency"]["p99_ms"]),
+        (
+            "peak server RSS",
+            summary["server_rss_bytes_peak"],
+            baseline["server_rss_bytes_peak"],
+        ),
+    ]
+    regressions = [
+        f"{name}: {value:.1f} vs. {base:.1f} in baseline"
+        for name, value, base in checks
+        if value is not None and base is not None and value > base * (1 + tolerance)
+    ]
+    if summary["timeouts"] > baseline["timeouts"]:
+        regressions.append(
+            f"timeouts: {summary['timeouts']} vs. {baseline['timeouts']} in baseline"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Load test an example app's Python backend."
+    )
+    parser.add_argument("example", choices=sorted(SCENARIOS), help="Example to test")
+    parser.add_argument(
+        "--scenario", help="Scenario to run (default: the example's first)"
+    )
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument(
+        "--duration", type=float, default=30, help="Seconds to run after ramp-up"
+    )
+    parser.add_argument(
+        "--ramp-up", type=float, default=5, help="Seconds over which sessions start"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30, help="Seconds to wait for outputs"
+    )
+    parser.add_argument(
+        "--url",
+        help="URL of an app that's already running, instead of starting one "
+        "(server CPU and memory aren't measured)",
+    )
+    parser.add_argument("--json", type=Path, help="Write the results to a file")
+    parser.add_argument(
+        "--baseline", type=Path, help="Compare with results from a --json file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Fraction by which results can be worse than the baseline",
+    )
+    args = parser.parse_args()
+
+    scenarios = SCENARIOS[args.example]
+    scenario_name = args.scenario or next(iter(scenarios))
+    if scenario_name not in scenarios:
+        parser.error(
+            f"{args.example} has no scenario {scenario_name!r}; "
+            f"choose from {', '.join(scenarios)}"
+        )
+    if psutil is None and args.url is None:
+        print("Note: install psutil to measure the server's CPU and memory use")
+
+    proc = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        proc = start_app(args.example, port)
+
+    ws_url = base_url.replace("http", "ws", 1) + "/websocket/"
+    try:
+        if proc is not None:
+            asyncio.run(wait_until_listening(port, proc))
+        stats, elapsed = asyncio.run(
+            run_load(
+                ws_url,
+                scenarios[scenario_name],
+                sessions=args.sessions,
+                duration=args.duration,
+                ramp_up=args.ramp_up,
+                timeout=args.timeout,
+                server_pid=proc.pid if proc is not None else None,
+            )
+        )
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    summary = {
+        "example": args.example,
+        "scenario": scenario_name,
+        "sessions": args.sessions,
+        **summarize(stats, elapsed),
+    }
+    print_report(
+        f"{args.example} / {scenario_name}, {args.sessions} sessions", summary
+    )
+
+    if args.json:
+        args.json.write_text(json.dumps(summary, indent=2))
+        print(f"\nWrote results to {args.json}")
+
+    if args.baseline:
+        regressions = find_regressions(
+            summary, json.loads(args.baseline.read_text()), args.tolerance
+        )
+        if regressions:
+            print("\nRegressions compared to the baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions compared to the baseline")
+
+
+if __name__ == "__main__":
+    main()
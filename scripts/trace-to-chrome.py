@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Convert latency traces or reactive profiles written by TraceFileExporter (in
+the dashboard example's tracing.py, one JSON span per line) to the Chrome trace
+event format, which can be opened in https://ui.perfetto.dev or chrome://tracing
+as a flame chart.
+
+Each session is shown as a process, and each trace (one batch of input
+changes, or one reactive flush when profiling) as a thread within it, so the
+spans of one interaction are stacked together.
+
+Usage:
+    python scripts/trace-to-chrome.py traces.jsonl traces.json
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import Any
+
+
+def convert(spans: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Convert spans to complete ("X") trace events, with name metadata."""
+    events: list[dict[str, Any]] = []
+    pids: dict[str, int] = {}
+    tids: dict[str, int] = {}
+
+    # Longer spans first, so that spans starting at the same time nest properly
+    for span in sorted(spans, key=lambda s: (s["start"], -s["duration_ms"])):
+        session = span["session"]
+        trace_id = span["trace_id"] or "untraced"
+        if session not in pids:
+            pids[session] = len(pids) + 1
+            events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": pids[session],
+                    "args": {"name": f"session {session}"},
+                }
+            )
+        if trace_id not in tids:
+            tids[trace_id] = len(tids) + 1
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pids[session],
+                    "tid": tids[trace_id],
+                    "args": {"name": f"trace {trace_id}"},
+                }
+            )
+
+        attributes = span.get("attributes") or {}
+        label = (
+            attributes.get("output")
+            or attributes.get("input")
+            or attributes.get("node")
+        )
+        events.append(
+            {
+                "name": f"{span['name']} {label}" if label else span["name"],
+                "cat": span["name"].split(".")[0],
+                "ph": "X",
+                # Microseconds
+                "ts": span["start"] * 1e6,
+                "dur": max(0.0, span["end"] - span["start"]) * 1e6,
+                "pid": pids[session],
+                "tid": tids[trace_id],
+                "args": attributes,
+            }
+        )
+
+    return events
+
+
+def main() -> None:
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+
+    input_file, output_file = Path(sys.argv[1]), Path(sys.argv[2])
+    with open(input_file, encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+
+    events = convert(spans)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    print(f"Wrote {len(spans)} spans to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,36 +2,39 @@ import React, { useEffect, useRef, useState } from "react";
 import { useShinyInput, useShinyOutput } from "./use-shiny";
 import { debounce } from "./utils";
 
+export type PlotPanel = {
+  panel: number;
+  row: number;
+  col: number;
+  domain: {
+    left: number;
+    right: number;
+    bottom: number;
+    top: number;
+  };
+  range: {
+    left: number;
+    right: number;
+    bottom: number;
+    top: number;
+  };
+  log: {
+    x: string | null;
+    y: string | null;
+  };
+  mapping: {
+    x: string | null;
+    y: string | null;
+  };
+};
+
 export type ImageData = {
+  // A data URI, or a URL relative to the app
   src: string;
   width: number;
   height: number;
   coordmap: {
-    panels: {
-      panel: number;
-      row: number;
-      col: number;
-      domain: {
-        left: number;
-        right: number;
-        bottom: number;
-        top: number;
-      };
-      range: {
-        left: number;
-        right: number;
-        bottom: number;
-        top: number;
-      };
-      log: {
-        x: string | null;
-        y: string | null;
-      };
-      mapping: {
-        x: string | null;
-        y: string | null;
-      };
-    }[];
+    panels: PlotPanel[];
     dims: {
       width: number;
       height: number;
@@ -39,12 +42,192 @@ export type ImageData = {
   };
 };
 
+/**
+ * A pointer position over a plot panel, sent to the server for hover and click
+ * inputs. `x` and `y` are in data coordinates. The panel's domain and range are
+ * included so the server can convert distances between data units and pixels.
+ */
+export type PlotPointerEvent = Pick<
+  PlotPanel,
+  "panel" | "domain" | "range" | "log" | "mapping"
+> & {
+  x: number;
+  y: number;
+  coords_css: { x: number; y: number };
+};
+
+/**
+ * A rectangle brushed over a plot panel, in data coordinates.
+ */
+export type PlotBrushEvent = Pick<
+  PlotPanel,
+  "panel" | "domain" | "range" | "log" | "mapping"
+> & {
+  xmin: number;
+  xmax: number;
+  ymin: number;
+  ymax: number;
+};
+
+/**
+ * Round a size in pixels up to a multiple of `step`. The server-side plot
+ * output uses the same rounding, so that both agree on size buckets.
+ */
+function sizeBucket(size: number, step: number): number {
+  return Math.max(step, Math.ceil(size / step) * step);
+}
+
+// Tiny test images, used to check which image formats the browser can decode
+const formatTestImages: Record<string, string> = {
+  webp: "data:image/webp;base64,UklGRhoAAABXRUJQVlA4TA0AAAAvAAAAEAcQERGIiP4HAA==",
+  avif:
+    "data:image/avif;base64,AAAAIGZ0eXBhdmlmAAAAAGF2aWZtaWYxbWlhZk1BMUIAAADybWV0YQAAAAAAAAAoaGRscgAAAAAAAAAAcGljdAAAAAAAAAAAAAAAAGxpYmF2aWYAAAAADnBpdG0AAAAAAAEAAAAeaWxvYwAAAABEAAABAAEAAAABAAABGgAAAB0AAAAoaWluZgAAAAAAAQAAABppbmZlAgAAAAABAABhdjAxQ29sb3IAAAAAamlwcnAAAABLaXBjbwAAABRpc3BlAAAAAAAAAAIAAAACAAAAEHBpeGkAAAAAAwgICAAAAAxhdjFDgQ0MAAAAABNjb2xybmNseAACAAIAAYAAAAAXaXBtYQAAAAAAAAABAAEEAQKDBAAAACVtZGF0EgAKCBgANogQEAwgMg8f8D///8WfhwB8+ErK42A=",
+};
+
+function canDecode(src: string): Promise<boolean> {
+  return new Promise((resolve) => {
+    const img = new Image();
+    img.onload = () => resolve(img.width > 0 && img.height > 0);
+    img.onerror = () => resolve(false);
+    img.src = src;
+  });
+}
+
+// Detected once, and shared by all ImageOutputs on the page
+let imageFormatsPromise: Promise<string[]> | null = null;
+
+/**
+ * Image formats that this browser can display, in the names used by the
+ * server-side plot output.
+ */
+export function supportedImageFormats(): Promise<string[]> {
+  if (!imageFormatsPromise) {
+    imageFormatsPromise = Promise.all(
+      Object.entries(formatTestImages).map(async ([format, src]) =>
+        (await canDecode(src)) ? format : null
+      )
+    ).then((formats) => [
+      ...formats.filter((format): format is string => format !== null),
+      "png",
+      "svg",
+    ]);
+  }
+  return imageFormatsPromise;
+}
+
+/**
+ * Convert a client (viewport) position over the image to CSS pixels in the
+ * plot's own coordinates. The plot is scaled to fit the element with
+ * `object-fit: contain`, so account for the scaling and centering.
+ */
+function plotCoords(
+  img: HTMLImageElement,
+  dims: ImageData["coordmap"]["dims"],
+  clientX: number,
+  clientY: number
+): { x: number; y: number } {
+  const rect = img.getBoundingClientRect();
+  const scale = Math.min(rect.width / dims.width, rect.height / dims.height);
+  const offsetX = (rect.width - dims.width * scale) / 2;
+  const offsetY = (rect.height - dims.height * scale) / 2;
+  return {
+    x: (clientX - rect.left - offsetX) / scale,
+    y: (clientY - rect.top - offsetY) / scale,
+  };
+}
+
+function findPanel(
+  panels: PlotPanel[],
+  coords: { x: number; y: number }
+): PlotPanel | undefined {
+  return panels.find(
+    (p) =>
+      coords.x >= p.range.left &&
+      coords.x <= p.range.right &&
+      coords.y >= p.range.top &&
+      coords.y <= p.range.bottom
+  );
+}
+
+// Linear interpolation between two data values, in log space for log axes
+function interpolate(
+  from: number,
+  to: number,
+  fraction: number,
+  logBase: string | null
+): number {
+  if (logBase === null) {
+    return from + fraction * (to - from);
+  }
+  const base = Math.log(Number(logBase));
+  const logFrom = Math.log(from) / base;
+  const logTo = Math.log(to) / base;
+  return Math.pow(Number(logBase), logFrom + fraction * (logTo - logFrom));
+}
+
+function toData(
+  panel: PlotPanel,
+  coords: { x: number; y: number }
+): { x: number; y: number } {
+  const { domain, range, log } = panel;
+  const fx = (coords.x - range.left) / (range.right - range.left);
+  // Pixel y increases downward, data y upward
+  const fy = (range.bottom - coords.y) / (range.bottom - range.top);
+  return {
+    x: interpolate(domain.left, domain.right, fx, log.x),
+    y: interpolate(domain.bottom, domain.top, fy, log.y),
+  };
+}
+
+function panelInfo(panel: PlotPanel) {
+  const { panel: id, domain, range, log, mapping } = panel;
+  return { panel: id, domain, range, log, mapping };
+}
+
+/**
+ * Displays a plot rendered by the Shiny server.
+ *
+ * The size of the image is reported to the server rounded up to a multiple of
+ * `sizeStep` pixels, and the rendered plot is scaled to fit. This way, small
+ * layout changes and window resizing only cause the plot to be re-rendered
+ * when the size crosses into a new bucket, and the server can cache one plot
+ * per bucket. Use a `sizeStep` of 1 to request plots at the exact size.
+ *
+ * The image formats that the browser can display (such as WebP and AVIF) are
+ * also reported, so that the server can send the smallest format it supports.
+ *
+ * If `hoverId`, `clickId`, or `brushId` are given, pointer events over the
+ * plot's panels are converted to data coordinates with the plot's coordmap and
+ * sent to the server as inputs with those IDs (see `PlotPointerEvent` and
+ * `PlotBrushEvent`). Hover events are throttled to one every `hoverDelay`
+ * milliseconds, and are set to null when the pointer leaves the plot. Brushing
+ * is done by dragging; a drag that doesn't move is a click, and clears the
+ * brush.
+ *
+ * @param id The ID of the Shiny plot output.
+ * @param className Optional CSS class name for the image.
+ * @param sizeStep Size bucket width in pixels (default: 64).
+ * @param hoverId Optional input ID for the pointer position.
+ * @param clickId Optional input ID for clicks.
+ * @param brushId Optional input ID for the brushed rectangle.
+ * @param hoverDelay Minimum milliseconds between hover updates (default: 100).
+ */
 export function ImageOutput({
   id,
   className,
+  sizeStep = 64,
+  hoverId,
+  clickId,
+  brushId,
+  hoverDelay = 100,
 }: {
   id: string;
   className?: string;
+  sizeStep?: number;
+  hoverId?: string;
+  clickId?: string;
+  brushId?: string;
+  hoverDelay?: number;
 }) {
   const [imgWidth, setImgWidth] = useShinyInput<number | null>(
     ".clientdata_output_" + id + "_width",
@@ -55,6 +238,16 @@ export function ImageOutput({
     null
   );
 
+  const [, setImgFormats] = useShinyInput<string[] | null>(
+    ".clientdata_output_" + id + "_formats",
+    null
+  );
+
+  useEffect(() => {
+    // eslint-disable-next-line @typescript-eslint/no-floating-promises
+    supportedImageFormats().then(setImgFormats);
+  }, [setImgFormats]);
+
   // Track if the image is hidden
   const [imgHidden] = useShinyInput<boolean>(
     ".clientdata_output_" + id + "_hidden",
@@ -81,8 +274,8 @@ export function ImageOutput({
       const width = imgRef.current.clientWidth;
       const height = imgRef.current.clientHeight;
       console.log("Image loaded - Width:", width, "Height:", height);
-      setImgWidth(width);
-      setImgHeight(height);
+      setImgWidth(sizeBucket(width, sizeStep));
+      setImgHeight(sizeBucket(height, sizeStep));
     }
   };
 
@@ -117,9 +310,148 @@ export function ImageOutput({
       img.removeEventListener("load", handleImageLoad);
       resizeObserver.disconnect();
     };
-  }, [imgRef, imageVersion, setImgWidth, setImgHeight]);
+  }, [imgRef, imageVersion, setImgWidth, setImgHeight, sizeStep]);
 
-  return (
+  // Pointer inputs, which aren't registered unless their IDs are given. Hover
+  // is throttled rather than debounced, so that it updates while the pointer
+  // is moving.
+  const [, setHover] = useShinyInput<PlotPointerEvent | null>(
+    hoverId ?? "",
+    null,
+    { throttleMs: hoverDelay, disabled: !hoverId }
+  );
+  const [, setClick] = useShinyInput<PlotPointerEvent | null>(
+    clickId ?? "",
+    null,
+    // Send every click, even at the same position
+    { debounceMs: 0, priority: "event", disabled: !clickId }
+  );
+  const [, setBrush] = useShinyInput<PlotBrushEvent | null>(
+    brushId ?? "",
+    null,
+    { disabled: !brushId }
+  );
+
+  // Where a brush drag started, and the rectangle (in CSS pixels relative to
+  // the img element) to draw while dragging
+  const brushStart = useRef<{
+    panel: PlotPanel;
+    coords: { x: number; y: number };
+    clientX: number;
+    clientY: number;
+  } | null>(null);
+  const [brushRect, setBrushRect] = useState<{
+    left: number;
+    top: number;
+    width: number;
+    height: number;
+  } | null>(null);
+
+  const pointerEvent = (
+    e: React.PointerEvent<HTMLImageElement>
+  ): { panel: PlotPanel; coords: { x: number; y: number } } | null => {
+    if (!imgRef.current || !imgData) return null;
+    const coords = plotCoords(
+      imgRef.current,
+      imgData.coordmap.dims,
+      e.clientX,
+      e.clientY
+    );
+    const panel = findPanel(imgData.coordmap.panels, coords);
+    return panel ? { panel, coords } : null;
+  };
+
+  const toPointerEvent = (
+    panel: PlotPanel,
+    coords: { x: number; y: number }
+  ): PlotPointerEvent => ({
+    ...panelInfo(panel),
+    ...toData(panel, coords),
+    coords_css: coords,
+  });
+
+  const handlePointerMove = (e: React.PointerEvent<HTMLImageElement>) => {
+    const start = brushStart.current;
+    if (brushId && start && imgRef.current) {
+      const rect = imgRef.current.getBoundingClientRect();
+      setBrushRect({
+        left: Math.min(start.clientX, e.clientX) - rect.left,
+        top: Math.min(start.clientY, e.clientY) - rect.top,
+        width: Math.abs(e.clientX - start.clientX),
+        height: Math.abs(e.clientY - start.clientY),
+      });
+    }
+    if (hoverId) {
+      const event = pointerEvent(e);
+      setHover(event ? toPointerEvent(event.panel, event.coords) : null);
+    }
+  };
+
+  const handlePointerLeave = () => {
+    if (hoverId) {
+      setHover(null);
+    }
+  };
+
+  const handlePointerDown = (e: React.PointerEvent<HTMLImageElement>) => {
+    const event = pointerEvent(e);
+    if (!event) return;
+    brushStart.current = { ...event, clientX: e.clientX, clientY: e.clientY };
+    if (brushId) {
+      // Keep receiving events if the pointer leaves the image mid-drag
+      e.currentTarget.setPointerCapture(e.pointerId);
+      e.preventDefault();
+    }
+  };
+
+  const handlePointerUp = (e: React.PointerEvent<HTMLImageElement>) => {
+    const start = brushStart.current;
+    brushStart.current = null;
+    setBrushRect(null);
+    if (!start || !imgRef.current || !imgData) return;
+
+    const moved =
+      Math.abs(e.clientX - start.clientX) > 2 ||
+      Math.abs(e.clientY - start.clientY) > 2;
+
+    if (!moved) {
+      if (clickId) {
+        setClick(toPointerEvent(start.panel, start.coords));
+      }
+      if (brushId) {
+        setBrush(null);
+      }
+      return;
+    }
+
+    if (brushId) {
+      // Limit the brush to the panel where it started
+      const { range } = start.panel;
+      const end = plotCoords(
+        imgRef.current,
+        imgData.coordmap.dims,
+        e.clientX,
+        e.clientY
+      );
+      const clamped = {
+        x: Math.min(Math.max(end.x, range.left), range.right),
+        y: Math.min(Math.max(end.y, range.top), range.bottom),
+      };
+      const a = toData(start.panel, start.coords);
+      const b = toData(start.panel, clamped);
+      setBrush({
+        ...panelInfo(start.panel),
+        xmin: Math.min(a.x, b.x),
+        xmax: Math.max(a.x, b.x),
+        ymin: Math.min(a.y, b.y),
+        ymax: Math.max(a.y, b.y),
+      });
+    }
+  };
+
+  const interactive = Boolean(hoverId || clickId || brushId);
+
+  const img = (
     <img
       ref={imgRef}
       src={imgData?.src}
@@ -128,10 +460,40 @@ export function ImageOutput({
       style={{
         width: "100%",
         height: "300px",
+        // The plot may be rendered slightly larger than the element
+        objectFit: "contain",
         display: imgHidden ? "none" : "block",
         opacity: imgRecalculating ? 0.4 : 1,
+        // Let touch drags brush instead of scrolling the page
+        touchAction: brushId ? "none" : undefined,
       }}
+      draggable={false}
       onLoad={handleImageLoad}
+      onPointerMove={interactive ? handlePointerMove : undefined}
+      onPointerLeave={interactive ? handlePointerLeave : undefined}
+      onPointerDown={interactive ? handlePointerDown : undefined}
+      onPointerUp={interactive ? handlePointerUp : undefined}
     />
   );
+
+  if (!brushId) {
+    return img;
+  }
+
+  return (
+    <div style={{ position: "relative", width: "100%" }}>
+      {img}
+      {brushRect && (
+        <div
+          style={{
+            position: "absolute",
+            ...brushRect,
+            border: "1px solid #4682b4",
+            backgroundColor: "rgba(70, 130, 180, 0.2)",
+            pointerEvents: "none",
+          }}
+        />
+      )}
+    </div>
+  );
 }
@@ -1,6 +1,6 @@
 /* eslint-disable @typescript-eslint/no-explicit-any */
 import { type EventPriority } from "@posit/shiny/srcts/types/src/inputPolicies";
-import { debounce } from "./utils";
+import { messageRegistry } from "./message-registry";
 
 type ErrorsMessageValue = {
   message: string;
@@ -13,59 +13,165 @@ type InputMap = Map<
   {
     // Input ID
     id: string;
+    // The last value set, for components that subscribe to the input later
+    value: any;
     setValueFns: Array<(value: any) => void>;
-    // Possibly debounce Shiny input value setter
-    shinySetInputValueDebounced: (
-      value: any,
-      opts?: { priority?: EventPriority }
-    ) => void;
+    // How long to wait for further changes before sending a value, or null
+    // to adapt to the server's round-trip time
+    debounceMs: number | null;
+    // If set, values are sent at most this often, without waiting for changes
+    // to stop (instead of being debounced)
+    throttleMs: number | null;
+    // performance.now() time when a value was last sent
+    sentAt: number;
+    priority?: EventPriority;
   }
 >;
 
+// Input values waiting to be sent to the server
+type PendingInputMap = Map<
+  string,
+  {
+    value: any;
+    opts: { priority?: EventPriority };
+    // performance.now() time when the input's debounce period ends
+    deadline: number;
+    // When the input first changed since it was last sent, for tracing
+    changedAt: number;
+  }
+>;
+
+// A span measured in the browser, reported to the server's trace hooks. Times
+// are Unix times in milliseconds.
+type TraceSpan = {
+  name: string;
+  start: number;
+  end: number;
+  output?: string;
+};
+
 type OutputMap = Map<
   string,
   {
     // Output ID
     id: string;
+    // The placeholder element that the output binding is bound to
+    el: HTMLElement;
     setValueFns: Array<(value: any) => void>;
     setRecalculatingFns: Array<(value: boolean) => void>;
+    // Elements displaying the output, and whether each is on (or near) the
+    // screen
+    visibility: Map<Element, boolean>;
   }
 >;
 
+function unixTimeMs(): number {
+  return performance.timeOrigin + performance.now();
+}
+
+function removeFirst<T>(array: T[], item: T) {
+  const index = array.indexOf(item);
+  if (index !== -1) {
+    array.splice(index, 1);
+  }
+}
+
 // TODO: Use weakmap?
 export class ShinyReactRegistry {
   inputs: InputMap = new Map();
   outputs: OutputMap = new Map();
-  private bindAllScheduled = false;
+  // Placeholders created since the last bind, to be bound in the next frame
+  private elementsToBind = new Set<HTMLElement>();
+  private bindScheduled = false;
+  // Settles when the latest bind is done
+  private binding: Promise<void> = Promise.resolve();
+  // Outputs that lost their last subscriber, to be removed in the next frame
+  private outputsToRelease = new Set<string>();
+  private releaseScheduled = false;
+  private pendingInputs: PendingInputMap = new Map();
+  private inputFlushTimer: ReturnType<typeof setTimeout> | null = null;
+  private inputFlushDeadline = Infinity;
+
+  // Bounds for adaptive debounce periods, in milliseconds
+  debounceBounds = { minMs: 20, maxMs: 1000 };
+  // Smoothed time from sending inputs until outputs finish recalculating
+  private roundTripMs: number | null = null;
+  // When the input batch that's being timed was sent
+  private roundTripStart: number | null = null;
+  private roundTripProgressSeen = false;
+  private recalculatingOutputs = new Set<string>();
 
+  // How far outside the viewport an output's elements can be and still count
+  // as visible, so that the output starts computing before it's scrolled into
+  // view. A CSS margin, as for IntersectionObserver's rootMargin.
+  visibilityMargin = "200px";
+  private visibilityObserver: IntersectionObserver | null = null;
+  // The outputs that each observed element displays
+  private observedElements = new Map<Element, Set<string>>();
+
+  // Set when the server enables tracing, with enable_tracing() in shinyreact.py
+  private tracing = false;
+  private traceCount = 0;
+  // Batches of inputs sent to the server, by trace ID, whose outputs haven't
+  // all been reported yet; and the spans measured for them in the browser
+  private openTraces = new Map<string, TraceSpan[]>();
+  private currentTraceId: string | null = null;
+
+  /**
+   * Subscribes to an input. Each call must be matched by a call to the
+   * returned function, which unsubscribes; the input is forgotten when its
+   * last subscriber is gone.
+   */
   registerInput(
     inputId: string,
     setValueFn: (value: any) => void,
-    opts: { priority?: EventPriority; debounceMs?: number } = {}
-  ) {
-    const { debounceMs = 100 } = opts;
-    const setInputValueOpts: { priority?: EventPriority } = {};
-    if (opts.priority) {
-      setInputValueOpts.priority = opts.priority;
-    }
+    opts: {
+      priority?: EventPriority;
+      debounceMs?: number;
+      throttleMs?: number;
+    } = {}
+  ): () => void {
+    const { debounceMs = null, throttleMs = null } = opts;
 
     if (!this.inputs.has(inputId)) {
       this.inputs.set(inputId, {
         id: inputId,
+        value: undefined,
         setValueFns: [],
-        shinySetInputValueDebounced: debounce((value: any) => {
-          window.Shiny.setInputValue!(inputId, value, setInputValueOpts);
-        }, debounceMs),
+        debounceMs,
+        throttleMs,
+        sentAt: -Infinity,
+        priority: opts.priority,
       });
     }
-    this.inputs.get(inputId)!.setValueFns.push(setValueFn);
+    const input = this.inputs.get(inputId)!;
+    input.setValueFns.push(setValueFn);
+
+    return () => {
+      removeFirst(input.setValueFns, setValueFn);
+      if (
+        input.setValueFns.length === 0 &&
+        this.inputs.get(inputId) === input
+      ) {
+        // A pending value is still sent
+        this.inputs.delete(inputId);
+      }
+    };
   }
 
+  /**
+   * Subscribes to an output. Each call must be matched by a call to the
+   * returned function, which unsubscribes. When an output's last subscriber is
+   * gone, its placeholder is unbound, and the server stops computing it until
+   * it's subscribed to again (see `scheduleReleaseOutputs()`).
+   */
   registerOutput(
     outputId: string,
     setValue: (value: any) => void,
     setRecalculating: (value: boolean) => void
-  ) {
+  ): () => void {
+    this.outputsToRelease.delete(outputId);
+
     if (!this.outputs.has(outputId)) {
       // Need to create a dummy div element with the ID, so that we have
       // something to bind to.
@@ -73,44 +179,200 @@ export class ShinyReactRegistry {
       div.className = "react-shiny-output";
       div.id = outputId;
       div.textContent = `This is the output div for ${outputId}`;
-      // Will display: none make the output not work?
+      // The output still receives values with display: none, but Shiny then
+      // reports it to the server as hidden, which suspends it. That's used for
+      // outputs that are off-screen; see observeOutputVisibility().
       div.style.visibility = "hidden";
-      document.body.appendChild(div);
 
       this.outputs.set(outputId, {
         id: outputId,
+        el: div,
         setValueFns: [],
         setRecalculatingFns: [],
+        visibility: new Map(),
+      });
+
+      this.scheduleBind(div);
+    }
+
+    const output = this.outputs.get(outputId)!;
+    output.setValueFns.push(setValue);
+    output.setRecalculatingFns.push(setRecalculating);
+
+    return () => {
+      removeFirst(output.setValueFns, setValue);
+      removeFirst(output.setRecalculatingFns, setRecalculating);
+      if (
+        output.setValueFns.length === 0 &&
+        this.outputs.get(outputId) === output
+      ) {
+        this.outputsToRelease.add(outputId);
+        this.scheduleReleaseOutputs();
+      }
+    };
+  }
+
+  /**
+   * Removes outputs that have lost their last subscriber, in the next frame.
+   * Waiting means that a component that's unmounted and mounted again right
+   * away (as React does in development, with StrictMode) keeps its output.
+   *
+   * Unbinding an output's placeholder makes Shiny report the output to the
+   * server as hidden, which suspends it. If the output is subscribed to again,
+   * a new placeholder is bound, and Shiny replays the output's last value.
+   */
+  private scheduleReleaseOutputs() {
+    if (this.releaseScheduled) {
+      return;
+    }
+
+    this.releaseScheduled = true;
+
+    requestAnimationFrame(() => {
+      this.releaseScheduled = false;
+      const outputIds = this.outputsToRelease;
+      this.outputsToRelease = new Set();
+
+      outputIds.forEach((outputId) => {
+        const output = this.outputs.get(outputId);
+        if (!output || output.setValueFns.length > 0) {
+          return;
+        }
+        // A placeholder that's still waiting to be bound isn't on the page
+        if (!this.elementsToBind.delete(output.el)) {
+          window.Shiny.unbindAll?.(output.el, true);
+          // Shiny marks outputs that are no longer bound as hidden when it
+          // next sends outputs' hidden states, which this event prompts.
+          $(output.el).trigger("hidden");
+          const container = output.el.parentElement;
+          output.el.remove();
+          if (container?.childElementCount === 0) {
+            container.remove();
+          }
+        }
+        this.outputs.delete(outputId);
+        if (
+          this.recalculatingOutputs.delete(outputId) &&
+          this.recalculatingOutputs.size === 0
+        ) {
+          // The round trip being timed can't be measured now
+          this.roundTripStart = null;
+        }
       });
+    });
+  }
 
-      this.scheduleBindAll();
+  /**
+   * Tracks whether an element that displays an output is on the screen. While
+   * all of an output's observed elements are scrolled away (further than
+   * `visibilityMargin`), the output is reported to the server as hidden, so the
+   * server suspends its computation until it's shown again. Outputs with no
+   * observed elements are always visible.
+   *
+   * @returns A function that stops observing the element.
+   */
+  observeOutputVisibility(outputId: string, el: Element): () => void {
+    const output = this.outputs.get(outputId);
+    if (!output || typeof IntersectionObserver === "undefined") {
+      return () => {};
+    }
+
+    if (this.visibilityObserver === null) {
+      this.visibilityObserver = new IntersectionObserver(
+        (entries) => this.handleIntersections(entries),
+        { rootMargin: this.visibilityMargin }
+      );
+    }
+
+    let outputIds = this.observedElements.get(el);
+    if (!outputIds) {
+      outputIds = new Set();
+      this.observedElements.set(el, outputIds);
+      this.visibilityObserver.observe(el);
     }
+    outputIds.add(outputId);
+    // Until the observer reports on it, which happens right away, assume the
+    // element is visible, so that outputs don't flicker into the hidden state
+    // and back.
+    output.visibility.set(el, output.visibility.get(el) ?? true);
 
-    // Do we need to dedupe?
-    this.outputs.get(outputId)!.setValueFns.push(setValue);
-    this.outputs.get(outputId)!.setRecalculatingFns.push(setRecalculating);
+    return () => {
+      output.visibility.delete(el);
+      const ids = this.observedElements.get(el);
+      ids?.delete(outputId);
+      if (ids && ids.size === 0) {
+        this.observedElements.delete(el);
+        this.visibilityObserver?.unobserve(el);
+      }
+      this.updateOutputHidden(outputId);
+    };
+  }
+
+  private handleIntersections(entries: IntersectionObserverEntry[]) {
+    const changed = new Set<string>();
+    entries.forEach((entry) => {
+      this.observedElements.get(entry.target)?.forEach((outputId) => {
+        this.outputs
+          .get(outputId)
+          ?.visibility.set(entry.target, entry.isIntersecting);
+        changed.add(outputId);
+      });
+    });
+    changed.forEach((outputId) => this.updateOutputHidden(outputId));
+  }
+
+  private updateOutputHidden(outputId: string) {
+    const output = this.outputs.get(outputId);
+    if (!output) {
+      return;
+    }
+    let hidden = output.visibility.size > 0;
+    output.visibility.forEach((visible) => {
+      hidden = hidden && !visible;
+    });
+
+    if (hidden === (output.el.style.display === "none")) {
+      return;
+    }
+    output.el.style.display = hidden ? "none" : "";
+    // Shiny listens for these events to send outputs' hidden states
+    $(output.el).trigger(hidden ? "hidden" : "shown");
   }
 
   /**
-   * Schedules a Shiny binding operation to run after DOM updates are complete.
+   * Schedules a new output placeholder to be bound after DOM updates are
+   * complete.
    *
-   * Note: I'm not sure if this is 100% reliable. I believe we need to avoid
-   * overlapping calls to bindAll(), and am not sure if requestAnimationFrame()
-   * will provide perfect reliability for this.
+   * Placeholders created in the same frame are added to the page in a new
+   * container, and only that container is bound. Binding the whole document
+   * would rebind every input and output on the page for each new output,
+   * briefly dropping them all. Binds are chained, so that calls to bindAll()
+   * never overlap.
    */
-  private scheduleBindAll() {
-    if (this.bindAllScheduled) {
+  private scheduleBind(el: HTMLElement) {
+    this.elementsToBind.add(el);
+    if (this.bindScheduled) {
       return;
     }
 
-    this.bindAllScheduled = true;
+    this.bindScheduled = true;
 
     // Use requestAnimationFrame to ensure DOM updates are complete
     requestAnimationFrame(() => {
-      window.Shiny.unbindAll?.(document.body);
-      // eslint-disable-next-line @typescript-eslint/no-floating-promises
-      window.Shiny.bindAll?.(document.body);
-      this.bindAllScheduled = false;
+      this.bindScheduled = false;
+      if (this.elementsToBind.size === 0) {
+        return;
+      }
+
+      const container = document.createElement("div");
+      container.className = "react-shiny-outputs";
+      this.elementsToBind.forEach((el) => container.appendChild(el));
+      this.elementsToBind = new Set();
+      document.body.appendChild(container);
+
+      this.binding = this.binding
+        .then(() => window.Shiny.bindAll?.(container))
+        .catch((err) => console.error("Failed to bind outputs:", err));
     });
   }
 
@@ -127,8 +389,229 @@ export class ShinyReactRegistry {
       console.error(`Input ${inputId} not found`);
       return;
     }
-    this.inputs.get(inputId)!.shinySetInputValueDebounced(value, opts);
-    this.inputs.get(inputId)!.setValueFns.forEach((fn) => fn(value));
+    const input = this.inputs.get(inputId)!;
+    input.value = value;
+    const priority = opts?.priority ?? input.priority;
+    const pending = this.pendingInputs.get(inputId);
+    const now = performance.now();
+    // Changing the value again restarts the input's debounce period, but a
+    // throttled input keeps its deadline, so that it's sent while it's still
+    // changing
+    let deadline = now + this.debounceMs(input.debounceMs);
+    if (input.throttleMs !== null) {
+      deadline =
+        pending?.deadline ?? Math.max(now, input.sentAt + input.throttleMs);
+    }
+    this.pendingInputs.set(inputId, {
+      value,
+      opts: priority ? { priority } : {},
+      deadline,
+      changedAt: pending?.changedAt ?? unixTimeMs(),
+    });
+    this.scheduleInputFlush();
+    input.setValueFns.forEach((fn) => fn(value));
+  }
+
+  /**
+   * Sends all pending input values to the server now, without waiting for
+   * their debounce periods to end.
+   *
+   * Values are sent together, in the same tick, so that Shiny sends them in
+   * one message and the server's reactive graph runs once for all of them.
+   */
+  flushInputs() {
+    if (this.inputFlushTimer !== null) {
+      clearTimeout(this.inputFlushTimer);
+      this.inputFlushTimer = null;
+    }
+    this.inputFlushDeadline = Infinity;
+
+    const pending = this.pendingInputs;
+    this.pendingInputs = new Map();
+    if (pending.size === 0) {
+      return;
+    }
+
+    // Time this batch, unless an earlier one is still being answered. If the
+    // earlier one didn't cause any recalculation, it won't be answered.
+    if (this.roundTripStart === null || !this.roundTripProgressSeen) {
+      this.roundTripStart = performance.now();
+      this.roundTripProgressSeen = false;
+    }
+    const now = performance.now();
+    pending.forEach(({ value, opts }, inputId) => {
+      const input = this.inputs.get(inputId);
+      if (input) {
+        input.sentAt = now;
+      }
+      window.Shiny.setInputValue!(inputId, value, opts);
+    });
+    if (this.tracing) {
+      this.sendTrace(pending);
+    }
+  }
+
+  /**
+   * Starts tracing batches of inputs. The server calls this when it enables
+   * tracing for the session.
+   */
+  enableTracing() {
+    this.tracing = true;
+  }
+
+  /**
+   * Tells the server the trace ID of a batch of inputs, with when each input
+   * first changed. It's sent in the same tick as the inputs, so that Shiny
+   * sends it in the same message.
+   */
+  private sendTrace(pending: PendingInputMap) {
+    const id = `${Date.now().toString(36)}-${++this.traceCount}`;
+    const debounce: Array<{ input: string; start: number }> = [];
+    pending.forEach(({ changedAt }, inputId) => {
+      debounce.push({ input: inputId, start: changedAt });
+    });
+
+    this.openTraces.set(id, []);
+    this.currentTraceId = id;
+    // In case the server never answers some of them
+    if (this.openTraces.size > 50) {
+      this.openTraces.delete(this.openTraces.keys().next().value!);
+    }
+
+    window.Shiny.setInputValue!(
+      ".shinyreact_trace",
+      { id, sentAt: unixTimeMs(), debounce },
+      { priority: "event" }
+    );
+  }
+
+  /**
+   * Records how long it took to pass an output's value to its components.
+   * Values are attributed to the latest batch of inputs, which is usually, but
+   * not always, the one that caused them.
+   */
+  recordOutputApplied(outputId: string, start: number, end: number) {
+    if (this.currentTraceId === null) {
+      return;
+    }
+    this.openTraces
+      .get(this.currentTraceId)
+      ?.push({ name: "client.apply", start, end, output: outputId });
+  }
+
+  /**
+   * Sends the browser's spans for a trace to the server. The server calls this
+   * after it has sent all of the outputs that a batch of inputs caused,
+   * telling it when they were sent.
+   */
+  finishTrace({ id, flushedAt }: { id: string; flushedAt: number }) {
+    const spans = this.openTraces.get(id);
+    if (!spans) {
+      return;
+    }
+    this.openTraces.delete(id);
+    if (this.currentTraceId === id) {
+      this.currentTraceId = null;
+    }
+
+    // The values arrive before this message, so the first one was received
+    // when it started being applied
+    const received = Math.min(unixTimeMs(), ...spans.map((span) => span.start));
+    spans.push({ name: "network.download", start: flushedAt, end: received });
+    window.Shiny.setInputValue!(
+      ".shinyreact_trace_client",
+      { id, spans },
+      { priority: "event" }
+    );
+  }
+
+  /**
+   * The debounce period for an input: either its fixed period, or one that
+   * adapts to how long the server takes to respond.
+   *
+   * Sending inputs faster than the server can respond only queues up work, so
+   * the adaptive period tracks the measured round-trip time, within
+   * `debounceBounds`. A fast server gets quick updates, and a loaded one isn't
+   * flooded with them. Until a round trip has been measured, it's 100ms.
+   */
+  debounceMs(fixedMs: number | null = null): number {
+    if (fixedMs !== null) {
+      return fixedMs;
+    }
+    const { minMs, maxMs } = this.debounceBounds;
+    return Math.min(Math.max(this.roundTripMs ?? 100, minMs), maxMs);
+  }
+
+  /**
+   * Records that an output started or stopped recalculating. When all outputs
+   * have finished after a batch of inputs was sent, the elapsed time is a
+   * round-trip measurement.
+   */
+  setOutputRecalculating(outputId: string, recalculating: boolean) {
+    if (recalculating) {
+      this.recalculatingOutputs.add(outputId);
+      this.roundTripProgressSeen = true;
+      return;
+    }
+
+    this.recalculatingOutputs.delete(outputId);
+    if (
+      this.recalculatingOutputs.size === 0 &&
+      this.roundTripStart !== null &&
+      this.roundTripProgressSeen
+    ) {
+      const sample = performance.now() - this.roundTripStart;
+      // Exponentially weighted moving average, to smooth out outliers
+      this.roundTripMs =
+        this.roundTripMs === null
+          ? sample
+          : 0.8 * this.roundTripMs + 0.2 * sample;
+      this.roundTripStart = null;
+    }
+  }
+
+  /**
+   * Schedules pending input values to be sent when the first of their
+   * debounce periods ends. At that point, all pending values are sent in one
+   * batch, rather than each input sending its own message when its own
+   * period ends.
+   */
+  private scheduleInputFlush() {
+    let deadline = Infinity;
+    this.pendingInputs.forEach((input) => {
+      deadline = Math.min(deadline, input.deadline);
+    });
+    if (deadline === Infinity) {
+      return;
+    }
+
+    if (this.inputFlushTimer !== null) {
+      if (this.inputFlushDeadline <= deadline) {
+        return;
+      }
+      clearTimeout(this.inputFlushTimer);
+    }
+
+    this.inputFlushDeadline = deadline;
+    this.inputFlushTimer = setTimeout(
+      () => {
+        this.inputFlushTimer = null;
+        this.inputFlushDeadline = Infinity;
+        // An input may have changed since the timer was set, which extends
+        // its debounce period. Timers can also fire slightly early.
+        const now = performance.now() + 1;
+        let due = false;
+        this.pendingInputs.forEach((input) => {
+          due = due || input.deadline <= now;
+        });
+        if (due) {
+          this.flushInputs();
+        } else {
+          this.scheduleInputFlush();
+        }
+      },
+      Math.max(0, deadline - performance.now())
+    );
   }
 
   hasOutput(outputId: string) {
@@ -138,6 +621,15 @@ export class ShinyReactRegistry {
 
 window.Shiny.reactRegistry = new ShinyReactRegistry();
 
+messageRegistry.addHandler("shinyReactTracing", () =>
+  window.Shiny.reactRegistry.enableTracing()
+);
+messageRegistry.addHandler(
+  "shinyReactTrace",
+  (msg: { id: string; flushedAt: number }) =>
+    window.Shiny.reactRegistry.finishTrace(msg)
+);
+
 export class ReactOutputBinding extends window.Shiny.OutputBinding {
   override find(scope: HTMLElement | JQuery<HTMLElement>): JQuery<HTMLElement> {
     return $(scope).find(".react-shiny-output");
@@ -148,9 +640,12 @@ export class ReactOutputBinding extends window.Shiny.OutputBinding {
       console.error(`Output ${el.id} not found`);
       return;
     }
+    const start = unixTimeMs();
     window.Shiny.reactRegistry.outputs
       .get(el.id)!
       .setValueFns.forEach((fn) => fn(data));
+    // This only covers handing the value to React; components re-render later
+    window.Shiny.reactRegistry.recordOutputApplied(el.id, start, unixTimeMs());
   }
 
   override renderError(el: HTMLElement, err: ErrorsMessageValue): void {
@@ -159,6 +654,7 @@ export class ReactOutputBinding extends window.Shiny.OutputBinding {
 
   override showProgress(el: HTMLElement, show: boolean): void {
     // console.log(`Progress for ${el.id}: ${show}`);
+    window.Shiny.reactRegistry.setOutputRecalculating(el.id, show);
     if (!window.Shiny.reactRegistry.outputs.has(el.id)) {
       console.error(`Output ${el.id} not found`);
       return;
@@ -1,7 +1,14 @@
 /* eslint-disable @typescript-eslint/no-explicit-any */
 
 import { type EventPriority } from "@posit/shiny/srcts/types/src/inputPolicies";
-import { useCallback, useEffect, useState } from "react";
+import {
+  type RefObject,
+  useCallback,
+  useEffect,
+  useLayoutEffect,
+  useRef,
+  useState,
+} from "react";
 import "./message-registry"; // Initialize message registry
 import "./react-registry"; // Initialize react registry
 
@@ -14,10 +21,14 @@ import "./react-registry"; // Initialize react registry
  * When the component mounts, it waits for Shiny to initialize. Once Shiny is
  * initialized, this hook registers the input with the Shiny React registry and
  * uses debounced updates to send values to the Shiny server via
- * `window.Shiny.setInputValue()`.
+ * `window.Shiny.setInputValue()`. Components that use the same input ID share
+ * its value. The input is unregistered when the last of them unmounts (the
+ * server keeps its last value).
  *
  * The hook supports debouncing to optimize performance by batching rapid
- * updates, and allows setting priority levels for input events.
+ * updates, and allows setting priority levels for input events. Pending
+ * changes to all inputs are sent to the server together, when the first of
+ * their debounce periods ends.
  *
  * Note: This hook only sends data *to* Shiny. It does not automatically update
  * the React state if the input is changed on the server-side (e.g., using
@@ -27,10 +38,17 @@ import "./react-registry"; // Initialize react registry
  * @param id The ID that will be used for the Shiny input (`input$<id>`).
  * @param defaultValue The initial value for the input.
  * @param options Optional configuration object.
- * @param options.debounceMs Debounce delay in milliseconds for input updates
- * (default: 100).
+ * @param options.debounceMs Debounce delay in milliseconds for input updates.
+ * By default, the delay adapts to the server's measured round-trip time
+ * (starting at 100ms, and within `reactRegistry.debounceBounds`).
+ * @param options.throttleMs If given, values are sent at most once every
+ * `throttleMs` milliseconds while they keep changing, instead of waiting for
+ * changes to stop. Use this for continuous inputs like pointer positions.
  * @param options.priority Priority level for the input event (from Shiny's
  * EventPriority enum).
+ * @param options.disabled If true, the input isn't registered, and setting it
+ * does nothing. Hooks can't be called conditionally, so this is how a
+ * component skips an optional input.
  * @returns A tuple containing the current value and a function to set the
  * value: `[value, setValue]`.
  */
@@ -38,11 +56,15 @@ export function useShinyInput<T>(
   id: string,
   defaultValue: T,
   {
-    debounceMs = 100,
+    debounceMs,
+    throttleMs,
     priority,
+    disabled = false,
   }: {
     debounceMs?: number;
+    throttleMs?: number;
     priority?: EventPriority;
+    disabled?: boolean;
   } = {}
 ): [T, (value: T) => void] {
   // NOTE: It's a little odd that debounceMs and priority passed this way; the
@@ -54,33 +76,43 @@ export function useShinyInput<T>(
 
   const [value, setValue] = useState<T>(defaultValue);
   const shinyInitialized = useShinyInitialized();
+  // The value when the input is registered, without re-registering every time
+  // the value changes
+  const valueRef = useRef(value);
+  valueRef.current = value;
 
   useEffect(() => {
-    if (!shinyInitialized) {
-      return;
-    }
-    // Don't register and set value more than once.
-    if (id in window.Shiny.reactRegistry.inputs) {
+    if (!shinyInitialized || disabled) {
       return;
     }
 
-    window.Shiny.reactRegistry.registerInput(id, setValue, {
+    const registry = window.Shiny.reactRegistry;
+    const isNew = !registry.hasInput(id);
+    const unregister = registry.registerInput(id, setValue, {
       debounceMs,
+      throttleMs,
       priority,
     });
-    window.Shiny.reactRegistry.setInputValue(id, value);
-    // TODO: Cleanup? in case id changes or something like that.
-  }, [id, shinyInitialized, debounceMs, priority, value]);
+    if (isNew) {
+      registry.setInputValue(id, valueRef.current);
+    } else {
+      // Another component already set this input; show its value
+      setValue(registry.inputs.get(id)!.value);
+    }
+
+    // Unregister when unmounted, or when the ID changes
+    return unregister;
+  }, [id, shinyInitialized, debounceMs, throttleMs, priority, disabled]);
 
   const setValueWrapped = useCallback(
     (value: T) => {
-      if (!shinyInitialized) {
+      if (!shinyInitialized || disabled) {
         return;
       }
 
       window.Shiny.reactRegistry.setInputValue(id, value);
     },
-    [shinyInitialized, id]
+    [shinyInitialized, id, disabled]
   );
 
   // useEffect(() => {
@@ -99,9 +131,24 @@ export function useShinyInput<T>(
  * a hidden DOM element and registers a custom Shiny output binding to receive
  * reactive data updates for the specified outputId.
  *
+ * Components that use the same output ID share one subscription. When the last
+ * of them unmounts, the output is unbound, and the server stops computing it
+ * until it's used again.
+ *
+ * To avoid computing outputs that can't be seen, pass a ref to the element
+ * that displays the output as `options.ref`. While that element is scrolled
+ * off-screen, the output is reported to the server as hidden, and the server
+ * suspends it until it's scrolled back into view. Outputs start computing
+ * slightly before they come into view (see `reactRegistry.visibilityMargin`).
+ * If the ref is attached to a different element, that element is observed
+ * instead.
+ *
  * @param outputId The ID of the Shiny output to subscribe to.
  * @param defaultValue Optional default value to use before the first server
  * update.
+ * @param options Optional configuration object.
+ * @param options.ref A ref to the element that displays the output, used to
+ * suspend the output while the element is off-screen.
  * @returns A tuple containing [value, recalculating] where:
  *   - value: The current value of the Shiny output
  *   - recalculating: Boolean indicating if the server is currently
@@ -109,7 +156,8 @@ export function useShinyInput<T>(
  */
 export function useShinyOutput<T>(
   outputId: string,
-  defaultValue: T | undefined = undefined
+  defaultValue: T | undefined = undefined,
+  { ref }: { ref?: RefObject<Element | null> } = {}
 ): [T | undefined, boolean] {
   const [value, setValue] = useState<T | undefined>(defaultValue);
   const [recalculating, setRecalculating] = useState<boolean>(false);
@@ -119,13 +167,35 @@ export function useShinyOutput<T>(
     if (!shinyInitialized) {
       return;
     }
-    window.Shiny.reactRegistry.registerOutput(
+    // When the last component using the output unmounts, the server stops
+    // computing it
+    return window.Shiny.reactRegistry.registerOutput(
       outputId,
       setValue,
       setRecalculating
     );
   }, [outputId, shinyInitialized]);
 
+  // Changing ref.current doesn't cause a render, so it's checked after every
+  // render, and the element is kept in state so that a new one is observed
+  const [element, setElement] = useState<Element | null>(null);
+  useLayoutEffect(() => {
+    const el = ref?.current ?? null;
+    if (el !== element) {
+      setElement(el);
+    }
+  });
+
+  useEffect(() => {
+    if (!shinyInitialized || !element) {
+      return;
+    }
+    return window.Shiny.reactRegistry.observeOutputVisibility(
+      outputId,
+      element
+    );
+  }, [outputId, shinyInitialized, element]);
+
   return [value, recalculating];
 }
 